@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Concurrent Writers Benchmark
+Runs several station processes inserting into one qr_codes.db while another
+process keeps reading the records table, comparing the old default-journal
+connections with qr_database.connect() and write_transaction()
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import argparse
+from multiprocessing import Event, Pool, Process, Queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'getDEVUID'))
+
+from qr_database import IdAllocator, RecordPager, connect, write_transaction
+from qr_migrations import migrate
+
+INSERT = '''
+    INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename)
+    VALUES (?, ?, '123456', 'E5DDA7D74D91EC53', ?)
+'''
+
+
+def old_station(db_path, station, records):
+    """Default journal, ID read outside the write transaction, no retries"""
+    conn = sqlite3.connect(db_path)
+    failed = 0
+    for i in range(records):
+        try:
+            next_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM qr_records').fetchone()[0]
+            conn.execute(INSERT, (next_id, f'S{station}-{i}', f'qr_{station}_{i}.png'))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            failed += 1
+    conn.close()
+    return failed
+
+
+def wal_station(db_path, station, records):
+    conn = connect(db_path)
+    allocator = IdAllocator(conn)
+    failed = 0
+    for i in range(records):
+        try:
+            write_transaction(conn, lambda: conn.execute(
+                INSERT, (allocator.next_id(), f'S{station}-{i}', f'qr_{station}_{i}.png')))
+        except sqlite3.Error:
+            failed += 1
+    conn.close()
+    return failed
+
+
+def reader(db_path, wal, done, results):
+    conn = connect(db_path) if wal else sqlite3.connect(db_path)
+    pager = RecordPager(conn, ('id', 'created_at'))
+    slowest = 0.0
+    failed = 0
+    while not done.is_set():
+        start_time = time.perf_counter()
+        try:
+            pager.fetch()
+        except sqlite3.Error:
+            failed += 1
+        slowest = max(slowest, time.perf_counter() - start_time)
+    conn.close()
+    results.put((slowest * 1000, failed))
+
+
+def run(mode, writers, records):
+    test_dir = tempfile.mkdtemp()
+    db_path = os.path.join(test_dir, 'qr_codes.db')
+    conn = sqlite3.connect(db_path)
+    migrate(conn)
+    conn.close()
+
+    wal = mode == 'wal'
+    station = wal_station if wal else old_station
+    done, results = Event(), Queue()
+    read_process = Process(target=reader, args=(db_path, wal, done, results))
+    read_process.start()
+
+    start_time = time.perf_counter()
+    with Pool(writers) as pool:
+        failed = sum(pool.starmap(station, [(db_path, s, records) for s in range(writers)]))
+    elapsed = time.perf_counter() - start_time
+    done.set()
+    slowest_read, failed_reads = results.get()
+    read_process.join()
+    shutil.rmtree(test_dir)
+
+    written = writers * records - failed
+    print(f"{mode:>6} {written / elapsed:>10.0f} {failed:>13} {failed_reads:>12} {slowest_read:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark concurrent writers on one database')
+    parser.add_argument('--writers', type=int, default=8, help='Station processes writing at once')
+    parser.add_argument('--records', type=int, default=200, help='Records written per station')
+    args = parser.parse_args()
+
+    print("⏱️  Concurrent Writers Benchmark")
+    print("=" * 50)
+    print(f"{args.writers} writers x {args.records} records, one reader paging the table")
+    print(f"{'Mode':>6} {'Records/s':>10} {'Failed writes':>13} {'Failed reads':>12} {'Slowest read':>14}  (ms)")
+    for mode in ('old', 'wal'):
+        run(mode, args.writers, args.records)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+DevUID Read Benchmark
+Reads DevUIDs end to end through the mock OpenOCD (mock_openocd.py), with a
+simulated probe start-up and memory read time, comparing one OpenOCD run per
+read (getDEVUID.py, the old GUI button) with a persistent OpenOcdSession read
+over TCL RPC. No ST-Link needed.
+"""
+
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'getDEVUID'))
+
+import mock_openocd
+from devuid_reader import OpenOcdSession, read_devuid_once
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def one_shot(openocd_path, reads):
+    for _ in range(reads):
+        read_devuid_once(openocd_path)
+
+
+def persistent(openocd_path, reads):
+    with OpenOcdSession(openocd_path, port=free_port()) as session:
+        for _ in range(reads):
+            session.read_devuid()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark one-shot and persistent OpenOCD DevUID reads')
+    parser.add_argument('--reads', type=int, default=20, help='DevUIDs read per strategy')
+    parser.add_argument('--start-ms', type=float, default=500.0, help='Simulated probe and target start-up (ms)')
+    parser.add_argument('--read-ms', type=float, default=10.0, help='Simulated memory read time (ms)')
+    args = parser.parse_args()
+
+    test_dir = tempfile.mkdtemp()
+    os.environ.update(mock_openocd.environment(start_delay=args.start_ms / 1000, read_delay=args.read_ms / 1000))
+    try:
+        openocd_path = mock_openocd.install(test_dir)
+        print("⏱️  DevUID Read Benchmark")
+        print("=" * 50)
+        print(f"{args.reads} reads, {args.start_ms:.0f} ms start-up, {args.read_ms:.0f} ms read (mock OpenOCD)")
+        print(f"{'Strategy':<11} {'Reads/s':>9} {'ms/read':>9}")
+        for name, strategy in (('one-shot', one_shot), ('persistent', persistent)):
+            start_time = time.perf_counter()
+            strategy(openocd_path, args.reads)
+            elapsed = time.perf_counter() - start_time
+            print(f"{name:<11} {args.reads / elapsed:>9.1f} {elapsed / args.reads * 1000:>9.1f}")
+    finally:
+        shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    main()
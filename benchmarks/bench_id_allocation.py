@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+ID Allocation Benchmark
+Compares the old gap walk in QRGeneratorCLI.save_to_database with the
+free-list IdAllocator on a large qr_records table
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'getDEVUID'))
+
+from qr_database import IdAllocator
+
+
+def create_table(conn, rows, holes):
+    """Fill qr_records with sequential IDs and punch random holes in it"""
+    conn.execute('''
+        CREATE TABLE qr_records (
+            id INTEGER PRIMARY KEY,
+            serial_number TEXT NOT NULL,
+            verification_code TEXT NOT NULL,
+            dev_uid TEXT NOT NULL,
+            qr_filename TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.executemany('''
+        INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ((i, f'SN{i:012d}', f'{i % 1000000:06d}', f'{i:016X}', f'qr_{i}.png') for i in range(1, rows + 1)))
+
+    # Holes near the end so the gap walk has to read most of the table
+    rng = random.Random(42)
+    for record_id in rng.sample(range(rows // 2, rows + 1), holes):
+        conn.execute('DELETE FROM qr_records WHERE id = ?', (record_id,))
+    conn.commit()
+
+
+def legacy_next_id(cursor):
+    """Original O(n) gap walk"""
+    cursor.execute('SELECT COUNT(*) FROM qr_records')
+    if cursor.fetchone()[0] == 0:
+        return 1
+    cursor.execute('SELECT id FROM qr_records ORDER BY id')
+    next_id = 1
+    for (existing_id,) in cursor.fetchall():
+        if next_id == existing_id:
+            next_id += 1
+        else:
+            break
+    return next_id
+
+
+def run(conn, allocate, inserts):
+    """Allocate and insert records, returning the IDs and the time per insert"""
+    cursor = conn.cursor()
+    ids = []
+    start_time = time.perf_counter()
+    for i in range(inserts):
+        next_id = allocate(cursor)
+        cursor.execute('''
+            INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (next_id, f'NEW{i}', '000000', '0' * 16, 'new.png'))
+        conn.commit()
+        ids.append(next_id)
+    return ids, (time.perf_counter() - start_time) / inserts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark record ID allocation')
+    parser.add_argument('--rows', type=int, default=100000, help='Records in the table')
+    parser.add_argument('--holes', type=int, default=200, help='Deleted IDs to reuse')
+    parser.add_argument('--inserts', type=int, default=250, help='Inserts to time')
+    args = parser.parse_args()
+
+    print("⏱️  ID Allocation Benchmark")
+    print("=" * 50)
+    print(f"📊 Rows: {args.rows:,}  Holes: {args.holes}  Inserts: {args.inserts}")
+
+    legacy_conn = sqlite3.connect(':memory:')
+    create_table(legacy_conn, args.rows, args.holes)
+    legacy_ids, legacy_time = run(legacy_conn, legacy_next_id, args.inserts)
+
+    conn = sqlite3.connect(':memory:')
+    create_table(conn, args.rows, args.holes)
+    start_time = time.perf_counter()
+    allocator = IdAllocator(conn)
+    setup_time = time.perf_counter() - start_time
+    ids, free_list_time = run(conn, lambda cursor: allocator.next_id(), args.inserts)
+
+    print(f"🐢 Gap walk:   {legacy_time * 1000:8.3f} ms per insert")
+    print(f"🚀 Free list:  {free_list_time * 1000:8.3f} ms per insert "
+          f"(one-off setup {setup_time * 1000:.1f} ms)")
+    print(f"📈 Speed-up:   {legacy_time / free_list_time:8.1f}x")
+
+    if ids != legacy_ids:
+        print("❌ Allocated IDs differ from the gap walk!")
+        sys.exit(1)
+    print("✅ Allocated IDs match the gap walk")
+
+
+if __name__ == "__main__":
+    main()
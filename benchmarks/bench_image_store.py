@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+QR Image Store Benchmark
+Times storing a set of codes when none of them have been rendered yet
+and again when all of them are already in the store (a reprint or a
+re-run batch), then a garbage collection pass once their records are gone
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'getDEVUID'))
+
+from qr_migrations import migrate
+from qr_store import QRImageStore
+
+
+def olarm_payload(i):
+    return f"https://olarm.com/o/flxr?a=SN{i:06d},E5DDA7D74D91EC53,{i % 1000000:06d}"
+
+
+def timed(name, codes, action):
+    start_time = time.perf_counter()
+    result = action()
+    elapsed = time.perf_counter() - start_time
+    print(f"{name:<10} {codes:>7} {elapsed * 1000:>10.1f} {elapsed / codes * 1e6:>10.1f}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the content-addressed QR image store')
+    parser.add_argument('--codes', type=int, default=200, help='Distinct codes to store')
+    args = parser.parse_args()
+
+    test_dir = tempfile.mkdtemp()
+    original_cwd = os.getcwd()
+    os.chdir(test_dir)
+    try:
+        conn = sqlite3.connect('qr_codes.db')
+        migrate(conn)
+        store = QRImageStore()
+        payloads = [olarm_payload(i) for i in range(args.codes)]
+
+        print("⏱️  QR Image Store Benchmark")
+        print("=" * 50)
+        print(f"{'Pass':<10} {'Codes':>7} {'Total ms':>10} {'µs/code':>10}")
+        timed('cold', args.codes, lambda: [store.get_or_render(qr_data) for qr_data in payloads])
+        timed('warm', args.codes, lambda: [store.get_or_render(qr_data) for qr_data in payloads])
+        result = timed('gc', args.codes, lambda: store.gc(conn, min_age=0))
+        print(f"Rendered {store.misses}, reused {store.hits}, collected {result.removed} "
+              f"({result.freed / 1024:.0f} KB)")
+        conn.close()
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+PNG Writer Benchmark
+Compares qrcode's PIL image output with the direct 1-bit PNG writer
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+
+from qrcode.image.pil import PilImage
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'getDEVUID'))
+
+from qr_formats import format_qr_data
+from qr_render import matrix_png, qr_matrix
+
+
+def pil_png(modules):
+    """PNG through a PIL image, as qrcode.make_image() did"""
+    image = PilImage(4, len(modules), 10, qrcode_modules=modules)
+    for r, row in enumerate(modules):
+        for c, dark in enumerate(row):
+            if dark:
+                image.drawrect(r, c)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def run(encode, matrices):
+    """Encode every matrix, returning milliseconds per code and mean size"""
+    start_time = time.perf_counter()
+    sizes = [len(encode(modules)) for modules in matrices]
+    elapsed = time.perf_counter() - start_time
+    return elapsed / len(matrices) * 1000, sum(sizes) / len(sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark QR PNG encoding')
+    parser.add_argument('--codes', type=int, default=500, help='QR codes to encode per run')
+    args = parser.parse_args()
+
+    print("⏱️  PNG Writer Benchmark")
+    print("=" * 50)
+    print(f"📊 Olarm codes per run: {args.codes:,}")
+
+    matrices = [qr_matrix(format_qr_data('olarm', f"{1234500000000 + i}", f"{i % 1000000:06d}", f"{i:016X}"), 'olarm')
+                for i in range(args.codes)]
+
+    pil_time, pil_size = run(pil_png, matrices)
+    direct_time, direct_size = run(matrix_png, matrices)
+
+    print(f"🐢 PIL:     {pil_time:7.3f} ms per code, {pil_size:7.0f} bytes")
+    print(f"🚀 Direct:  {direct_time:7.3f} ms per code, {direct_size:7.0f} bytes")
+    print(f"📈 Speed-up: {pil_time / direct_time:.1f}x, {100 - direct_size * 100 / pil_size:.0f}% smaller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+QR Layout Benchmark
+Compares fitting every code with qrcode against the precomputed
+fixed-version layout, with the best mask per code and with a fixed mask
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'getDEVUID'))
+
+from qr_formats import format_qr_data
+from qr_render import render_qr_png
+
+
+def olarm_payload(i):
+    return format_qr_data('olarm', f"{1234500000000 + i}", f"{i % 1000000:06d}", f"{i:016X}")
+
+
+def run(codes, **render_args):
+    """Render codes in-process and return milliseconds per code"""
+    payloads = [olarm_payload(i) for i in range(codes)]
+    start_time = time.perf_counter()
+    for qr_data in payloads:
+        render_qr_png(qr_data, **render_args)
+    return (time.perf_counter() - start_time) / codes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark fixed-version QR layouts')
+    parser.add_argument('--codes', type=int, default=500, help='QR codes to render per run')
+    parser.add_argument('--mask', type=int, default=2, choices=range(8), metavar='0-7',
+                        help='Mask pattern for the fixed-mask run')
+    args = parser.parse_args()
+
+    print("⏱️  QR Layout Benchmark")
+    print("=" * 50)
+    print(f"📊 Olarm codes per run: {args.codes:,}")
+
+    # Build the cached layouts before timing
+    render_qr_png(olarm_payload(0), format_type='olarm')
+    render_qr_png(olarm_payload(0), format_type='olarm', mask_pattern=args.mask)
+
+    fitted = run(args.codes)
+    layout = run(args.codes, format_type='olarm')
+    fixed_mask = run(args.codes, format_type='olarm', mask_pattern=args.mask)
+
+    print(f"🐢 Fitted:             {fitted:7.3f} ms per code")
+    print(f"🚀 Fixed layout:       {layout:7.3f} ms per code ({fitted / layout:.1f}x)")
+    print(f"🚀 Layout + mask {args.mask}:   {fixed_mask:7.3f} ms per code ({fitted / fixed_mask:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
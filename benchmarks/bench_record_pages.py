@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Records Page Benchmark
+Times loading a page of the GUI records table as qr_records grows,
+comparing the old unindexed ORDER BY created_at LIMIT 20 with RecordPager
+"""
+
+import os
+import sqlite3
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'getDEVUID'))
+
+from qr_database import RecordPager
+
+COLUMNS = ('id', 'serial_number', 'verification_code', 'dev_uid', 'created_at', 'qr_filename', 'device_name')
+
+
+def create_table(rows):
+    conn = sqlite3.connect(':memory:')
+    conn.execute('''
+        CREATE TABLE qr_records (
+            id INTEGER PRIMARY KEY,
+            serial_number TEXT NOT NULL,
+            verification_code TEXT NOT NULL,
+            dev_uid TEXT NOT NULL,
+            device_name TEXT,
+            qr_filename TEXT NOT NULL,
+            created_at TIMESTAMP
+        )
+    ''')
+    conn.executemany('''
+        INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', ((i, f'SN{i:012d}', f'{i % 1000000:06d}', f'{i:016X}', f'qr_{i}.png',
+           f'2025-01-01T00:00:00.{i:07d}+02:00') for i in range(1, rows + 1)))
+    conn.commit()
+    return conn
+
+
+def timed(function, repeat=20):
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start_time) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark records table paging')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 10000, 1000000], help='Table sizes to try')
+    args = parser.parse_args()
+
+    print("⏱️  Records Page Benchmark")
+    print("=" * 50)
+    print(f"{'Rows':>10} {'Old LIMIT 20':>13} {'First page':>11} {'Page 100':>9}  (ms)")
+
+    for rows in args.rows:
+        conn = create_table(rows)
+        old = timed(lambda: conn.execute(f'''
+            SELECT {', '.join(COLUMNS)} FROM qr_records ORDER BY created_at DESC LIMIT 20
+        ''').fetchall(), repeat=3)
+
+        pager = RecordPager(conn, COLUMNS)
+        first = timed(lambda: pager.fetch())
+        key = None
+        for _ in range(min(99, (rows - 1) // pager.page_size)):
+            _, key = pager.fetch(key)
+        deep = timed(lambda: pager.fetch(key))
+
+        print(f"{rows:>10,} {old:>13.3f} {first:>11.3f} {deep:>9.3f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+QR Rendering Pool Benchmark
+Measures QR codes rendered per second against the number of worker processes
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'getDEVUID'))
+
+from qr_render import RenderJob, RenderPool
+
+
+def olarm_payload(i):
+    return f"https://olarm.com/o/flxr?a={1234500000000 + i},{i:016X},{i % 1000000:06d}"
+
+
+def run(workers, codes, output_dir):
+    """Render codes to files and return codes per second"""
+    jobs = ((i, RenderJob(olarm_payload(i), os.path.join(output_dir, f"qr_{i}.png"))) for i in range(codes))
+    with RenderPool(workers) as pool:
+        start_time = time.perf_counter()
+        rendered = sum(1 for _, result in pool.imap(jobs) if result and not result.error)
+        elapsed = time.perf_counter() - start_time
+    if rendered != codes:
+        print(f"❌ Only {rendered} of {codes} codes rendered")
+        sys.exit(1)
+    return codes / elapsed
+
+
+def main():
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description='Benchmark the QR rendering pool')
+    parser.add_argument('--codes', type=int, default=2000, help='QR codes to render per run')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, 8, cpu_count} & set(range(1, cpu_count + 1))),
+                        help='Worker counts to try')
+    args = parser.parse_args()
+
+    print("⏱️  QR Rendering Pool Benchmark")
+    print("=" * 50)
+    print(f"📊 Codes per run: {args.codes:,}  CPUs: {cpu_count}")
+    print(f"{'Workers':>8} {'Codes/s':>10} {'Speed-up':>9}")
+
+    output_dir = tempfile.mkdtemp()
+    try:
+        baseline = None
+        for workers in args.workers:
+            rate = run(workers, args.codes, output_dir)
+            baseline = baseline or rate
+            print(f"{workers:>8} {rate:>10.1f} {rate / baseline:>8.2f}x")
+    finally:
+        shutil.rmtree(output_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Scan Pipeline Benchmark
+Provisions a run of boards with a simulated DevUID read and the real
+generate path (render, PNG file, database commit, queued Excel export),
+comparing one-after-the-other processing with ScanPipeline, which reads the
+next board while the previous one is generated. Reports cycle time per unit.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'getDEVUID'))
+
+from excel_export import ExportWorker, CLI_LAYOUT
+from qr_database import ThreadConnections, write_transaction
+from qr_formats import format_qr_data
+from qr_migrations import migrate
+from qr_render import render_qr_png
+from scan_pipeline import ScanPipeline
+
+
+class Station:
+    """The generate side of one provisioning station on a scratch database"""
+
+    def __init__(self, read_delay):
+        self.read_delay = read_delay
+        self.conn = ThreadConnections('qr_codes.db')
+        migrate(self.conn)
+        self.export_worker = ExportWorker('qr_codes.db', CLI_LAYOUT, quiet_period=60)
+        self.reads = 0
+
+    def read_devuid(self):
+        time.sleep(self.read_delay)
+        self.reads += 1
+        return f"{self.reads:016X}"
+
+    def generate(self, serial_number, verification_code, dev_uid):
+        png = render_qr_png(format_qr_data('olarm', serial_number, verification_code, dev_uid))
+        filename = f"qr_code_{serial_number}.png"
+        with open(filename, 'wb') as f:
+            f.write(png)
+
+        def insert():
+            # Same ID choice as the GUI
+            record_id = (self.conn.execute('SELECT MAX(id) FROM qr_records').fetchone()[0] or 0) + 1
+            self.conn.execute('''
+                INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (record_id, serial_number, verification_code, dev_uid, filename))
+            return record_id
+
+        record_id = write_transaction(self.conn, insert)
+        self.export_worker.share_png(filename, png)
+        self.export_worker.request()
+        return record_id
+
+    def close(self):
+        self.export_worker.stop(flush=False)
+        self.conn.close()
+
+
+def run(mode, units, read_delay):
+    test_dir = tempfile.mkdtemp()
+    original_cwd = os.getcwd()
+    os.chdir(test_dir)
+    try:
+        station = Station(read_delay)
+        cycle_times = []
+        start_time = time.perf_counter()
+        if mode == 'sequential':
+            last_done = start_time
+            for i in range(units):
+                station.generate(f"SN{i:06d}", '123456', station.read_devuid())
+                done = time.perf_counter()
+                cycle_times.append(done - last_done)
+                last_done = done
+        else:
+            pipeline = ScanPipeline(station.read_devuid, station.generate)
+            futures = [pipeline.submit(f"SN{i:06d}", '123456') for i in range(units)]
+            cycle_times = [future.result().cycle_time for future in futures]
+            pipeline.close()
+        elapsed = time.perf_counter() - start_time
+        station.close()
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(test_dir)
+
+    mean_cycle = sum(cycle_times) / len(cycle_times) * 1000
+    print(f"{mode:<11} {units / elapsed:>9.1f} {mean_cycle:>11.1f} {max(cycle_times) * 1000:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the single-scan provisioning pipeline')
+    parser.add_argument('--units', type=int, default=50, help='Boards provisioned per run')
+    parser.add_argument('--read-ms', type=float, default=30.0,
+                        help='Simulated DevUID read time on a running OpenOCD session (ms)')
+    args = parser.parse_args()
+
+    print("⏱️  Scan Pipeline Benchmark")
+    print("=" * 50)
+    print(f"{args.units} boards queued, {args.read_ms:.0f} ms DevUID read")
+    print(f"{'Mode':<11} {'Units/s':>9} {'Cycle (ms)':>11} {'Worst (ms)':>11}")
+    for mode in ('sequential', 'pipeline'):
+        run(mode, args.units, args.read_ms / 1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+QR Service Load Test
+Starts the HTTP service in-process on a scratch database and drives it with
+concurrent keep-alive clients, reporting throughput and latency percentiles
+for /generate and record lookups. Compares against starting the CLI once per
+code, which is what callers paid before the service.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import argparse
+import asyncio
+import json
+
+GETDEVUID = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'getDEVUID')
+sys.path.insert(0, GETDEVUID)
+
+from qr_service import QRService, BackgroundServer
+
+
+async def client(host, port, requests, latencies):
+    """One keep-alive connection sending (method, path, payload) requests in turn"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for method, path, payload in requests:
+            body = json.dumps(payload).encode() if payload is not None else b''
+            start_time = time.perf_counter()
+            writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+                         f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while (line := await reader.readline()) not in (b'\r\n', b''):
+                name, _, value = line.decode().partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start_time)
+            if status >= 400:
+                raise RuntimeError(f"{method} {path} answered {status}")
+    finally:
+        writer.close()
+
+
+async def load(host, port, clients, requests_for):
+    latencies = []
+    start_time = time.perf_counter()
+    await asyncio.gather(*(client(host, port, requests_for(c), latencies) for c in range(clients)))
+    return time.perf_counter() - start_time, sorted(latencies)
+
+
+def report(name, elapsed, latencies):
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    print(f"{name:<10} {len(latencies) / elapsed:>9.0f} {percentile(0.5):>8.2f} "
+          f"{percentile(0.95):>8.2f} {percentile(0.99):>8.2f}")
+
+
+def cli_per_code(codes):
+    """Seconds per code when every code starts a fresh CLI process"""
+    start_time = time.perf_counter()
+    for i in range(codes):
+        subprocess.run([sys.executable, os.path.join(GETDEVUID, 'qr_generator_cli.py'),
+                        f'CLI{i}', '123456', 'E5DDA7D74D91EC53'],
+                       check=True, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - start_time) / codes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the local QR HTTP service')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent keep-alive clients')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per client and endpoint')
+    parser.add_argument('--cli-codes', type=int, default=5, help='Codes generated through the CLI for comparison')
+    args = parser.parse_args()
+
+    test_dir = tempfile.mkdtemp()
+    original_cwd = os.getcwd()
+    os.chdir(test_dir)
+    try:
+        service = QRService(export_quiet_period=5.0)
+        server = BackgroundServer(service)
+        print("⏱️  QR Service Load Test")
+        print("=" * 50)
+        print(f"{args.clients} clients x {args.requests} requests, keep-alive")
+        print(f"{'Endpoint':<10} {'Req/s':>9} {'p50':>8} {'p95':>8} {'p99':>8}  (ms)")
+
+        def generate(c):
+            return [('POST', '/generate', {'serial_number': f'SN{c:02d}{i:06d}', 'verification_code': '123456',
+                                           'dev_uid': f'{c:04X}{i:012X}'}) for i in range(args.requests)]
+
+        def lookup(c):
+            return [('GET', f'/records?serial_number=SN{c:02d}{i:06d}', None) for i in range(args.requests)]
+
+        report('generate', *asyncio.run(load(server.host, server.port, args.clients, generate)))
+        report('lookup', *asyncio.run(load(server.host, server.port, args.clients, lookup)))
+        server.stop()
+        service.close()
+
+        if args.cli_codes:
+            print(f"\nCLI process per code: {cli_per_code(args.cli_codes) * 1000:.0f} ms")
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Sharded Excel Export Benchmark
+Builds a history of several production days, then times the incremental
+export after each new record on the last day, once for the single
+qr_records.xlsx and once with one workbook per SAST day, where only the
+current day is rewritten
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'getDEVUID'))
+
+from excel_export import IncrementalExcelExporter, ShardedExcelExporter, CLI_LAYOUT
+from qr_migrations import migrate
+from qr_render import render_qr_png
+
+START = datetime(2025, 1, 1, 6, 0)
+
+
+def add_records(conn, first_id, count, day, slot=0):
+    """Insert count records, ten seconds apart from the given slot of a working day (UTC timestamps)"""
+    rows = []
+    for i in range(first_id, first_id + count):
+        filename = f"qr_code_SN{i:06d}.png"
+        with open(filename, 'wb') as f:
+            f.write(render_qr_png(f"https://olarm.com/o/flxr?a=SN{i:06d},E5DDA7D74D91EC53,123456"))
+        created_at = START + timedelta(days=day, seconds=(slot + i - first_id) * 10)
+        rows.append((i, f"SN{i:06d}", '123456', 'E5DDA7D74D91EC53', filename, created_at.strftime("%Y-%m-%d %H:%M:%S")))
+    conn.executemany('''
+        INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+
+
+def run(name, conn, exporter, days, per_day, exports):
+    exporter.export(full=True)
+    next_id = conn.execute('SELECT MAX(id) FROM qr_records').fetchone()[0] + 1
+    start_time = time.perf_counter()
+    for i in range(exports):
+        # New records land on the last day, which is still in production
+        add_records(conn, next_id + i, 1, days - 1, per_day + i)
+        exporter.export()
+    elapsed = time.perf_counter() - start_time
+    print(f"{name:<9} {elapsed / exports * 1000:>14.1f}")
+    conn.execute('DELETE FROM qr_records WHERE id >= ?', (next_id,))
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark single-file and day-sharded incremental Excel exports')
+    parser.add_argument('--days', type=int, default=5, help='Production days already in the history')
+    parser.add_argument('--per-day', type=int, default=400, help='Records per production day')
+    parser.add_argument('--exports', type=int, default=5, help='New records, each followed by an export')
+    args = parser.parse_args()
+
+    test_dir = tempfile.mkdtemp()
+    original_cwd = os.getcwd()
+    os.chdir(test_dir)
+    try:
+        conn = sqlite3.connect('qr_codes.db')
+        migrate(conn)
+        for day in range(args.days):
+            add_records(conn, day * args.per_day + 1, args.per_day, day)
+
+        print("⏱️  Sharded Excel Export Benchmark")
+        print("=" * 50)
+        print(f"{args.days} days of {args.per_day} records, {args.exports} incremental exports")
+        print(f"{'Export':<9} {'ms per export':>14}")
+        run('single', conn, IncrementalExcelExporter(conn, CLI_LAYOUT), args.days, args.per_day, args.exports)
+        run('by day', conn, ShardedExcelExporter(conn, CLI_LAYOUT, 'day'), args.days, args.per_day, args.exports)
+        conn.close()
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Streaming Excel Export Benchmark
+Rebuilds qr_records.xlsx for a synthetic history with the in-memory openpyxl
+Workbook and with the streaming XLSX writer, reporting time, peak Python
+memory (tracemalloc), file size and the number of media parts for each.
+Every serial is generated --regenerations times with identical images, which
+the exporter stores once; --thumbnails embeds downscaled images.
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'getDEVUID'))
+
+from excel_export import IncrementalExcelExporter, CLI_LAYOUT
+from qr_migrations import migrate
+from qr_render import render_qr_png
+
+
+def populate(conn, records, regenerations):
+    rows = []
+    for i in range(1, records + 1):
+        serial = f"SN{(i - 1) // regenerations + 1:06d}"
+        filename = f"qr_code_{serial}_{i}.png"
+        with open(filename, 'wb') as f:
+            f.write(render_qr_png(f"https://olarm.com/o/flxr?a={serial},E5DDA7D74D91EC53,123456"))
+        rows.append((i, serial, '123456', 'E5DDA7D74D91EC53', filename))
+    conn.executemany('''
+        INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+
+
+def run(name, conn, stream_threshold, thumbnails):
+    exporter = IncrementalExcelExporter(conn, CLI_LAYOUT, stream_threshold=stream_threshold, thumbnails=thumbnails)
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    result = exporter.export(full=True)
+    elapsed = time.perf_counter() - start_time
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    size = os.path.getsize(exporter.filename)
+    with zipfile.ZipFile(exporter.filename) as archive:
+        media = sum(name.startswith('xl/media/') for name in archive.namelist())
+    print(f"{name:<10} {result.total:>9} {elapsed:>9.2f} {peak / 2**20:>12.1f} {size / 2**20:>10.1f} {media:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark in-memory and streaming Excel rebuilds')
+    parser.add_argument('--records', type=int, nargs='+', default=[1000, 5000],
+                        help='History sizes to export')
+    parser.add_argument('--stream-only', action='store_true',
+                        help='Skip the openpyxl Workbook (for very large histories)')
+    parser.add_argument('--regenerations', type=int, default=1,
+                        help='Times each serial is generated with an identical image')
+    parser.add_argument('--thumbnails', action='store_true',
+                        help='Embed images downscaled to the layout size')
+    args = parser.parse_args()
+
+    print("⏱️  Streaming Excel Export Benchmark")
+    print("=" * 50)
+    print(f"{'Engine':<10} {'Records':>9} {'Seconds':>9} {'Peak MiB':>12} {'File MiB':>10} {'Media':>7}")
+    for records in args.records:
+        test_dir = tempfile.mkdtemp()
+        original_cwd = os.getcwd()
+        os.chdir(test_dir)
+        try:
+            conn = sqlite3.connect('qr_codes.db')
+            migrate(conn)
+            populate(conn, records, max(1, args.regenerations))
+            if not args.stream_only:
+                run('openpyxl', conn, float('inf'), args.thumbnails)
+            run('streaming', conn, 0, args.thumbnails)
+            conn.close()
+        finally:
+            os.chdir(original_cwd)
+            shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    main()
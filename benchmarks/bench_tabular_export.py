@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tabular Export Benchmark
+Times a full CSV export and an incremental sync of a few new
+records against a full Excel rebuild (streaming writer) of the same
+history. Parquet and Arrow are included when pyarrow is installed.
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'getDEVUID'))
+
+from excel_export import IncrementalExcelExporter, CLI_LAYOUT
+from qr_migrations import migrate
+from qr_render import render_qr_png
+from tabular_export import export_records
+
+try:
+    import pyarrow
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+
+def populate(conn, first_id, records):
+    png = render_qr_png("https://olarm.com/o/flxr?a=SN000000,E5DDA7D74D91EC53,123456")
+    rows = []
+    for i in range(first_id, first_id + records):
+        filename = f"qr_code_SN{i:06d}.png"
+        with open(filename, 'wb') as f:
+            f.write(png)
+        rows.append((i, f"SN{i:06d}", '123456', 'E5DDA7D74D91EC53', filename))
+    conn.executemany('''
+        INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+
+
+def timed(name, records, action):
+    start_time = time.perf_counter()
+    action()
+    elapsed = time.perf_counter() - start_time
+    print(f"{name:<16} {records:>9} {elapsed * 1000:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark tabular exports against the Excel export')
+    parser.add_argument('--records', type=int, default=20000, help='Records in the history')
+    parser.add_argument('--new', type=int, default=10, help='Records added before the incremental sync')
+    args = parser.parse_args()
+
+    test_dir = tempfile.mkdtemp()
+    original_cwd = os.getcwd()
+    os.chdir(test_dir)
+    try:
+        conn = sqlite3.connect('qr_codes.db')
+        migrate(conn)
+        populate(conn, 1, args.records)
+
+        print("⏱️  Tabular Export Benchmark")
+        print("=" * 50)
+        print(f"{'Export':<16} {'Records':>9} {'Milliseconds':>12}")
+        timed('Excel rebuild', args.records,
+              lambda: IncrementalExcelExporter(conn, CLI_LAYOUT, stream_threshold=0).export(full=True))
+        timed('CSV full', args.records, lambda: export_records(conn, 'records.csv'))
+        if PYARROW_AVAILABLE:
+            timed('Parquet full', args.records, lambda: export_records(conn, 'records.parquet'))
+            timed('Arrow full', args.records, lambda: export_records(conn, 'records.arrow'))
+        else:
+            print("⚠️  pyarrow not installed, skipping Parquet and Arrow")
+
+        populate(conn, args.records + 1, args.new)
+        timed('CSV since seq', args.new, lambda: export_records(conn, 'delta.csv', since_seq=args.records))
+        timed('CSV append', args.new,
+              lambda: export_records(conn, 'records.csv', since_seq=args.records, append=True))
+        conn.close()
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(test_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+DevUID reading from STM32WL boards through OpenOCD
+Starting OpenOCD and initialising the ST-Link takes seconds, while reading
+the unique ID takes milliseconds. OpenOcdSession therefore keeps one
+OpenOCD server running and reads each new board over its TCL RPC port.
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+OPENOCD_PATH = './openocd/bin/openocd'
+OPENOCD_CONFIGS = ('interface/stlink.cfg', 'target/stm32wlx.cfg')
+
+# STM32WL UID64 in system memory; the DevUID is its two words swapped
+DEVUID_ADDRESS = 0x1FFF7580
+
+TCL_PORT = 6666
+
+# ST-Link V2, V2-1 and V3 variants
+STLINK_VENDOR_ID = '0483'
+STLINK_PRODUCT_IDS = {'3744', '3748', '374a', '374b', '374d', '374e', '374f', '3752', '3753', '3754', '3757'}
+SYSFS_USB_DEVICES = '/sys/bus/usb/devices'
+
+Probe = namedtuple('Probe', ['serial', 'location'])
+
+
+class DevUIDError(RuntimeError):
+    """The probe or target did not deliver a DevUID"""
+
+
+class DevUIDCancelled(DevUIDError):
+    """The read was cancelled with OpenOcdSession.cancel()"""
+
+
+def parse_devuid(output, address=DEVUID_ADDRESS):
+    """Extract the DevUID from `mdw <address> 3` output, None if it is not there
+
+    OpenOCD prints the words as '0x1fff7580: 0080e115 0577b5a7 ffffffff';
+    the DevUID is the second word followed by the first.
+    """
+    prefix = f'0x{address:08x}:'
+    for line in output.splitlines():
+        parts = line.strip().lower().split()
+        if len(parts) >= 3 and parts[0] == prefix:
+            try:
+                first, second = (int(word, 16) for word in parts[1:3])
+            except ValueError:
+                return None
+            return f'{second:08X}{first:08X}'
+    return None
+
+
+def read_devuid_once(openocd_path=OPENOCD_PATH, configs=OPENOCD_CONFIGS, address=DEVUID_ADDRESS,
+                     extra_commands=(), timeout=15.0):
+    """Read the DevUID with a fresh OpenOCD run: init, reset halt, mdw, exit
+
+    Pays the probe and target start-up on every read; OpenOcdSession
+    avoids that when boards are read one after another.
+    """
+    args = [openocd_path]
+    for config in configs:
+        args += ['-f', config]
+    for command in (*extra_commands, 'gdb_port disabled', 'tcl_port disabled', 'telnet_port disabled',
+                    'init', 'reset halt', f'mdw 0x{address:08x} 3', 'exit'):
+        args += ['-c', command]
+    try:
+        result = subprocess.run(args, capture_output=True, text=True, errors='replace', timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise DevUIDError(f"OpenOCD did not finish within {timeout:g} seconds")
+    output = result.stdout + result.stderr
+    devuid = parse_devuid(output, address)
+    if devuid is None:
+        last_lines = ' / '.join(line for line in output.strip().splitlines()[-3:]) or 'no output'
+        raise DevUIDError(f"DevUID not found in OpenOCD output: {last_lines}")
+    return devuid
+
+
+class OpenOcdSession:
+    """One long-running OpenOCD server, read over its TCL RPC port
+
+    The server is started on the first read. Every read then sends
+    `reset halt` and `mdw` for the board on the probe; only after a probe
+    or target failure is the server restarted. Reads are serialised, so
+    one session can be shared between threads, and a read can be
+    cancelled from another thread.
+    """
+
+    COMMAND_TOKEN = b'\x1a'
+
+    def __init__(self, openocd_path=OPENOCD_PATH, configs=OPENOCD_CONFIGS, host='127.0.0.1', port=TCL_PORT,
+                 address=DEVUID_ADDRESS, extra_commands=(), start_timeout=10.0, command_timeout=5.0):
+        self.openocd_path = openocd_path
+        self.configs = list(configs)
+        self.host = host
+        self.port = port
+        self.address = address
+        self.extra_commands = list(extra_commands)
+        self.start_timeout = start_timeout
+        self.command_timeout = command_timeout
+        self.process = None
+        self.sock = None
+        self.log = deque(maxlen=200)
+        self.starts = 0
+        self._lock = threading.RLock()
+        self._cancelled = threading.Event()
+        self._on_status = None
+
+    def command_line(self):
+        args = [self.openocd_path]
+        for config in self.configs:
+            args += ['-f', config]
+        args += ['-c', f'tcl_port {self.port}', '-c', 'gdb_port disabled', '-c', 'telnet_port disabled']
+        for command in self.extra_commands:
+            args += ['-c', command]
+        return args
+
+    def start(self):
+        """Start OpenOCD and connect to its TCL RPC port
+
+        Raises FileNotFoundError if OpenOCD is missing and DevUIDError if it
+        exits (no probe, no target) or does not listen in time.
+        """
+        with self._lock:
+            self.close()
+            self.log.clear()
+            self.process = subprocess.Popen(self.command_line(), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                            stdin=subprocess.DEVNULL, text=True, errors='replace')
+            self.starts += 1
+            threading.Thread(target=self._drain, args=(self.process,), name="openocd-output", daemon=True).start()
+
+            deadline = time.monotonic() + self.start_timeout
+            while True:
+                if self._cancelled.is_set():
+                    raise DevUIDCancelled("DevUID read cancelled")
+                if self.process.poll() is not None:
+                    raise DevUIDError(f"OpenOCD exited: {self.last_output()}")
+                try:
+                    self.sock = socket.create_connection((self.host, self.port), timeout=self.command_timeout)
+                    return
+                except OSError:
+                    if time.monotonic() >= deadline:
+                        self.close()
+                        raise DevUIDError(f"OpenOCD did not open port {self.port}: {self.last_output()}")
+                    time.sleep(0.05)
+
+    def _drain(self, process):
+        # Keeps the pipe from filling up, remembers the output for error
+        # messages and streams it to the status callback of a running read
+        for line in process.stdout:
+            line = line.rstrip()
+            self.log.append(line)
+            self._status('connecting', line)
+
+    def _status(self, stage, detail=None):
+        on_status = self._on_status
+        if on_status is not None:
+            try:
+                on_status(stage, detail)
+            except Exception as e:
+                print(f"⚠️  Warning: DevUID status callback failed: {e}")
+
+    def last_output(self, lines=3):
+        return ' / '.join(list(self.log)[-lines:]) or 'no output'
+
+    def send(self, command):
+        """Run a command over TCL RPC and return its output"""
+        with self._lock:
+            if self.sock is None:
+                raise DevUIDError("OpenOCD session is not running")
+            self.sock.sendall(command.encode('utf-8') + self.COMMAND_TOKEN)
+            data = b''
+            while not data.endswith(self.COMMAND_TOKEN):
+                chunk = self.sock.recv(4096)
+                if not chunk:
+                    raise ConnectionError("OpenOCD closed the TCL RPC connection")
+                data += chunk
+            return data[:-1].decode('utf-8', errors='replace')
+
+    def read_devuid(self, retries=1, on_status=None):
+        """Read the DevUID of the board on the probe
+
+        A failed read restarts OpenOCD and tries again, up to retries times.
+        on_status(stage, detail) is called as the read progresses: with
+        'connecting' and each line OpenOCD prints while it starts, then
+        'halted' and finally 'read' with the DevUID.
+        """
+        with self._lock:
+            self._cancelled.clear()
+            self._on_status = on_status
+            try:
+                for attempt in range(retries + 1):
+                    try:
+                        if self.sock is None:
+                            self._status('connecting')
+                            self.start()
+                        self.send('reset halt')
+                        self._status('halted')
+                        output = self.send(f'mdw 0x{self.address:08x} 3')
+                        devuid = parse_devuid(output, self.address)
+                        if devuid is None:
+                            raise DevUIDError(f"DevUID not found in OpenOCD output: {output.strip() or 'no output'}")
+                        self._status('read', devuid)
+                        return devuid
+                    except FileNotFoundError:
+                        raise
+                    except (OSError, DevUIDError) as e:
+                        self.close()
+                        if self._cancelled.is_set():
+                            raise DevUIDCancelled("DevUID read cancelled") from None
+                        if attempt == retries:
+                            raise e if isinstance(e, DevUIDError) else DevUIDError(f"OpenOCD connection failed: {e}")
+            finally:
+                self._on_status = None
+
+    def cancel(self):
+        """Abort a read in progress from another thread
+
+        OpenOCD is stopped, as it may be stuck on the probe, so the next
+        read starts a fresh server.
+        """
+        self._cancelled.set()
+        sock, process = self.sock, self.process
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if process is not None and process.poll() is None:
+            process.terminate()
+
+    def close(self):
+        """Disconnect and stop the OpenOCD server"""
+        with self._lock:
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
+            if self.process is not None:
+                if self.process.poll() is None:
+                    self.process.terminate()
+                    try:
+                        self.process.wait(timeout=2)
+                    except subprocess.TimeoutExpired:
+                        self.process.kill()
+                        self.process.wait()
+                self.process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def list_probes(sysfs_root=None):
+    """Connected ST-Links with their USB serial and location, from Linux sysfs
+
+    The location is the sysfs device name (e.g. '1-2.3'), which is the
+    form OpenOCD's `adapter usb location` takes. Other platforms have no
+    sysfs, so there DevUIDError is raised instead of finding no probes.
+    """
+    if sysfs_root is None:
+        if not sys.platform.startswith('linux'):
+            raise DevUIDError("Probe enumeration is only supported on Linux; pass probe serials in the panel file")
+        sysfs_root = SYSFS_USB_DEVICES
+
+    def read(device, name):
+        try:
+            with open(os.path.join(sysfs_root, device, name)) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    if not os.path.isdir(sysfs_root):
+        return []
+    probes = []
+    for device in sorted(os.listdir(sysfs_root)):
+        if read(device, 'idVendor') == STLINK_VENDOR_ID and read(device, 'idProduct') in STLINK_PRODUCT_IDS:
+            probes.append(Probe(read(device, 'serial'), device))
+    return probes
+
+
+def select_probe_command(probe):
+    """OpenOCD command that binds an instance to one probe
+
+    A Probe, or a string taken as an ST-Link serial number, is selected by
+    serial; a Probe without one by USB location.
+    """
+    if isinstance(probe, Probe):
+        if probe.serial:
+            return f'adapter serial {probe.serial}'
+        return f'adapter usb location {probe.location}'
+    return f'adapter serial {probe}'
+
+
+class MultiProbeReader:
+    """Reads every board of a gang-programming fixture at once
+
+    Each probe gets its own OpenOcdSession, bound to it by serial or USB
+    location and listening on its own TCL port, and all are read in
+    parallel. Sessions stay up between panels, so a panel costs about as
+    long as a single read.
+    """
+
+    def __init__(self, probes, base_port=TCL_PORT, **session_options):
+        self.sessions = {
+            probe: OpenOcdSession(port=base_port + i, extra_commands=[select_probe_command(probe)], **session_options)
+            for i, probe in enumerate(probes)
+        }
+        self.executor = ThreadPoolExecutor(max(1, len(self.sessions)), thread_name_prefix="devuid-probe")
+
+    def read_all(self):
+        """Read all probes, returns ({probe: DevUID}, {probe: error}) for the ones that failed"""
+        futures = {probe: self.executor.submit(session.read_devuid) for probe, session in self.sessions.items()}
+        devuids, errors = {}, {}
+        for probe, future in futures.items():
+            try:
+                devuids[probe] = future.result()
+            except (DevUIDError, OSError) as e:
+                errors[probe] = e
+        return devuids, errors
+
+    def close(self):
+        self.executor.shutdown()
+        for session in self.sessions.values():
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
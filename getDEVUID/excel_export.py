@@ -0,0 +1,832 @@
+"""
+Excel export shared by the CLI and GUI
+Keeps qr_records.xlsx in step with the database, either by rebuilding it
+or incrementally by appending new records and dropping deleted ones
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple, OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from io import BytesIO
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from PIL import Image as PILImage
+from openpyxl import Workbook, load_workbook
+from openpyxl.drawing.image import Image as OpenpyxlImage
+from openpyxl.styles import Font, Alignment, PatternFill
+from openpyxl.utils import get_column_letter
+from openpyxl.writer.excel import ExcelWriter
+
+from qr_database import connect
+from xlsx_stream import StreamingXlsxWriter
+
+EXCEL_FILENAME = "qr_records.xlsx"
+
+# Rebuilds of at least this many records are streamed straight to disk
+# instead of building an openpyxl Workbook in memory
+STREAM_THRESHOLD = 2000
+STREAM_CHUNK_SIZE = 1000
+
+# Thumbnails remembered by the digest of their original, so a serial
+# regenerated with the same image is only downscaled once
+THUMBNAIL_MEMO_SIZE = 256
+
+# PNGs handed over with share_png() wait here until their record is
+# exported; a record deleted or never saved leaves its PNG behind, so
+# past this many the oldest are dropped and read from disk if needed
+PNG_CACHE_SIZE = 256
+
+# Sharded exports: one workbook per production day (SAST) or per block of IDs
+SHARD_MODES = ('day', 'range')
+SHARD_SIZE = 10000
+SAST_MODIFIER = '+2 hours'
+
+ExportResult = namedtuple('ExportResult', ['added', 'removed', 'total', 'rebuilt'])
+
+
+def image_digest(png):
+    """Key under which identical images share one media part"""
+    return hashlib.sha1(png).digest()
+
+
+def downscale_png(png, size):
+    """Resize PNG bytes to the size the sheet shows them at
+
+    The original is kept when it is already that size or the thumbnail
+    would not be smaller (the 1-bit renders from qr_render often are).
+    """
+    with PILImage.open(BytesIO(png)) as img:
+        if img.size == tuple(size):
+            return png
+        thumbnail = img.convert('L').resize(size, PILImage.Resampling.BOX)
+    buffer = BytesIO()
+    thumbnail.save(buffer, format='PNG')
+    data = buffer.getvalue()
+    return data if len(data) < len(png) else png
+
+
+def _format_cli_created(created_at):
+    """Format a stored timestamp the way the CLI workbook shows it"""
+    return datetime.fromisoformat(created_at).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ExcelLayout:
+    """Columns, styling and row mapping for one flavour of qr_records.xlsx"""
+
+    def __init__(self, title, headers, column_widths, record_columns, header_font,
+                 header_fill, header_alignment, image_column, image_size, row_height,
+                 id_column, created_column, filename_index, created_index,
+                 row_values, format_created, missing_text, error_text,
+                 sequence_column=None):
+        self.title = title
+        self.headers = headers
+        self.column_widths = column_widths
+        self.record_columns = record_columns
+        self.header_font = header_font
+        self.header_fill = header_fill
+        self.header_alignment = header_alignment
+        self.image_column = image_column
+        self.image_size = image_size
+        self.row_height = row_height
+        self.id_column = id_column
+        self.created_column = created_column
+        self.filename_index = filename_index
+        self.created_index = created_index
+        self.row_values = row_values
+        self.format_created = format_created
+        self.missing_text = missing_text
+        self.error_text = error_text
+        self.sequence_column = sequence_column
+
+    def record_key(self, record_id, created_at):
+        """Identity of a record as it appears in the workbook"""
+        return (record_id, self.format_created(created_at))
+
+
+# Layout written by qr_generator_cli.py
+CLI_LAYOUT = ExcelLayout(
+    title="QR Code Records",
+    headers=['#', 'ID', 'Serial Number', 'Verification Code', 'DevUID', 'QR Code', 'Created At'],
+    column_widths=[5, 8, 20, 18, 20, 25, 22],
+    record_columns="id, serial_number, verification_code, dev_uid, qr_filename, created_at",
+    header_font=Font(bold=True, color="FFFFFF"),
+    header_fill=PatternFill(start_color="366092", end_color="366092", fill_type="solid"),
+    header_alignment=Alignment(horizontal="center", vertical="center"),
+    image_column=6,
+    image_size=(120, 120),
+    row_height=90,
+    id_column=2,
+    created_column=7,
+    filename_index=4,
+    created_index=5,
+    row_values=lambda record, sequence: {
+        1: sequence,
+        2: record[0],
+        3: record[1],
+        4: record[2],
+        5: record[3],
+        7: _format_cli_created(record[5]),
+    },
+    format_created=_format_cli_created,
+    missing_text=lambda filename: f"File not found: {filename}",
+    error_text=lambda filename: f"Error loading: {filename}",
+    sequence_column=1,
+)
+
+# Layout written by qr_generator_gui.py
+GUI_LAYOUT = ExcelLayout(
+    title="QR Records",
+    headers=['ID', 'Serial Number', 'Verification Code', 'DevUID', 'Device Name', 'QR Code', 'Created At (SAST)'],
+    column_widths=[8, 20, 15, 20, 15, 15, 20],
+    record_columns="id, serial_number, verification_code, dev_uid, device_name, qr_filename, created_at",
+    header_font=Font(bold=True),
+    header_fill=PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid"),
+    header_alignment=Alignment(horizontal="center"),
+    image_column=6,
+    image_size=(100, 100),
+    row_height=75,
+    id_column=1,
+    created_column=7,
+    filename_index=5,
+    created_index=6,
+    row_values=lambda record, sequence: {
+        1: record[0],
+        2: record[1],
+        3: record[2],
+        4: record[3],
+        5: record[4] if record[4] else "",
+        7: record[6],
+    },
+    format_created=str,
+    missing_text=lambda filename: "[QR file not found]",
+    error_text=lambda filename: "[QR file not found]",
+)
+
+
+class _EmbeddedImage(OpenpyxlImage):
+    """openpyxl image that keeps its PNG bytes so repeated saves skip the disk"""
+
+    def __init__(self, data):
+        self._png = data
+        self.digest = image_digest(data)
+        self.media_id = None
+        super().__init__(BytesIO(data))
+
+    def _data(self):
+        return self._png
+
+    @property
+    def path(self):
+        # Set by _SharedMediaWriter; images with the same bytes share it
+        return self._path.format(self.media_id or self._id, self.format)
+
+
+class _SharedMediaWriter(ExcelWriter):
+    """ExcelWriter that stores each distinct image once
+
+    Every anchor keeps its own drawing relationship, but relationships
+    for identical images point at the same media part.
+    """
+
+    def __init__(self, workbook, archive):
+        super().__init__(workbook, archive)
+        self._media = {}
+
+    def _write_drawing(self, drawing):
+        for img in drawing.images:
+            if isinstance(img, _EmbeddedImage):
+                img.media_id = self._media.setdefault(img.digest, len(self._media) + 1)
+        super()._write_drawing(drawing)
+
+    def _write_images(self):
+        written = set()
+        for img in self._images:
+            if img.path not in written:
+                written.add(img.path)
+                self._archive.writestr(img.path[1:], img._data())
+
+
+def cache_png(png_cache, qr_filename, png):
+    """Add a PNG to an OrderedDict png_cache, dropping the oldest past PNG_CACHE_SIZE"""
+    png_cache[qr_filename] = png
+    png_cache.move_to_end(qr_filename)
+    while len(png_cache) > PNG_CACHE_SIZE:
+        png_cache.popitem(last=False)
+
+
+class IncrementalExcelExporter:
+    """Keeps an Excel workbook in step with the qr_records table
+
+    The workbook stays loaded between exports. Each incremental export
+    compares the (ID, created at) pairs already in the sheet with the
+    database, appends rows for new records and deletes rows for removed
+    ones. Nothing is written when the workbook is already current.
+
+    PNGs handed over with share_png() are embedded from memory instead of
+    being read back from the QR image files. Identical images are stored
+    once, and with thumbnails each one is downscaled to the size the
+    sheet shows it at before it is embedded.
+
+    Workbooks of stream_threshold records or more are written with
+    StreamingXlsxWriter, so memory stays flat however long the history.
+    They are never loaded into openpyxl: any change streams the whole
+    file again, which at that size is far cheaper than loading and saving
+    it. The (ID, created at) pairs last streamed are remembered to tell
+    whether anything changed; a file this exporter did not write is
+    streamed again rather than read back, which costs less.
+    """
+
+    def __init__(self, conn, layout, filename=EXCEL_FILENAME, png_cache=None, stream_threshold=STREAM_THRESHOLD,
+                 thumbnails=False, where=None, params=()):
+        self.conn = conn
+        self.layout = layout
+        self.filename = filename
+        self.png_cache = OrderedDict() if png_cache is None else png_cache
+        self.stream_threshold = stream_threshold
+        self.thumbnails = thumbnails
+        self._thumbnails = OrderedDict()
+        # Only records matching where (an SQL condition) belong in this workbook
+        self._where = f'WHERE {where}' if where else ''
+        self._params = tuple(params)
+        self.wb = None
+        self.ws = None
+        self.rows = {}
+        self.images = {}
+        self._stamp = None
+        # Keys of the records in a streamed workbook, None when not known
+        self._streamed = None
+
+    def share_png(self, qr_filename, png):
+        """Hand over the PNG just written to qr_filename for the next export"""
+        cache_png(self.png_cache, qr_filename, png)
+
+    def export(self, full=False):
+        """Bring the workbook in line with the database"""
+        cursor = self.conn.cursor()
+        cursor.execute(f'SELECT id, created_at FROM qr_records {self._where} ORDER BY created_at ASC', self._params)
+        current = [self.layout.record_key(record_id, created_at)
+                   for record_id, created_at in cursor.fetchall()]
+        if len(current) >= self.stream_threshold:
+            return self._stream_export(current, full)
+
+        if full or not self._ensure_loaded():
+            return self._rebuild()
+
+        wanted = set(current)
+        removed_rows = [row for key, row in self.rows.items() if key not in wanted]
+        added_ids = [key[0] for key in current if key not in self.rows]
+
+        if not removed_rows and not added_ids:
+            return ExportResult(0, 0, len(current), False)
+
+        if removed_rows:
+            self._remove_rows(removed_rows)
+        for record in self._fetch_records(added_ids):
+            self._append_record(record)
+
+        self._save()
+        return ExportResult(len(added_ids), len(removed_rows), len(current), False)
+
+    def _stream_export(self, current, full):
+        """Stream the workbook again unless it already holds exactly the current records"""
+        wanted = set(current)
+        known = None if full else self._streamed_keys()
+        if known == wanted:
+            return ExportResult(0, 0, len(current), False)
+        result = self._stream_rebuild()
+        if known is None:
+            return result
+        return ExportResult(len(wanted - known), len(known - wanted), result.total, True)
+
+    def _streamed_keys(self):
+        """Keys of the records this exporter last streamed, None if the file has changed since"""
+        if self._streamed is None or not os.path.exists(self.filename) or self._stamp != self._file_stamp():
+            return None
+        return self._streamed
+
+    def _ensure_loaded(self):
+        """Make sure the workbook in memory matches the file on disk"""
+        if not os.path.exists(self.filename):
+            return False
+        if self.wb is not None and self._stamp == self._file_stamp():
+            return True
+        return self._load()
+
+    def _file_stamp(self):
+        stat = os.stat(self.filename)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load(self):
+        """Load an existing workbook and index the records it holds"""
+        self.wb = self.ws = self._streamed = None
+        try:
+            wb = load_workbook(self.filename)
+        except Exception as e:
+            print(f"⚠️  Warning: Could not read {self.filename}, rebuilding it: {e}")
+            return False
+
+        ws = wb[self.layout.title] if self.layout.title in wb.sheetnames else wb.active
+        header = [cell.value for cell in ws[1]][:len(self.layout.headers)]
+        if header != self.layout.headers:
+            return False
+
+        rows = {}
+        for row_idx, values in enumerate(ws.iter_rows(min_row=2, values_only=True), 2):
+            record_id = values[self.layout.id_column - 1]
+            if record_id is None:
+                continue
+            rows[(record_id, str(values[self.layout.created_column - 1]))] = row_idx
+
+        # Swap the loaded images for ones with a fixed size and a plain cell
+        # anchor so rows can be shifted when records are removed
+        images = {}
+        for loaded in ws._images:
+            anchor = getattr(loaded.anchor, '_from', None)
+            if anchor is None:
+                continue
+            image = _EmbeddedImage(loaded._data())
+            images[anchor.row + 1] = image
+        ws._images = []
+        for row_idx, image in images.items():
+            self._place_image(ws, image, row_idx)
+
+        self.wb, self.ws = wb, ws
+        self.rows = rows
+        self.images = images
+        self._stamp = self._file_stamp()
+        return True
+
+    def _new_workbook(self):
+        """Create an empty workbook with headers and column widths"""
+        wb = Workbook()
+        ws = wb.active
+        ws.title = self.layout.title
+
+        for col, header in enumerate(self.layout.headers, 1):
+            cell = ws.cell(row=1, column=col, value=header)
+            cell.font = self.layout.header_font
+            cell.fill = self.layout.header_fill
+            cell.alignment = self.layout.header_alignment
+
+        for col, width in enumerate(self.layout.column_widths, 1):
+            ws.column_dimensions[get_column_letter(col)].width = width
+
+        return wb, ws
+
+    def _rebuild(self):
+        """Write the whole workbook from scratch"""
+        total = self.conn.execute(f'SELECT COUNT(*) FROM qr_records {self._where}', self._params).fetchone()[0]
+        if total >= self.stream_threshold:
+            return self._stream_rebuild()
+
+        self.wb, self.ws = self._new_workbook()
+        self.rows = {}
+        self.images = {}
+
+        cursor = self.conn.cursor()
+        cursor.execute(f'''
+            SELECT {self.layout.record_columns}
+            FROM qr_records
+            {self._where}
+            ORDER BY created_at ASC
+        ''', self._params)
+        for record in cursor:
+            self._append_record(record)
+
+        self._save()
+        return ExportResult(len(self.rows), 0, total, True)
+
+    def _stream_rebuild(self):
+        """Rebuild by streaming rows and images into the file in chunks"""
+        self.wb = self.ws = None
+        self.rows = {}
+        self.images = {}
+        self._stamp = self._streamed = None
+
+        keys = set()
+        cursor = self.conn.cursor()
+        cursor.execute(f'''
+            SELECT {self.layout.record_columns}
+            FROM qr_records
+            {self._where}
+            ORDER BY created_at ASC
+        ''', self._params)
+        with StreamingXlsxWriter(self.filename, self.layout) as writer:
+            while records := cursor.fetchmany(STREAM_CHUNK_SIZE):
+                for record in records:
+                    png, text = self._record_image(record)
+                    writer.append(self.layout.row_values(record, writer.rows + 1), png, text)
+                    keys.add(self.layout.record_key(record[0], record[self.layout.created_index]))
+        self._streamed = keys
+        self._stamp = self._file_stamp()
+        return ExportResult(writer.rows, 0, writer.rows, True)
+
+    def _record_image(self, record):
+        """PNG bytes for a record's QR code, or None and the text shown instead"""
+        qr_filename = record[self.layout.filename_index]
+        png = self.png_cache.pop(qr_filename, None)
+        if png is None and not os.path.exists(qr_filename):
+            return None, self.layout.missing_text(qr_filename)
+        try:
+            if png is None:
+                with open(qr_filename, 'rb') as f:
+                    png = f.read()
+            if self.thumbnails:
+                png = self._thumbnail(png)
+            return png, None
+        except Exception as e:
+            print(f"⚠️  Warning: Could not load QR code image {qr_filename}: {e}")
+            return None, self.layout.error_text(qr_filename)
+
+    def _thumbnail(self, png):
+        """Downscaled PNG for the image column, memoised by image digest"""
+        digest = image_digest(png)
+        thumbnail = self._thumbnails.get(digest)
+        if thumbnail is None:
+            thumbnail = downscale_png(png, self.layout.image_size)
+        self._thumbnails[digest] = thumbnail
+        self._thumbnails.move_to_end(digest)
+        while len(self._thumbnails) > THUMBNAIL_MEMO_SIZE:
+            self._thumbnails.popitem(last=False)
+        return thumbnail
+
+    def _fetch_records(self, record_ids):
+        """Fetch full rows for the given IDs, oldest first"""
+        records = []
+        cursor = self.conn.cursor()
+        for start in range(0, len(record_ids), 500):
+            chunk = record_ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'''
+                SELECT {self.layout.record_columns}
+                FROM qr_records
+                WHERE id IN ({placeholders})
+            ''', chunk)
+            records.extend(cursor.fetchall())
+        records.sort(key=lambda record: record[self.layout.created_index])
+        return records
+
+    def _append_record(self, record):
+        """Append one record, with its QR image, below the last row"""
+        ws = self.ws
+        row_idx = ws.max_row + 1
+        for col, value in self.layout.row_values(record, row_idx - 1).items():
+            ws.cell(row=row_idx, column=col, value=value)
+
+        qr_filename = record[self.layout.filename_index]
+        png, text = self._record_image(record)
+        if png is not None:
+            try:
+                image = _EmbeddedImage(png)
+                self._place_image(ws, image, row_idx)
+                self.images[row_idx] = image
+            except Exception as e:
+                text = self.layout.error_text(qr_filename)
+                print(f"⚠️  Warning: Could not load QR code image {qr_filename}: {e}")
+        if text is not None:
+            ws.cell(row=row_idx, column=self.layout.image_column, value=text)
+
+        record_id = record[0]
+        self.rows[self.layout.record_key(record_id, record[self.layout.created_index])] = row_idx
+
+    def _place_image(self, ws, image, row_idx):
+        """Anchor an image in the QR column of the given row"""
+        image.width, image.height = self.layout.image_size
+        image.anchor = f"{get_column_letter(self.layout.image_column)}{row_idx}"
+        ws.add_image(image)
+        ws.row_dimensions[row_idx].height = self.layout.row_height
+
+    def _remove_rows(self, removed_rows):
+        """Delete rows and shift the images and row heights below them"""
+        ws = self.ws
+        removed_rows = sorted(removed_rows)
+        removed = set(removed_rows)
+        last_row = ws.max_row
+
+        for row_idx in reversed(removed_rows):
+            ws.delete_rows(row_idx)
+
+        def shifted(row_idx):
+            return row_idx - bisect_left(removed_rows, row_idx)
+
+        self.rows = {key: shifted(row) for key, row in self.rows.items() if row not in removed}
+
+        ws._images = []
+        images = {}
+        for row_idx, image in sorted(self.images.items()):
+            if row_idx not in removed:
+                images[shifted(row_idx)] = image
+        for row_idx in range(removed_rows[0], last_row + 1):
+            ws.row_dimensions[row_idx].height = None
+        for row_idx, image in images.items():
+            self._place_image(ws, image, row_idx)
+        self.images = images
+
+        if self.layout.sequence_column:
+            for row_idx in range(removed_rows[0], ws.max_row + 1):
+                ws.cell(row=row_idx, column=self.layout.sequence_column, value=row_idx - 1)
+
+    def _save(self):
+        # Workbook.save() with a writer that shares identical media parts
+        self.wb.properties.modified = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+        _SharedMediaWriter(self.wb, ZipFile(self.filename, 'w', ZIP_DEFLATED, allowZip64=True)).save()
+        self._streamed = None
+        self._stamp = self._file_stamp()
+
+
+class ShardedExcelExporter:
+    """Keeps one workbook per production day (SAST) or per block of IDs
+
+    Shards are named after the base filename, e.g. qr_records_2025-01-31.xlsx
+    or qr_records_000001-010000.xlsx. Only the newest shard is kept up to
+    date like a single workbook. Once records land in a later shard, the
+    older one gets a last export and is frozen: it is listed in the
+    <base>_shards.json manifest and never written again, so an export only
+    costs as much as the current shard. A frozen shard whose file has gone
+    is written once more from the database.
+
+    Deleted IDs are handed out again (see IdAllocator), so a new record
+    can land in a frozen range shard. Range shards are therefore frozen
+    with a fingerprint of their records, checked with one primary-key
+    range lookup per shard, and exported again when it no longer matches.
+    """
+
+    def __init__(self, conn, layout, shard_by='day', filename=EXCEL_FILENAME, shard_size=SHARD_SIZE,
+                 png_cache=None, stream_threshold=STREAM_THRESHOLD, thumbnails=False):
+        if shard_by not in SHARD_MODES:
+            raise ValueError(f"Unknown shard mode: {shard_by}")
+        self.conn = conn
+        self.layout = layout
+        self.shard_by = shard_by
+        self.shard_size = shard_size
+        self.png_cache = OrderedDict() if png_cache is None else png_cache
+        self.stream_threshold = stream_threshold
+        self.thumbnails = thumbnails
+        self._root, self._ext = os.path.splitext(filename)
+        self.manifest_filename = f"{self._root}_shards.json"
+        self.frozen = self._load_manifest()
+        # The newest shard's exporter stays loaded between exports
+        self._current_key = self._current = None
+
+    @property
+    def filename(self):
+        """Workbook of the newest shard, None before the first export"""
+        return self._current.filename if self._current else None
+
+    def share_png(self, qr_filename, png):
+        """Hand over the PNG just written to qr_filename for the next export"""
+        cache_png(self.png_cache, qr_filename, png)
+
+    def shard_filename(self, key):
+        if self.shard_by == 'day':
+            label = key
+        else:
+            label = f"{key * self.shard_size + 1:06d}-{(key + 1) * self.shard_size:06d}"
+        return f"{self._root}_{label}{self._ext}"
+
+    def _shard_condition(self, key):
+        """SQL condition selecting the records of one shard"""
+        if self.shard_by == 'range':
+            return 'id BETWEEN ? AND ?', (key * self.shard_size + 1, (key + 1) * self.shard_size)
+        # The created_at bounds let the index narrow the scan; timestamps
+        # are stored in UTC or with an offset, so the day is worked out in SQL
+        day = date.fromisoformat(key)
+        return (f"created_at >= ? AND created_at < ? AND date(created_at, '{SAST_MODIFIER}') = ?",
+                (str(day - timedelta(days=1)), str(day + timedelta(days=1)), key))
+
+    def _fingerprint(self, key):
+        """Summary of a range shard's records that changes when one is removed or added
+
+        The julianday() total tells a reused ID from the record it replaced.
+        """
+        where, params = self._shard_condition(key)
+        row = self.conn.execute(f'SELECT COUNT(*), TOTAL(id), TOTAL(julianday(created_at)) '
+                                f'FROM qr_records WHERE {where}', params).fetchone()
+        return list(row)
+
+    def _shard_keys(self, after=None):
+        """Keys of the shards holding records, oldest first, optionally only those after a key"""
+        if self.shard_by == 'range':
+            rows = self.conn.execute('SELECT DISTINCT (id - 1) / ? FROM qr_records WHERE id > ?',
+                                     (self.shard_size, -1 if after is None else (after + 1) * self.shard_size))
+        else:
+            rows = self.conn.execute(f"SELECT DISTINCT date(created_at, '{SAST_MODIFIER}') FROM qr_records "
+                                     "WHERE created_at >= ?", ('' if after is None else after,))
+        return sorted(key for key, in rows if key is not None and (after is None or key > after))
+
+    def _exporter(self, key):
+        where, params = self._shard_condition(key)
+        return IncrementalExcelExporter(self.conn, self.layout, self.shard_filename(key), self.png_cache,
+                                        self.stream_threshold, self.thumbnails, where, params)
+
+    def export(self, full=False):
+        """Bring the current shard in line with the database, freezing shards that have closed
+
+        full rebuilds the shards that are not frozen yet.
+        """
+        added = removed = 0
+        rebuilt = False
+
+        def run(exporter, full):
+            nonlocal added, removed, rebuilt
+            result = exporter.export(full=full)
+            added += result.added
+            removed += result.removed
+            rebuilt = rebuilt or result.rebuilt
+            return result
+
+        changed = False
+        for key, shard in sorted(self.frozen.items()):
+            # Taken before the export, so a record arriving meanwhile shows up next time
+            fingerprint = self._fingerprint(key) if self.shard_by == 'range' else None
+            if not os.path.exists(shard['filename']):
+                print(f"⚠️  Warning: Frozen shard {shard['filename']} is missing, writing it again")
+                shard['records'] = run(self._exporter(key), True).total
+            elif fingerprint != shard.get('fingerprint'):
+                # An ID in this range was removed or handed out again
+                shard['records'] = run(self._exporter(key), False).total
+            else:
+                continue
+            if fingerprint is not None:
+                shard['fingerprint'] = fingerprint
+            changed = True
+
+        # Every shard before the newest has closed since the last export
+        keys = self._shard_keys(max(self.frozen) if self.frozen else None)
+        current_key, current = self._current_key, self._current
+        self._current_key = self._current = None
+        total = 0
+        for key in keys:
+            exporter = current if key == current_key else self._exporter(key)
+            closed = key != keys[-1]
+            fingerprint = self._fingerprint(key) if closed and self.shard_by == 'range' else None
+            result = run(exporter, full)
+            if closed:
+                self.frozen[key] = {'filename': exporter.filename, 'records': result.total}
+                if fingerprint is not None:
+                    self.frozen[key]['fingerprint'] = fingerprint
+                changed = True
+            else:
+                total = result.total
+                self._current_key, self._current = key, exporter
+
+        if changed:
+            self._save_manifest()
+        total += sum(shard['records'] for shard in self.frozen.values())
+        return ExportResult(added, removed, total, rebuilt)
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_filename):
+            return {}
+        try:
+            with open(self.manifest_filename, encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest['shard_by'] != self.shard_by or manifest.get('shard_size') != self._manifest_size():
+                print(f"⚠️  Warning: {self.manifest_filename} is for other shards, ignoring it")
+                return {}
+            return {shard.pop('key'): shard for shard in manifest['frozen']}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠️  Warning: Could not read {self.manifest_filename}: {e}")
+            return {}
+
+    def _manifest_size(self):
+        return self.shard_size if self.shard_by == 'range' else None
+
+    def _save_manifest(self):
+        manifest = {
+            'shard_by': self.shard_by,
+            'shard_size': self._manifest_size(),
+            'frozen': [{'key': key, **shard} for key, shard in sorted(self.frozen.items())],
+        }
+        partial = f"{self.manifest_filename}.partial"
+        with open(partial, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(partial, self.manifest_filename)
+
+
+class ExportWorker:
+    """Runs Excel exports on a background thread
+
+    Every request() restarts a quiet-period timer, so a burst of changes
+    is merged into a single export once the burst is over. The worker has
+    its own database connection and never blocks the caller. With shard_by
+    it keeps a ShardedExcelExporter instead of a single workbook.
+    """
+
+    def __init__(self, db_path, layout, filename=EXCEL_FILENAME, quiet_period=2.0, on_status=None,
+                 thumbnails=False, shard_by=None, shard_size=SHARD_SIZE):
+        self.db_path = db_path
+        self.layout = layout
+        self.filename = filename
+        self.quiet_period = quiet_period
+        self.on_status = on_status
+        self.thumbnails = thumbnails
+        self.shard_by = shard_by
+        self.shard_size = shard_size
+        self._cond = threading.Condition()
+        self._pending = False
+        self._full = False
+        self._due = 0.0
+        self._running = False
+        self._stopping = False
+        self._png_cache = OrderedDict()
+        self._thread = threading.Thread(target=self._run, name="excel-export", daemon=True)
+        self._thread.start()
+
+    def request(self, full=False, immediate=False):
+        """Queue an export, merging it with any export already waiting"""
+        with self._cond:
+            if self._stopping:
+                return
+            self._pending = True
+            self._full = self._full or full
+            delay = 0.0 if immediate else self.quiet_period
+            self._due = time.monotonic() + delay
+            self._cond.notify_all()
+
+    def share_png(self, qr_filename, png):
+        """Hand over a freshly written PNG so the export embeds it from memory"""
+        cache_png(self._png_cache, qr_filename, png)
+
+    def flush(self, timeout=None):
+        """Run any waiting export now and wait until the worker is idle"""
+        with self._cond:
+            if self._pending:
+                self._due = time.monotonic()
+                self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._pending and not self._running, timeout)
+
+    def stop(self, flush=True, timeout=None):
+        """Stop the worker, optionally running a waiting export first"""
+        with self._cond:
+            self._stopping = True
+            if not flush:
+                self._pending = False
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _next_job(self):
+        """Block until an export is due, returns its full flag or None to exit"""
+        with self._cond:
+            while True:
+                if self._pending and (self._stopping or time.monotonic() >= self._due):
+                    full = self._full
+                    self._pending = self._full = False
+                    self._running = True
+                    return full
+                if self._stopping:
+                    return None
+                timeout = self._due - time.monotonic() if self._pending else None
+                self._cond.wait(timeout)
+
+    def _run(self):
+        conn = exporter = None
+        try:
+            while True:
+                full = self._next_job()
+                if full is None:
+                    break
+                self._report(f"📊 Updating {self.filename}...")
+                try:
+                    if exporter is None:
+                        conn = connect(self.db_path)
+                        try:
+                            exporter = self._create_exporter(conn)
+                        except BaseException:
+                            # The next export opens a fresh connection
+                            conn.close()
+                            conn = None
+                            raise
+                    result = exporter.export(full=full)
+                    self._report(f"📊 Excel file updated: {exporter.filename or self.filename} "
+                                 f"({result.total} records, +{result.added} / -{result.removed})")
+                except Exception as e:
+                    self._report(f"Failed to export to Excel: {str(e)}", error=True)
+                finally:
+                    with self._cond:
+                        self._running = False
+                        self._cond.notify_all()
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _create_exporter(self, conn):
+        if self.shard_by:
+            return ShardedExcelExporter(conn, self.layout, self.shard_by, self.filename, self.shard_size,
+                                        self._png_cache, thumbnails=self.thumbnails)
+        return IncrementalExcelExporter(conn, self.layout, self.filename, self._png_cache,
+                                        thumbnails=self.thumbnails)
+
+    def _report(self, message, error=False):
+        if self.on_status:
+            try:
+                self.on_status(message, error)
+            except Exception as e:
+                print(f"⚠️  Warning: Export status callback failed: {e}")
+        else:
+            print(("❌ " if error else "") + message)
@@ -1,14 +1,7 @@
-import pexpect
-
-WL_DEVUI_ADDRESS = "0x1FFF7580"
-openocd_cmd = (
-    f'./openocd/bin/openocd -f interface/stlink.cfg '
-    f'-f target/stm32wlx.cfg '
-    f'-c "init" '
-    f'-c "reset halt" '
-    f'-c "mdw {WL_DEVUI_ADDRESS} 3" '
-    f'-c "exit"'
-)
+import sys
+
+from devuid_reader import DevUIDError, read_devuid_once
+
 
 def reverse_and_remove_spaces(uid_string):
     """Reverse the UID and remove spaces"""
@@ -19,23 +12,26 @@ def reverse_and_remove_spaces(uid_string):
     # Join without spaces
     return ''.join(reversed_values)
 
-# Run the OpenOCD command using pexpect
-child = pexpect.spawn(openocd_cmd, encoding='utf-8', timeout=10)
-# Wait for the command to complete
-child.expect(pexpect.EOF)
-# Read the full output
-output = str(child.before)  # Captures the entire output
-# Find the line with the memory data
-lines = output.split("\r\n")
-# print(lines)
-for line in lines:
-    if str.lower(WL_DEVUI_ADDRESS) in line:
-        # Split the line into parts and extract the last 3 chunks
-        parts = line.split()[1:]
-        devui = parts[1] + parts[0]
-        formatted_uid = " ".join(devui[i:i+2].upper() for i in range(0, len(devui), 2))
-        print("Device UID:", formatted_uid)
-        
-        # Print the reversed and space-removed version
-        reversed_uid = reverse_and_remove_spaces(formatted_uid)
-        print("Reversed UID (no spaces):", reversed_uid)
\ No newline at end of file
+
+def main():
+    # One OpenOCD run: init, reset halt, read the UID words, exit
+    try:
+        devui = read_devuid_once(timeout=10)
+    except FileNotFoundError:
+        print("OpenOCD not found at ./openocd/bin/openocd")
+        return 1
+    except DevUIDError as e:
+        print(f"DevUID read failed: {e}")
+        return 1
+
+    formatted_uid = " ".join(devui[i:i+2] for i in range(0, len(devui), 2))
+    print("Device UID:", formatted_uid)
+
+    # Print the reversed and space-removed version
+    reversed_uid = reverse_and_remove_spaces(formatted_uid)
+    print("Reversed UID (no spaces):", reversed_uid)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
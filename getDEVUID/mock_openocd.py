@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Stand-in for OpenOCD with an STM32WL on an ST-Link
+Takes the same -f/-c arguments as the real binary. Given an `exit` command
+it runs the commands in order and exits, like a one-shot `init; reset halt;
+mdw ...; exit` call; otherwise it serves TCL RPC on the tcl_port like a
+long-running server. Memory reads answer with the DevUID words in OpenOCD's
+`0x1fff7580: xxxxxxxx xxxxxxxx xxxxxxxx` format.
+
+Behaviour is set through environment variables (see environment()):
+    MOCK_OPENOCD_DEVUID       DevUID of the board (default: derived from the
+                              selected probe serial, or 0577B5A70080E115)
+    MOCK_OPENOCD_START_DELAY  seconds spent on probe and target start-up
+    MOCK_OPENOCD_READ_DELAY   seconds per memory read
+    MOCK_OPENOCD_PROBES       comma-separated serials of connected probes;
+                              selecting any other fails to open the probe
+    MOCK_OPENOCD_FAIL         failure mode, one of FAILURE_MODES
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import zlib
+
+DEFAULT_DEVUID = '0577B5A70080E115'
+DEFAULT_TCL_PORT = 6666
+
+FAILURE_MODES = {
+    'no-probe': "no ST-Link found, OpenOCD exits at start-up",
+    'no-target': "the probe cannot connect to the target, OpenOCD exits at start-up",
+    'read-error': "memory reads answer with an error",
+    'drop': "OpenOCD dies on the first memory read (probe unplugged)",
+    'hang': "memory reads never answer",
+}
+
+ENVIRONMENT = {
+    'devuid': 'MOCK_OPENOCD_DEVUID',
+    'start_delay': 'MOCK_OPENOCD_START_DELAY',
+    'read_delay': 'MOCK_OPENOCD_READ_DELAY',
+    'probes': 'MOCK_OPENOCD_PROBES',
+    'fail': 'MOCK_OPENOCD_FAIL',
+}
+
+BANNER = (
+    "Open On-Chip Debugger 0.12.0 (mock)",
+    "Licensed under GNU GPL v2",
+    "Info : auto-selecting first available session transport \"hla_swd\". To override use 'transport select <transport>'.",
+)
+
+
+def environment(devuid=None, start_delay=None, read_delay=None, probes=None, fail=None):
+    """Environment variables that configure the mock, for os.environ or subprocess env"""
+    if fail is not None and fail not in FAILURE_MODES:
+        raise ValueError(f"Unknown failure mode: {fail}")
+    options = {'devuid': devuid, 'start_delay': start_delay, 'read_delay': read_delay,
+               'probes': ','.join(probes) if probes is not None else None, 'fail': fail}
+    return {ENVIRONMENT[name]: str(value) for name, value in options.items() if value is not None}
+
+
+def install(directory, name='openocd'):
+    """Write an executable that runs the mock with this interpreter, returns its path"""
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        f.write(f"#!{sys.executable}\n"
+                f"import sys\n"
+                f"sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r})\n"
+                f"from mock_openocd import main\n"
+                f"sys.exit(main())\n")
+    os.chmod(path, 0o755)
+    return path
+
+
+def devuid_for_serial(serial):
+    """The DevUID the mock reports for a probe, distinct for every serial"""
+    if not serial:
+        return DEFAULT_DEVUID
+    return f"0577B5A7{zlib.crc32(serial.encode()):08X}"
+
+
+def mdw_output(address, devuid, count=3):
+    """`mdw <address> <count>` output for a board with the given DevUID"""
+    words = [devuid[8:16].lower(), devuid[0:8].lower()] + ['ffffffff'] * (count - 2)
+    return f"0x{address:08x}: {' '.join(words[:count])} \n"
+
+
+class MockOpenOcd:
+    """One mock OpenOCD run, configured from its arguments and the environment"""
+
+    def __init__(self, argv, env=os.environ):
+        self.commands = [argv[i + 1] for i, arg in enumerate(argv[:-1]) if arg == '-c']
+        self.serial = self._command_argument('adapter serial')
+        tcl_port = self._command_argument('tcl_port')
+        self.tcl_port = None if tcl_port == 'disabled' else int(tcl_port or DEFAULT_TCL_PORT)
+
+        probes = env.get(ENVIRONMENT['probes'])
+        self.probes = None if probes is None else [p for p in probes.split(',') if p]
+        # Without `adapter serial` OpenOCD takes the first probe it finds
+        board_serial = self.serial or (self.probes[0] if self.probes else None)
+        self.devuid = env.get(ENVIRONMENT['devuid']) or devuid_for_serial(board_serial)
+        self.start_delay = float(env.get(ENVIRONMENT['start_delay']) or 0)
+        self.read_delay = float(env.get(ENVIRONMENT['read_delay']) or 0)
+        self.fail = env.get(ENVIRONMENT['fail']) or None
+
+    def _command_argument(self, name):
+        for command in self.commands:
+            if command.startswith(name + ' '):
+                return command[len(name) + 1:].strip()
+        return None
+
+    @staticmethod
+    def log(line):
+        print(line, flush=True)
+
+    def init(self):
+        """Open the probe and examine the target, returns False if OpenOCD would exit"""
+        for line in BANNER:
+            self.log(line)
+        time.sleep(self.start_delay)
+        if self.fail == 'no-probe' or (self.probes is not None and (
+                not self.probes or (self.serial is not None and self.serial not in self.probes))):
+            self.log("Error: open failed")
+            return False
+        self.log("Info : clock speed 500 kHz")
+        self.log(f"Info : STLINK V3J7M2 (API v3) VID:PID 0483:374E serial {self.serial or 'auto'}")
+        self.log("Info : Target voltage: 3.286000")
+        if self.fail == 'no-target':
+            self.log("Error: init mode failed (unable to connect to the target)")
+            return False
+        self.log("Info : [stm32wlx.cpu0] Cortex-M4 r0p1 processor detected")
+        self.log("Info : [stm32wlx.cpu0] target has 6 breakpoints, 4 watchpoints")
+        return True
+
+    def execute(self, command):
+        """Output of one command, None if OpenOCD would die"""
+        parts = command.split()
+        if not parts:
+            return ''
+        if parts[0] == 'reset' and parts[1:] == ['halt']:
+            return ("[stm32wlx.cpu0] halted due to debug-request, current mode: Thread \n"
+                    "xPSR: 0x01000000 pc: 0x08000ad8 msp: 0x20008000\n")
+        if parts[0] == 'mdw':
+            time.sleep(self.read_delay)
+            if self.fail == 'drop':
+                return None
+            if self.fail == 'hang':
+                while True:
+                    time.sleep(3600)
+            try:
+                address = int(parts[1], 0)
+                count = int(parts[2]) if len(parts) > 2 else 1
+            except (IndexError, ValueError):
+                return f"Error: invalid command arguments: {command}\n"
+            if self.fail == 'read-error':
+                return f"Error: Failed to read memory at 0x{address:08x}\n"
+            return mdw_output(address, self.devuid, count)
+        return ''
+
+    def run_once(self):
+        """Run the -c commands in order, as `openocd -c init ... -c exit` does"""
+        initialised = False
+        for command in self.commands:
+            if command == 'init' or (not initialised and command.split()[:1] in (['reset'], ['mdw'])):
+                if not self.init():
+                    return 1
+                initialised = True
+            if command in ('exit', 'shutdown'):
+                return 0
+            if command != 'init':
+                output = self.execute(command)
+                if output is None:
+                    self.log("Error: jtag status contains invalid mode value - communication failure")
+                    return 1
+                sys.stdout.write(output)
+                sys.stdout.flush()
+        return 0
+
+    def serve(self):
+        """Initialise, then answer TCL RPC until shut down"""
+        if not self.init():
+            return 1
+        if self.tcl_port is None:
+            self.log("Info : Listening on no TCL port")
+            while True:
+                time.sleep(3600)
+        server = socket.create_server(('127.0.0.1', self.tcl_port))
+        self.log(f"Info : Listening on port {self.tcl_port} for tcl connections")
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            data = b''
+            while chunk := conn.recv(4096):
+                data += chunk
+                while b'\x1a' in data:
+                    command, data = data.split(b'\x1a', 1)
+                    command = command.decode('utf-8', errors='replace').strip()
+                    if command == 'shutdown':
+                        conn.sendall(b'shutdown command invoked\n\x1a')
+                        os._exit(0)
+                    output = self.execute(command)
+                    if output is None:
+                        self.log("Error: jtag status contains invalid mode value - communication failure")
+                        os._exit(1)
+                    conn.sendall(output.encode('utf-8') + b'\x1a')
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    openocd = MockOpenOcd(argv)
+    if 'exit' in openocd.commands or 'shutdown' in openocd.commands:
+        return openocd.run_once()
+    return openocd.serve()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
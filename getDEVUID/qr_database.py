@@ -0,0 +1,327 @@
+"""
+Database helpers shared by the CLI and GUI
+"""
+
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DB_PATH = 'qr_codes.db'
+
+# How long a connection waits for another station's write lock (seconds),
+# and how often a write that still found the database locked is retried
+BUSY_TIMEOUT = 5.0
+WRITE_RETRIES = 5
+RETRY_DELAY = 0.05
+
+
+def connect(db_path=DB_PATH, check_same_thread=True):
+    """Open a connection tuned for several stations sharing one database file
+
+    WAL lets readers carry on while a writer commits, the busy timeout makes
+    a writer wait for the lock instead of failing at once, and
+    synchronous=NORMAL is still safe against application crashes in WAL mode.
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, check_same_thread=check_same_thread)
+    try:
+        if conn.execute('PRAGMA journal_mode').fetchone()[0] != 'wal':
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+            except sqlite3.OperationalError as e:
+                # WAL is a property of the file; the next connection switches it
+                if not is_locked(e):
+                    raise
+        conn.execute('PRAGMA synchronous=NORMAL')
+    except BaseException:
+        conn.close()
+        raise
+    return conn
+
+
+def is_locked(error):
+    """True for the errors SQLite raises while another connection holds a lock"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+def begin_write(conn, retries=WRITE_RETRIES):
+    """Start a BEGIN IMMEDIATE transaction, retrying while the database stays locked
+
+    Taking the write lock up front means reads made in the transaction,
+    such as picking the next ID, cannot be invalidated by another writer.
+    """
+    for attempt in range(retries + 1):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            return
+        except sqlite3.OperationalError as e:
+            if not is_locked(e) or attempt == retries:
+                raise
+        time.sleep(RETRY_DELAY * 2 ** attempt)
+
+
+def write_transaction(conn, work, retries=WRITE_RETRIES):
+    """Run work() in its own write transaction, returns its result
+
+    Inside an already open transaction work() simply joins it and the
+    caller commits.
+    """
+    if conn.in_transaction:
+        return work()
+    begin_write(conn, retries)
+    try:
+        result = work()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return result
+
+
+class ThreadConnections:
+    """One tuned connection per thread to the same database file
+
+    Flet runs event handlers on worker threads, so rather than sharing one
+    connection across them each thread gets its own. The object stands in
+    for a connection: execute(), commit() and the rest go to the calling
+    thread's connection.
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    @property
+    def conn(self):
+        """The calling thread's connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Only ever used by this thread, but close() may run on another
+            conn = self._local.conn = connect(self.db_path, check_same_thread=False)
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def close(self):
+        """Close the connections of every thread"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+
+# Secondary indexes on qr_records: name -> columns
+# created_at, id orders every view and export; serial_number and dev_uid are
+# what support searches by, with the history of a device in time order.
+# Records with the same code share one image in the content-addressed
+# store (qr_store), which looks its users up by qr_filename; created_at, id
+# keep the GUI filename search in display order.
+INDEXES = {
+    'idx_qr_records_created_at': 'created_at, id',
+    'idx_qr_records_serial_number': 'serial_number, created_at',
+    'idx_qr_records_dev_uid': 'dev_uid, created_at',
+    'idx_qr_records_qr_filename': 'qr_filename, created_at, id',
+}
+
+
+def ensure_indexes(conn, commit=True):
+    """Create any missing qr_records indexes"""
+    placeholders = ','.join('?' * len(INDEXES))
+    existing = {name for (name,) in conn.execute(f"""
+        SELECT name FROM sqlite_master WHERE type='index' AND name IN ({placeholders})
+    """, list(INDEXES))}
+    if len(existing) == len(INDEXES):
+        return
+
+    for name, columns in INDEXES.items():
+        if name not in existing:
+            conn.execute(f'CREATE INDEX {name} ON qr_records ({columns})')
+    if commit:
+        conn.commit()
+
+
+class IdAllocator:
+    """Hands out the lowest unused record ID without scanning the table
+
+    Deleted IDs are kept in the qr_free_ids table by triggers on
+    qr_records, so the next ID is the smaller of MIN(qr_free_ids) and
+    MAX(qr_records.id) + 1. Both are single primary-key index lookups.
+    The result is the same first gap the old walk over every ID found.
+    """
+
+    TRIGGERS = ('qr_free_ids_on_delete', 'qr_free_ids_on_insert', 'qr_free_ids_on_update')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.ensure_free_list()
+
+    def ensure_free_list(self):
+        """Create the free-list table and triggers, filling it on first use"""
+        if not self._free_list_missing():
+            return
+        write_transaction(self.conn, self._build_free_list)
+
+    def _free_list_missing(self):
+        placeholders = ','.join('?' * len(self.TRIGGERS))
+        count = self.conn.execute(f"""
+            SELECT COUNT(*) FROM sqlite_master
+            WHERE type='trigger' AND tbl_name='qr_records' AND name IN ({placeholders})
+        """, self.TRIGGERS).fetchone()[0]
+        return count != len(self.TRIGGERS)
+
+    def _build_free_list(self):
+        # Another station may have built it while this one waited for the lock
+        if not self._free_list_missing():
+            return
+        cursor = self.conn.cursor()
+
+        # Triggers are dropped together with the table (e.g. by a migration),
+        # so rebuild the free list from the IDs that exist right now
+        cursor.execute('CREATE TABLE IF NOT EXISTS qr_free_ids (id INTEGER PRIMARY KEY)')
+        cursor.execute('DELETE FROM qr_free_ids')
+        cursor.execute('''
+            WITH RECURSIVE seq(id) AS (
+                SELECT 1
+                UNION ALL
+                SELECT id + 1 FROM seq WHERE id < (SELECT MAX(id) FROM qr_records)
+            )
+            INSERT INTO qr_free_ids (id)
+            SELECT id FROM seq WHERE id NOT IN (SELECT id FROM qr_records)
+        ''')
+
+        for name in self.TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+        # A freed ID becomes available again
+        cursor.execute('''
+            CREATE TRIGGER qr_free_ids_on_delete AFTER DELETE ON qr_records
+            BEGIN
+                INSERT OR IGNORE INTO qr_free_ids (id) VALUES (OLD.id);
+            END
+        ''')
+        # A used ID leaves the free list; inserting past the end opens a gap
+        cursor.execute('''
+            CREATE TRIGGER qr_free_ids_on_insert AFTER INSERT ON qr_records
+            BEGIN
+                DELETE FROM qr_free_ids WHERE id = NEW.id;
+                INSERT OR IGNORE INTO qr_free_ids (id)
+                    WITH RECURSIVE gap(id) AS (
+                        SELECT COALESCE((SELECT MAX(id) FROM qr_records WHERE id < NEW.id), 0) + 1
+                        UNION ALL
+                        SELECT id + 1 FROM gap WHERE id + 1 < NEW.id
+                    )
+                    SELECT id FROM gap WHERE id < NEW.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER qr_free_ids_on_update AFTER UPDATE OF id ON qr_records
+            WHEN OLD.id <> NEW.id
+            BEGIN
+                INSERT OR IGNORE INTO qr_free_ids (id) VALUES (OLD.id);
+                DELETE FROM qr_free_ids WHERE id = NEW.id;
+            END
+        ''')
+
+    def next_id(self):
+        """Return the lowest positive ID not used by any record
+
+        Call it inside the write transaction that inserts the record, so
+        no other station can take the same ID in between.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT MIN(candidate) FROM (
+                SELECT MIN(id) AS candidate FROM qr_free_ids
+                UNION ALL
+                SELECT COALESCE(MAX(id), 0) + 1 FROM qr_records
+            )
+        ''')
+        return cursor.fetchone()[0]
+
+
+class RecordPager:
+    """Keyset pagination over qr_records, newest first
+
+    A page is addressed by the (created_at, id) key of the row just above
+    it, so every page is a range scan of page_size rows on the created_at
+    index, however deep into the history it is. With a db_path the next
+    page can be prefetched on a background thread with its own connection.
+    """
+
+    INDEX = 'idx_qr_records_created_at'
+
+    def __init__(self, conn, columns, page_size=20, db_path=None):
+        self.conn = conn
+        self.columns = list(columns)
+        self.page_size = page_size
+        self.db_path = db_path
+        self._id_index = self.columns.index('id')
+        self._created_index = self.columns.index('created_at')
+        self._generation = 0
+        self._prefetched = None
+        self._background = ThreadConnections(db_path) if db_path else None
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="record-prefetch") if db_path else None
+        ensure_indexes(conn)
+
+    def key(self, row):
+        """Keyset position of a fetched row"""
+        return (row[self._created_index], row[self._id_index])
+
+    def fetch(self, after=None):
+        """Return (rows, key of the next page or None) for the page below after"""
+        prefetched, self._prefetched = self._prefetched, None
+        if prefetched is not None:
+            key, generation, future = prefetched
+            if key == after and generation == self._generation:
+                try:
+                    return future.result()
+                except Exception:
+                    pass
+        return self._query(self.conn, after)
+
+    def prefetch(self, after):
+        """Start loading the page below after in the background"""
+        if self._executor is None or after is None:
+            return
+        self._prefetched = (after, self._generation,
+                            self._executor.submit(self._background_query, after))
+
+    def invalidate(self):
+        """Drop prefetched pages after records were added or removed"""
+        self._generation += 1
+        self._prefetched = None
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            self._background.close()
+
+    def _query(self, conn, after):
+        columns = ', '.join(self.columns)
+        if after is None:
+            cursor = conn.execute(f'''
+                SELECT {columns} FROM qr_records
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            ''', (self.page_size + 1,))
+        else:
+            cursor = conn.execute(f'''
+                SELECT {columns} FROM qr_records
+                WHERE (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            ''', (*after, self.page_size + 1))
+        rows = cursor.fetchall()
+        next_key = self.key(rows[self.page_size - 1]) if len(rows) > self.page_size else None
+        return rows[:self.page_size], next_key
+
+    def _background_query(self, after):
+        return self._query(self._background, after)
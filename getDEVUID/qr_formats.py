@@ -0,0 +1,119 @@
+"""
+QR payload formats shared by the CLI and GUI
+Each format is a formatter callable taking (serial_number,
+verification_code, dev_uid) and returning the QR payload string. New
+formats, such as customer-specific Olarm variants, are added with
+register_format() and show up in both user interfaces.
+"""
+
+import json
+import string
+from collections import OrderedDict, namedtuple
+
+DEFAULT_FORMAT = "olarm"
+
+QRFormat = namedtuple('QRFormat', ['name', 'label', 'description', 'formatter'])
+
+FORMATS = OrderedDict()
+
+# Compact JSON, same output as json.dumps(..., separators=(',', ':'))
+_json_encoder = json.JSONEncoder(separators=(',', ':'))
+
+_TEMPLATE_FIELDS = {'serial_number': 0, 'verification_code': 1, 'dev_uid': 2}
+
+
+def _compile_template(template):
+    """Turn a named-field template into a positional str.format method"""
+    parts = []
+    for literal, field, spec, conversion in string.Formatter().parse(template):
+        parts.append(literal.replace('{', '{{').replace('}', '}}'))
+        if field is None:
+            continue
+        if field not in _TEMPLATE_FIELDS:
+            raise ValueError(f"Unknown template field: {field}")
+        parts.append('{' + str(_TEMPLATE_FIELDS[field])
+                     + (f'!{conversion}' if conversion else '')
+                     + (f':{spec}' if spec else '') + '}')
+    return ''.join(parts).format
+
+
+def register_format(name, formatter=None, template=None, label=None, description=""):
+    """Register a payload format from a formatter callable or a template
+
+    Templates use str.format fields {serial_number}, {verification_code}
+    and {dev_uid}; they are compiled once into a positional formatter.
+    """
+    if formatter is None:
+        if template is None:
+            raise ValueError("register_format needs a formatter or a template")
+        formatter = _compile_template(template)
+    FORMATS[name] = QRFormat(name, label or name, description, formatter)
+    return FORMATS[name]
+
+
+def get_formatter(format_type):
+    """Return the formatter for a format, falling back to the default format"""
+    qr_format = FORMATS.get(format_type) or FORMATS[DEFAULT_FORMAT]
+    return qr_format.formatter
+
+
+def format_qr_data(format_type, serial_number, verification_code, dev_uid):
+    """Build the QR payload for one record"""
+    return get_formatter(format_type)(serial_number, verification_code, dev_uid)
+
+
+def format_many(rows, format_type=DEFAULT_FORMAT):
+    """Build payloads for many (serial_number, verification_code, dev_uid) rows
+
+    The formatter is looked up once for the whole batch.
+    """
+    formatter = get_formatter(format_type)
+    return [formatter(serial_number, verification_code, dev_uid)
+            for serial_number, verification_code, dev_uid in rows]
+
+
+# Olarm specific URL format: serial,devuid,verification_code
+register_format(
+    "olarm",
+    template="https://olarm.com/o/flxr?a={serial_number},{dev_uid},{verification_code}",
+    label="Olarm (recommended)",
+    description="Olarm (recommended) - Compatible with Olarm validation system",
+)
+register_format(
+    "json",
+    formatter=lambda serial_number, verification_code, dev_uid: _json_encoder.encode(
+        {"sn": serial_number, "vc": verification_code, "uid": dev_uid}
+    ),
+    label="JSON",
+    description='JSON - Structured data format {"sn":"...","vc":"...","uid":"..."}',
+)
+register_format(
+    "csv",
+    template="{serial_number},{verification_code},{dev_uid}",
+    label="CSV",
+    description="CSV - Comma-separated values: serial,verification,devuid",
+)
+register_format(
+    "pipe",
+    template="{serial_number}|{verification_code}|{dev_uid}",
+    label="Pipe-separated",
+    description="Pipe - Pipe-separated values: serial|verification|devuid",
+)
+register_format(
+    "compact",
+    template="{serial_number}:{verification_code}:{dev_uid}",
+    label="Compact",
+    description="Compact - Colon-separated: serial:verification:devuid",
+)
+register_format(
+    "labeled",
+    template="Serial Number: {serial_number}\nVerification Code: {verification_code}\nDevUID: {dev_uid}",
+    label="Labeled",
+    description="Labeled - Human-readable with labels (old format)",
+)
+register_format(
+    "url",
+    template="https://validate.example.com?sn={serial_number}&vc={verification_code}&uid={dev_uid}",
+    label="URL",
+    description="URL - Generic validation URL format",
+)
@@ -5,162 +5,123 @@ Generates QR codes with Serial Number, Verification Code, and DevUID
 Saves data to SQLite database
 """
 
-import qrcode
-import sqlite3
 from datetime import datetime
 import sys
 import os
-from openpyxl import Workbook
-from openpyxl.drawing.image import Image as OpenpyxlImage
-from openpyxl.styles import Font, Alignment, PatternFill
+import csv
+import json
+import argparse
 from PIL import Image
+from excel_export import IncrementalExcelExporter, ShardedExcelExporter, CLI_LAYOUT, SHARD_MODES, SHARD_SIZE
+from qr_database import IdAllocator, connect, write_transaction
+from qr_migrations import migrate
+from qr_render import RenderPool
+from qr_store import GC_MIN_AGE, QRImageStore
+from qr_formats import FORMATS, DEFAULT_FORMAT, format_qr_data, get_formatter
+from devuid_reader import DevUIDError, MultiProbeReader, list_probes
+from tabular_export import export_records
+
+# Column names accepted in batch input files
+BATCH_FIELDS = {
+    'serial_number': ('serial_number', 'serial', 'sn'),
+    'verification_code': ('verification_code', 'vcode', 'vc'),
+    'dev_uid': ('dev_uid', 'devuid', 'uid'),
+    'format': ('format', 'format_type'),
+    'probe': ('probe', 'stlink', 'probe_serial'),
+}
+
+BATCH_REPORT_FIELDS = ['row', 'serial_number', 'status', 'id', 'qr_filename', 'error']
+
+# Interactive format menu: operators know these numbers, so formats
+# registered later are numbered after them
+MENU_FORMATS = ['json', 'csv', 'pipe', 'compact', 'labeled', 'url', 'olarm']
+
+
+def format_menu():
+    """Return {menu number: format name}, the built-in numbering first"""
+    names = [name for name in MENU_FORMATS if name in FORMATS]
+    names += [name for name in FORMATS if name not in MENU_FORMATS]
+    return {str(number): name for number, name in enumerate(names, 1)}
+
+
+def normalize_batch_row(row):
+    """Map the column names of one input row to the canonical field names"""
+    lowered = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+    normalized = {}
+    for field, aliases in BATCH_FIELDS.items():
+        for alias in aliases:
+            if lowered.get(alias) not in (None, ''):
+                normalized[field] = str(lowered[alias]).strip()
+                break
+    return normalized
+
+
+def iter_batch_rows(path):
+    """Stream (row number, fields) pairs from a CSV or JSONL batch file
+
+    CSV files may have a header row using the names in BATCH_FIELDS or be
+    plain serial,verification_code,dev_uid lines. Rows that cannot be
+    parsed are yielded with an 'error' entry.
+    """
+    if os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson', '.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            for row_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                    if not isinstance(row, dict):
+                        raise ValueError("expected a JSON object")
+                    yield row_number, normalize_batch_row(row)
+                except ValueError as e:
+                    yield row_number, {'error': f"Invalid JSON: {e}"}
+        return
+    
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = None
+        for row_number, values in enumerate(reader, 1):
+            if not values or not any(value.strip() for value in values):
+                continue
+            if row_number == 1:
+                names = [value.strip().lower() for value in values]
+                known = {alias for aliases in BATCH_FIELDS.values() for alias in aliases}
+                if known.intersection(names):
+                    header = names
+                    continue
+            if header:
+                yield row_number, normalize_batch_row(dict(zip(header, values)))
+            else:
+                yield row_number, normalize_batch_row(
+                    dict(zip(['serial_number', 'verification_code', 'dev_uid', 'format'], values)))
+
 
 class QRGeneratorCLI:
-    def __init__(self):
+    def __init__(self, thumbnails=False, shard_by=None, shard_size=SHARD_SIZE):
         self.init_database()
+        self.id_allocator = IdAllocator(self.conn)
+        self.image_store = QRImageStore()
+        if shard_by:
+            self.excel_exporter = ShardedExcelExporter(self.conn, CLI_LAYOUT, shard_by, shard_size=shard_size,
+                                                       thumbnails=thumbnails)
+        else:
+            self.excel_exporter = IncrementalExcelExporter(self.conn, CLI_LAYOUT, thumbnails=thumbnails)
     
     def init_database(self):
         """Initialize SQLite database"""
-        self.conn = sqlite3.connect('qr_codes.db')
+        self.conn = connect('qr_codes.db')
         self.cursor = self.conn.cursor()
-        
-        # Check if we need to migrate from auto-increment to manual ID management
-        self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='qr_records'")
-        table_exists = self.cursor.fetchone()
-        
-        if table_exists:
-            # Check if table has auto-increment
-            self.cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='qr_records'")
-            table_sql = self.cursor.fetchone()[0]
-            
-            if 'AUTOINCREMENT' in table_sql:
-                print("🔄 Migrating database to remove auto-increment...")
-                self.migrate_database()
-        else:
-            # Create new table without auto-increment
-            self.cursor.execute('''
-                CREATE TABLE qr_records (
-                    id INTEGER PRIMARY KEY,
-                    serial_number TEXT NOT NULL,
-                    verification_code TEXT NOT NULL,
-                    dev_uid TEXT NOT NULL,
-                    qr_filename TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            self.conn.commit()
-    
-    def migrate_database(self):
-        """Migrate existing database to remove auto-increment"""
-        try:
-            # Create backup table
-            self.cursor.execute('''
-                CREATE TABLE qr_records_backup AS 
-                SELECT * FROM qr_records ORDER BY created_at ASC
-            ''')
-            
-            # Drop original table
-            self.cursor.execute('DROP TABLE qr_records')
-            
-            # Create new table without auto-increment
-            self.cursor.execute('''
-                CREATE TABLE qr_records (
-                    id INTEGER PRIMARY KEY,
-                    serial_number TEXT NOT NULL,
-                    verification_code TEXT NOT NULL,
-                    dev_uid TEXT NOT NULL,
-                    qr_filename TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Get data from backup and reassign sequential IDs
-            self.cursor.execute('SELECT serial_number, verification_code, dev_uid, qr_filename, created_at FROM qr_records_backup ORDER BY created_at ASC')
-            records = self.cursor.fetchall()
-            
-            # Insert records with sequential IDs starting from 1
-            for i, record in enumerate(records, 1):
-                self.cursor.execute('''
-                    INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (i, record[0], record[1], record[2], record[3], record[4]))
-            
-            # Drop backup table
-            self.cursor.execute('DROP TABLE qr_records_backup')
-            
-            self.conn.commit()
-            print("✅ Database migration completed - IDs are now sequential")
-            
-        except Exception as e:
-            print(f"❌ Migration error: {str(e)}")
-            # Restore from backup if migration fails
-            try:
-                self.cursor.execute('DROP TABLE IF EXISTS qr_records')
-                self.cursor.execute('ALTER TABLE qr_records_backup RENAME TO qr_records')
-                self.conn.commit()
-                print("🔄 Restored original table")
-            except:
-                pass
+        migrate(self.conn)
     
-    def generate_qr_code(self, serial_number, verification_code, dev_uid, format_type="olarm"):
+    def generate_qr_code(self, serial_number, verification_code, dev_uid, format_type=DEFAULT_FORMAT):
         """Generate QR code with input data in specified format"""
         try:
-            # Create QR code
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_M,  # Changed to Medium for better reliability
-                box_size=10,
-                border=4,
-            )
-            
-            # Prepare QR code data based on format type
-            if format_type == "json":
-                import json
-                qr_data = json.dumps({
-                    "sn": serial_number,
-                    "vc": verification_code,
-                    "uid": dev_uid
-                }, separators=(',', ':'))  # Compact JSON
-            elif format_type == "csv":
-                qr_data = f"{serial_number},{verification_code},{dev_uid}"
-            elif format_type == "pipe":
-                qr_data = f"{serial_number}|{verification_code}|{dev_uid}"
-            elif format_type == "labeled":
-                # Old format with labels
-                qr_data = f"Serial Number: {serial_number}\nVerification Code: {verification_code}\nDevUID: {dev_uid}"
-            elif format_type == "compact":
-                # Very compact format
-                qr_data = f"{serial_number}:{verification_code}:{dev_uid}"
-            elif format_type == "url":
-                # URL format for web validation (generic)
-                qr_data = f"https://validate.example.com?sn={serial_number}&vc={verification_code}&uid={dev_uid}"
-            elif format_type == "olarm":
-                # Olarm specific URL format: serial,devuid,verification_code
-                qr_data = f"https://olarm.com/o/flxr?a={serial_number},{dev_uid},{verification_code}"
-            else:
-                # Default to JSON if invalid format specified
-                import json
-                qr_data = json.dumps({
-                    "sn": serial_number,
-                    "vc": verification_code,
-                    "uid": dev_uid
-                }, separators=(',', ':'))
-            
-            qr.add_data(qr_data)
-            qr.make(fit=True)
-            
-            # Create QR code image
-            qr_image = qr.make_image(fill_color="black", back_color="white")
-            
-            # Generate filename with timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"qr_code_{serial_number}_{timestamp}.png"
-            
-            # Save QR code image
-            qr_image.save(filename)
+            filename, qr_data = self.render_qr_code(serial_number, verification_code, dev_uid, format_type)
             
             # Save to database
-            self.save_to_database(serial_number, verification_code, dev_uid, filename)
+            if self.save_to_database(serial_number, verification_code, dev_uid, filename) is None:
+                return None
             
             # Auto-export to Excel after each new record
             self.export_to_excel(verbose=False)
@@ -177,40 +138,201 @@ class QRGeneratorCLI:
             print(f"❌ Error generating QR code: {str(e)}")
             return None
     
+    def render_qr_code(self, serial_number, verification_code, dev_uid, format_type=DEFAULT_FORMAT):
+        """Build the QR payload and find or save its image, returns (filename, qr_data)"""
+        qr_data = self.format_qr_data(serial_number, verification_code, dev_uid, format_type)
+        
+        # Only rendered if the store has no image for this payload yet; the
+        # Excel export embeds the same buffer
+        image = self.image_store.get_or_render(qr_data, format_type)
+        self.excel_exporter.share_png(image.filename, image.png)
+        
+        return image.filename, qr_data
+    
+    def format_qr_data(self, serial_number, verification_code, dev_uid, format_type=DEFAULT_FORMAT):
+        """Prepare the QR code payload for the given format"""
+        return format_qr_data(format_type, serial_number, verification_code, dev_uid)
+    
     def save_to_database(self, serial_number, verification_code, dev_uid, filename):
         """Save record to database"""
         try:
-            # Find the lowest available ID (reuse deleted numbers)
-            # First check if there are any records
-            self.cursor.execute('SELECT COUNT(*) FROM qr_records')
-            record_count = self.cursor.fetchone()[0]
-            
-            if record_count == 0:
-                next_id = 1
-            else:
-                # Look for gaps in the sequence starting from 1
-                self.cursor.execute('SELECT id FROM qr_records ORDER BY id')
-                existing_ids = [row[0] for row in self.cursor.fetchall()]
-                
-                # Find the first missing number in sequence
-                next_id = 1
-                for existing_id in existing_ids:
-                    if next_id == existing_id:
-                        next_id += 1
-                    else:
-                        break
+            record_id = write_transaction(
+                self.conn, lambda: self.insert_record(serial_number, verification_code, dev_uid, filename))
             
-            # Insert with specific ID
-            self.cursor.execute('''
-                INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (next_id, serial_number, verification_code, dev_uid, filename))
-            self.conn.commit()
-            
-            print(f"💾 Record saved with ID: {next_id}")
+            print(f"💾 Record saved with ID: {record_id}")
+            return record_id
             
         except Exception as e:
             print(f"❌ Database error: {str(e)}")
+            return None
+    
+    def insert_record(self, serial_number, verification_code, dev_uid, filename):
+        """Insert a record in the open write transaction, returns its ID"""
+        # The image may have been cleaned up since it was found in the store
+        if not self.image_store.claim(filename):
+            raise FileNotFoundError(f"QR image {filename} was removed before the record was saved")
+        
+        # Find the lowest available ID (reuse deleted numbers)
+        next_id = self.id_allocator.next_id()
+        
+        # Insert with specific ID
+        self.cursor.execute('''
+            INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (next_id, serial_number, verification_code, dev_uid, filename))
+        return next_id
+    
+    def run_batch(self, input_path, format_type=DEFAULT_FORMAT, chunk_size=500, report_path=None, workers=1,
+                  mask_pattern=None, rows=None):
+        """Generate QR codes for every row of a CSV/JSONL file
+
+        With more than one worker the images are rendered on a process
+        pool while this process, as the single writer, inserts the rows in
+        input order. Each chunk of rows is rendered first and then inserted
+        and committed in one short write transaction, so other stations
+        are never kept waiting while codes render. Excel is exported once
+        at the end and a per-row result report is written as CSV. A fixed
+        mask_pattern (0-7) skips scoring all eight masks for every code.
+        Rows already read from input_path (as iter_batch_rows() yields
+        them) can be passed as rows. Returns the number of rows that
+        succeeded and failed.
+        """
+        if report_path is None:
+            report_path = os.path.splitext(input_path)[0] + "_report.csv"
+        
+        succeeded = failed = 0
+        print(f"📦 Batch generating QR codes from {input_path} (chunks of {chunk_size}, {workers} worker(s))")
+        
+        with open(report_path, 'w', encoding='utf-8', newline='') as report_file, RenderPool(workers) as pool:
+            report = csv.DictWriter(report_file, fieldnames=BATCH_REPORT_FIELDS)
+            report.writeheader()
+            
+            # Report rows of the current chunk in input order, and the rendered ones still to insert
+            results, pending = [], []
+            for (row_number, row, error), rendered in pool.imap(self._batch_jobs(input_path, format_type, mask_pattern, rows)):
+                result = {'row': row_number, 'serial_number': row.get('serial_number', '')}
+                results.append(result)
+                if not error and rendered.error:
+                    error = f"Rendering failed: {rendered.error}"
+                if error:
+                    result['status'] = 'error'
+                    result['error'] = error
+                else:
+                    pending.append((result, row, rendered.filename))
+                
+                if len(pending) >= chunk_size:
+                    self._insert_batch_chunk(pending)
+                    succeeded, failed = self._report_batch_chunk(report, results, succeeded, failed)
+                    results, pending = [], []
+                    print(f"💾 Committed {succeeded} records ({failed} failed)")
+            
+            if pending:
+                self._insert_batch_chunk(pending)
+            succeeded, failed = self._report_batch_chunk(report, results, succeeded, failed)
+        
+        print(f"✅ Batch complete: {succeeded} generated, {failed} failed")
+        print(f"📝 Report saved as: {report_path}")
+        
+        if succeeded:
+            self.export_to_excel(verbose=False)
+        
+        return succeeded, failed
+    
+    def _insert_batch_chunk(self, pending):
+        """Insert rendered batch rows in one write transaction, filling in their results"""
+        def insert_rows():
+            outcomes = []
+            for _, row, filename in pending:
+                try:
+                    outcomes.append((self.insert_record(
+                        row['serial_number'], row['verification_code'], row['dev_uid'], filename), None))
+                except Exception as e:
+                    outcomes.append((None, str(e)))
+            return outcomes
+        
+        try:
+            outcomes = write_transaction(self.conn, insert_rows)
+        except Exception as e:
+            outcomes = [(None, str(e))] * len(pending)
+        
+        for (result, _, filename), (record_id, error) in zip(pending, outcomes):
+            if error is None:
+                result.update(id=record_id, qr_filename=filename, status='ok')
+            else:
+                result.update(status='error', error=error)
+    
+    @staticmethod
+    def _report_batch_chunk(report, results, succeeded, failed):
+        """Write the results of a chunk to the report, returns the updated counts"""
+        for result in results:
+            report.writerow(result)
+            if result['status'] == 'ok':
+                succeeded += 1
+            else:
+                failed += 1
+        return succeeded, failed
+    
+    def _batch_jobs(self, input_path, format_type, mask_pattern=None, rows=None):
+        """Validate batch rows, yielding ((row number, row, error), job)
+
+        job is a RenderJob, the RenderResult of an image already in the
+        store, or None for an invalid row.
+        """
+        default_formatter = get_formatter(format_type)
+        for row_number, row in rows if rows is not None else iter_batch_rows(input_path):
+            error = row.get('error')
+            if not error:
+                missing = [field for field in ('serial_number', 'verification_code', 'dev_uid') if not row.get(field)]
+                row_format = row.get('format', format_type)
+                if missing:
+                    error = f"Missing {', '.join(missing)}"
+                elif row_format not in FORMATS:
+                    error = f"Unknown format: {row_format}"
+            
+            if error:
+                yield (row_number, row, error), None
+                continue
+            
+            formatter = default_formatter if row_format == format_type else get_formatter(row_format)
+            qr_data = formatter(row['serial_number'], row['verification_code'], row['dev_uid'])
+            yield (row_number, row, None), self.image_store.job(qr_data, row_format, mask_pattern)
+    
+    def run_panel(self, panel_path, format_type=DEFAULT_FORMAT, report_path=None, workers=1, mask_pattern=None,
+                  reader=None):
+        """Read the DevUID of every board on a fixture and generate their QR codes
+
+        The panel file is a batch file whose rows name the ST-Link (probe
+        column, serial number) holding each board instead of a dev_uid.
+        All probes are read in parallel, then the rows go through
+        run_batch(); boards whose read failed are reported as failed rows.
+        """
+        rows = list(iter_batch_rows(panel_path))
+        probes = list(dict.fromkeys(row['probe'] for _, row in rows if row.get('probe')))
+        
+        print(f"🔌 Reading DevUIDs from {len(probes)} probe(s) in parallel...")
+        owned = reader is None
+        if owned:
+            reader = MultiProbeReader(probes)
+        try:
+            devuids, errors = reader.read_all()
+        finally:
+            if owned:
+                reader.close()
+        
+        for _, row in rows:
+            probe = row.pop('probe', None)
+            if row.get('error'):
+                continue
+            if not probe:
+                row['error'] = "Missing probe"
+            elif probe in devuids:
+                row['dev_uid'] = devuids[probe]
+            else:
+                row['error'] = f"DevUID read failed on probe {probe}: {errors.get(probe)}"
+        print(f"🔌 Read {len(devuids)} DevUID(s), {len(errors)} probe(s) failed")
+        
+        return self.run_batch(panel_path, format_type, report_path=report_path, workers=workers,
+                              mask_pattern=mask_pattern, rows=rows)
     
     def view_records(self, limit=10):
         """View recent records from database"""
@@ -287,21 +409,20 @@ class QRGeneratorCLI:
                     print("❌ Operation cancelled.")
                     return
                 
-                # Delete the QR code file if it exists
-                qr_filename = record[1]
-                if os.path.exists(qr_filename):
-                    try:
-                        os.remove(qr_filename)
-                        print(f"🗑️  Deleted QR code file: {qr_filename}")
-                    except Exception as e:
-                        print(f"⚠️  Warning: Could not delete QR code file {qr_filename}: {e}")
-                
                 # Delete from database
-                self.cursor.execute('DELETE FROM qr_records WHERE id = ?', (record_id,))
-                self.conn.commit()
+                write_transaction(
+                    self.conn, lambda: self.cursor.execute('DELETE FROM qr_records WHERE id = ?', (record_id,)))
                 
                 print(f"✅ Record ID {record_id} deleted successfully!")
                 
+                # Delete the QR code file unless another record shares it
+                qr_filename = record[1]
+                try:
+                    if self.image_store.release(self.conn, qr_filename):
+                        print(f"🗑️  Deleted QR code file: {qr_filename}")
+                except Exception as e:
+                    print(f"⚠️  Warning: Could not delete QR code file {qr_filename}: {e}")
+                
                 # Update Excel file
                 self.export_to_excel(verbose=False)
                 
@@ -311,100 +432,55 @@ class QRGeneratorCLI:
         except Exception as e:
             print(f"❌ Error removing record: {str(e)}")
     
-    def export_to_excel(self, verbose=True):
-        """Export all records to Excel with QR code images"""
+    def export_to_excel(self, verbose=True, full=None):
+        """Export all records to Excel with QR code images
+
+        Interactive exports rebuild the workbook from scratch; the automatic
+        exports after each change only append new and drop deleted rows.
+        """
         try:
-            # Fetch all records from database
-            self.cursor.execute('''
-                SELECT id, serial_number, verification_code, dev_uid, qr_filename, created_at
-                FROM qr_records
-                ORDER BY created_at ASC
-            ''')
-            records = self.cursor.fetchall()
+            if full is None:
+                full = verbose
             
-            if not records:
+            result = self.excel_exporter.export(full=full)
+            
+            if result.total == 0:
                 print("📋 No records found to export.")
                 return
             
-            # Create workbook and worksheet
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "QR Code Records"
-            
-            # Define headers
-            headers = ['#', 'ID', 'Serial Number', 'Verification Code', 'DevUID', 'QR Code', 'Created At']
-            
-            # Style for headers
-            header_font = Font(bold=True, color="FFFFFF")
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            header_alignment = Alignment(horizontal="center", vertical="center")
-            
-            # Write headers
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = header_alignment
-            
-            # Set column widths
-            column_widths = [5, 8, 20, 18, 20, 25, 22]
-            for col, width in enumerate(column_widths, 1):
-                ws.column_dimensions[ws.cell(row=1, column=col).column_letter].width = width
-            
-            # Write data and embed QR codes
-            for row_idx, record in enumerate(records, 2):
-                # Write sequential number and data
-                ws.cell(row=row_idx, column=1, value=row_idx - 1)  # Sequential number (#)
-                ws.cell(row=row_idx, column=2, value=record[0])  # ID
-                ws.cell(row=row_idx, column=3, value=record[1])  # Serial Number
-                ws.cell(row=row_idx, column=4, value=record[2])  # Verification Code
-                ws.cell(row=row_idx, column=5, value=record[3])  # DevUID
-                
-                # Format created_at
-                created_at = datetime.fromisoformat(record[5]).strftime("%Y-%m-%d %H:%M:%S")
-                ws.cell(row=row_idx, column=7, value=created_at)  # Created At
-                
-                # Add QR code image if file exists
-                qr_filename = record[4]
-                if os.path.exists(qr_filename):
-                    try:
-                        # Insert image into Excel directly
-                        img_excel = OpenpyxlImage(qr_filename)
-                        
-                        # Resize the image in Excel (width and height in points)
-                        img_excel.width = 120  # approximately 150 pixels
-                        img_excel.height = 120  # approximately 150 pixels
-                        
-                        # Position the image in the QR Code column (now column F)
-                        img_excel.anchor = f"F{row_idx}"
-                        ws.add_image(img_excel)
-                        
-                        # Set row height to accommodate image (in points)
-                        ws.row_dimensions[row_idx].height = 90
-                        
-                    except Exception as e:
-                        ws.cell(row=row_idx, column=6, value=f"Error loading: {qr_filename}")
-                        print(f"⚠️  Warning: Could not load QR code image {qr_filename}: {e}")
-                else:
-                    ws.cell(row=row_idx, column=6, value=f"File not found: {qr_filename}")
-            
-            # Use fixed filename that gets overwritten
-            excel_filename = "qr_records.xlsx"
-            
-            # Save workbook
-            wb.save(excel_filename)
+            excel_filename = self.excel_exporter.filename
             
             if verbose:
                 print(f"✅ Excel export completed successfully!")
                 print(f"📁 Saved as: {excel_filename}")
-                print(f"📊 Exported {len(records)} records with QR code images")
+                print(f"📊 Exported {result.total} records with QR code images")
                 print(f"📝 File will be overwritten on next export")
-            else:
-                print(f"📊 Excel file updated: {excel_filename}")
+            elif result.rebuilt or result.added or result.removed:
+                print(f"📊 Excel file updated: {excel_filename} (+{result.added} / -{result.removed})")
             
         except Exception as e:
             print(f"❌ Error exporting to Excel: {str(e)}")
     
+    def export_table(self, path, since_seq=None, append=False):
+        """Export records without images to CSV, Parquet or Arrow, returns True on success"""
+        try:
+            result = export_records(self.conn, path, since_seq=since_seq, append=append)
+        except (ValueError, RuntimeError, OSError) as e:
+            print(f"❌ Error exporting {path}: {str(e)}")
+            return False
+        
+        print(f"✅ Exported {result.rows} records to {path}")
+        # Where the next incremental export should pick up
+        print(f"🔖 Sync position: {result.last_seq} (next: --since-seq {result.last_seq})")
+        return True
+    
+    def gc_images(self, min_age=GC_MIN_AGE, dry_run=False):
+        """Remove stored QR images no record refers to any more, returns a GcResult"""
+        result = self.image_store.gc(self.conn, min_age, dry_run)
+        action = "Would remove" if dry_run else "Removed"
+        print(f"🗑️  {action} {result.removed} of {result.checked} stored images ({result.freed / 1024:.1f} KB)")
+        return result
+    
     def interactive_mode(self):
         """Interactive mode for generating QR codes"""
         print("🔄 Interactive QR Code Generator")
@@ -431,20 +507,14 @@ class QRGeneratorCLI:
                     continue
                 
                 print("\n🔧 Select QR Code Format:")
-                print("1. JSON (recommended) - {\"sn\":\"...\",\"vc\":\"...\",\"uid\":\"...\"}")
-                print("2. CSV - serial,verification,devuid")
-                print("3. Pipe - serial|verification|devuid")
-                print("4. Compact - serial:verification:devuid")
-                print("5. Labeled (old format) - Serial Number: ... etc")
-                print("6. URL - https://validate.example.com?sn=...&vc=...&uid=...")
-                print("7. Olarm (recommended) - https://olarm.com/o/flxr?a=serial,devuid,vcode")
+                format_map = format_menu()
+                for number, name in format_map.items():
+                    print(f"{number}. {FORMATS[name].description}")
+                    if name == DEFAULT_FORMAT:
+                        default_choice = number
                 
-                format_choice = input("Format choice (1-7, default 7): ").strip()
-                format_map = {
-                    '1': 'json', '2': 'csv', '3': 'pipe', 
-                    '4': 'compact', '5': 'labeled', '6': 'url', '7': 'olarm'
-                }
-                format_type = format_map.get(format_choice, 'olarm')
+                format_choice = input(f"Format choice (1-{len(format_map)}, default {default_choice}): ").strip()
+                format_type = format_map.get(format_choice, DEFAULT_FORMAT)
                 
                 self.generate_qr_code(serial_number, verification_code, dev_uid, format_type)
                 
@@ -477,17 +547,104 @@ class QRGeneratorCLI:
             self.conn.close()
 
 def main():
+    parser = argparse.ArgumentParser(
+        description="Generate QR codes with Serial Number, Verification Code, and DevUID",
+        epilog="Run without arguments for interactive mode"
+    )
+    parser.add_argument('fields', nargs='*', metavar='FIELD',
+                        help="serial_number verification_code dev_uid")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="generate a QR code for every row of a CSV or JSONL file")
+    parser.add_argument('--format', dest='format_type', default=DEFAULT_FORMAT, choices=list(FORMATS),
+                        help="QR format for batch rows without a format column (default: olarm)")
+    parser.add_argument('--chunk-size', type=int, default=500,
+                        help="rows committed per database transaction in batch mode (default: 500)")
+    parser.add_argument('--report', metavar='FILE',
+                        help="per-row batch result CSV (default: <FILE>_report.csv)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes rendering QR images in batch mode (default: 1, 0 = one per CPU)")
+    parser.add_argument('--panel', metavar='FILE',
+                        help="read every probe of a fixture in parallel and generate the boards listed in FILE")
+    parser.add_argument('--list-probes', action='store_true',
+                        help="list the connected ST-Link probes and exit")
+    parser.add_argument('--mask', dest='mask_pattern', type=int, choices=range(8), metavar='0-7',
+                        help="fixed QR mask pattern in batch mode (default: best mask per code)")
+    parser.add_argument('--thumbnails', action='store_true',
+                        help="embed QR images in the Excel file downscaled to the size they are shown at")
+    parser.add_argument('--shard', dest='shard_by', choices=SHARD_MODES,
+                        help="export one Excel file per production day (SAST) or per block of IDs")
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE,
+                        help=f"records per file with --shard range (default: {SHARD_SIZE})")
+    parser.add_argument('--export-table', metavar='FILE',
+                        help="export records without images to FILE (.csv, .parquet or .arrow) and exit")
+    parser.add_argument('--since-seq', type=int, metavar='SEQ',
+                        help="with --export-table, only records added after the sync position SEQ")
+    parser.add_argument('--append', action='store_true',
+                        help="with --export-table, append to an existing CSV instead of replacing it")
+    parser.add_argument('--gc-images', action='store_true',
+                        help="remove stored QR images that no record refers to any more and exit")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="with --gc-images, only report what would be removed")
+    args = parser.parse_args()
+    
     print("🔲 QR Code Generator (Command Line)")
     print("=" * 40)
     
-    generator = QRGeneratorCLI()
+    if args.list_probes:
+        try:
+            probes = list_probes()
+        except DevUIDError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        for probe in probes:
+            print(f"🔌 ST-Link {probe.serial or '(no serial)'} at USB location {probe.location}")
+        if not probes:
+            print("❌ No ST-Link probes found")
+        sys.exit(0 if probes else 1)
+    
+    if (args.fields and len(args.fields) != 3 or args.fields and args.batch or args.panel and (args.fields or args.batch)
+            or (args.export_table or args.gc_images) and (args.fields or args.batch or args.panel)
+            or args.export_table and args.gc_images):
+        print("❌ Usage: python3 qr_generator_cli.py [serial_number] [verification_code] [dev_uid]")
+        print("   Or: python3 qr_generator_cli.py --batch FILE [--format FORMAT] [--report FILE]")
+        print("   Or: python3 qr_generator_cli.py --panel FILE [--format FORMAT] [--report FILE]")
+        print("   Or: python3 qr_generator_cli.py --export-table FILE [--since-seq SEQ] [--append]")
+        print("   Or: python3 qr_generator_cli.py --gc-images [--dry-run]")
+        print("   Or run without arguments for interactive mode")
+        sys.exit(1)
     
-    # Check if command line arguments are provided
-    if len(sys.argv) == 4:
+    input_path = args.batch or args.panel
+    if input_path and not os.path.exists(input_path):
+        print(f"❌ Error: Batch file not found: {input_path}")
+        sys.exit(1)
+    
+    generator = QRGeneratorCLI(thumbnails=args.thumbnails, shard_by=args.shard_by, shard_size=max(1, args.shard_size))
+    
+    if args.export_table:
+        # Tabular export: no QR codes are generated
+        ok = generator.export_table(args.export_table, args.since_seq, args.append)
+        sys.exit(0 if ok else 1)
+    
+    if args.gc_images:
+        generator.gc_images(dry_run=args.dry_run)
+        sys.exit(0)
+    
+    if args.panel:
+        # Panel mode: DevUIDs come from the fixture's probes
+        workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+        _, failed = generator.run_panel(args.panel, args.format_type, args.report, workers, args.mask_pattern)
+        sys.exit(1 if failed else 0)
+    
+    elif args.batch:
+        # Batch mode
+        workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+        _, failed = generator.run_batch(args.batch, args.format_type, max(1, args.chunk_size), args.report, workers,
+                                         args.mask_pattern)
+        sys.exit(1 if failed else 0)
+    
+    elif args.fields:
         # Command line mode
-        serial_number = sys.argv[1]
-        verification_code = sys.argv[2]
-        dev_uid = sys.argv[3]
+        serial_number, verification_code, dev_uid = args.fields
         
         print(f"📝 Generating QR code for:")
         print(f"   Serial Number: {serial_number}")
@@ -499,11 +656,6 @@ def main():
         
     else:
         # Interactive mode
-        if len(sys.argv) > 1:
-            print("❌ Usage: python3 qr_generator_cli.py [serial_number] [verification_code] [dev_uid]")
-            print("   Or run without arguments for interactive mode")
-            sys.exit(1)
-        
         generator.interactive_mode()
 
 if __name__ == "__main__":
@@ -1,21 +1,27 @@
 import flet as ft
-import qrcode
-import sqlite3
 from datetime import datetime, timezone, timedelta
-from PIL import Image
-import os
-import json
 import random
 import base64
-import io
-import subprocess
 import tempfile
-from openpyxl import Workbook
-from openpyxl.drawing.image import Image as OpenpyxlImage
-from openpyxl.styles import Font, Alignment, PatternFill
+import threading
+from excel_export import ExportWorker, GUI_LAYOUT
+from qr_database import RecordPager, ThreadConnections, write_transaction
+from qr_migrations import migrate
+from qr_formats import FORMATS, DEFAULT_FORMAT, format_qr_data
+from qr_store import QRImageStore
+from thumbnail_cache import ThumbnailCache
+from devuid_reader import DevUIDCancelled, DevUIDError, OpenOcdSession
+from scan_pipeline import ScanPipeline
 
 class QRGeneratorApp:
-    def __init__(self, page: ft.Page):
+    # Seconds without changes before the background Excel export runs
+    EXPORT_QUIET_PERIOD = 2.0
+    
+    # Records shown per page of the records table
+    RECORDS_PAGE_SIZE = 20
+    RECORD_COLUMNS = ('id', 'serial_number', 'verification_code', 'dev_uid', 'created_at', 'qr_filename', 'device_name')
+    
+    def __init__(self, page: ft.Page, export_quiet_period=EXPORT_QUIET_PERIOD):
         self.page = page
         self.page.title = "QR Code Generator"
         
@@ -37,6 +43,36 @@ class QRGeneratorApp:
         # Initialize database in main thread
         self.init_database()
         
+        # Table thumbnails are cached, so refreshing the table does not resize images
+        self.thumbnail_cache = ThumbnailCache(self.conn)
+        self.image_store = QRImageStore()
+        
+        # Records are paged by (created_at, id); only one page of rows is ever built
+        self.record_pager = RecordPager(self.conn, self.RECORD_COLUMNS, self.RECORDS_PAGE_SIZE, db_path='qr_codes.db')
+        self.page_starts = [None]
+        self.next_page_key = None
+        
+        # Excel exports run in the background so scans are never blocked
+        self.export_worker = ExportWorker(
+            'qr_codes.db',
+            GUI_LAYOUT,
+            quiet_period=export_quiet_period,
+            on_status=self.on_export_status
+        )
+        
+        # One OpenOCD server is kept running for all DevUID reads
+        self.devuid_reader = OpenOcdSession()
+        self.devuid_thread = None
+        
+        # Pipeline mode: a scanned serial is read, generated and committed with no further clicks
+        self.scan_pipeline = ScanPipeline(
+            self.read_pipeline_devuid,
+            self.create_record,
+            on_unit=self.on_pipeline_unit,
+            on_error=self.on_pipeline_error
+        )
+        self.page.on_disconnect = lambda e: self.close()
+        
         # Create UI controls
         self.create_controls()
         
@@ -48,32 +84,9 @@ class QRGeneratorApp:
     
     def init_database(self):
         """Initialize SQLite database"""
-        self.conn = sqlite3.connect('qr_codes.db', check_same_thread=False)
-        self.cursor = self.conn.cursor()
-        
-        # Create table if it doesn't exist
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS qr_records (
-                id INTEGER PRIMARY KEY,
-                serial_number TEXT NOT NULL,
-                verification_code TEXT NOT NULL,
-                dev_uid TEXT NOT NULL,
-                device_name TEXT,
-                qr_filename TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT (datetime('now', '+2 hours'))
-            )
-        ''')
-        
-        # Add device_name column if it doesn't exist (for existing databases)
-        try:
-            self.cursor.execute("ALTER TABLE qr_records ADD COLUMN device_name TEXT")
-            self.conn.commit()
-            print("✅ Added device_name column to existing database")
-        except sqlite3.OperationalError:
-            # Column already exists, ignore
-            pass
-        
-        self.conn.commit()
+        # Event handlers run on worker threads, each gets its own connection
+        self.conn = ThreadConnections('qr_codes.db')
+        migrate(self.conn)
     
     def create_controls(self):
         """Create Flet UI controls"""
@@ -94,7 +107,8 @@ class QRGeneratorApp:
         self.serial_field = ft.TextField(
             label="Serial Number",
             expand=True,
-            autofocus=True
+            autofocus=True,
+            on_submit=self.on_serial_submit
         )
         
         self.vcode_field = ft.TextField(
@@ -109,7 +123,7 @@ class QRGeneratorApp:
         
         # Get DevUID button
         self.get_devuid_btn = ft.OutlinedButton(
-            "🔌 Get DevUID",
+            self.GET_DEVUID_LABEL,
             on_click=self.get_devuid_from_device,
             tooltip="Extract DevUID from connected STM32 device via ST-Link",
             style=ft.ButtonStyle(
@@ -133,22 +147,22 @@ class QRGeneratorApp:
         self.format_dropdown = ft.Dropdown(
             label="QR Format",
             expand=True,
-            value="olarm",
-            options=[
-                ft.dropdown.Option("olarm", "Olarm (recommended)"),
-                ft.dropdown.Option("json", "JSON"),
-                ft.dropdown.Option("csv", "CSV"),
-                ft.dropdown.Option("pipe", "Pipe-separated"),
-                ft.dropdown.Option("compact", "Compact"),
-                ft.dropdown.Option("labeled", "Labeled"),
-                ft.dropdown.Option("url", "URL")
-            ],
+            value=DEFAULT_FORMAT,
+            options=[ft.dropdown.Option(qr_format.name, qr_format.label) for qr_format in FORMATS.values()],
             on_change=self.on_format_change
         )
         
+        # Pipeline mode switch
+        self.pipeline_switch = ft.Switch(
+            label="Scan pipeline",
+            value=False,
+            on_change=self.toggle_pipeline,
+            tooltip="Generate as soon as a serial is scanned, reading the DevUID automatically"
+        )
+        
         # Format help text
         self.format_help = ft.Text(
-            "Olarm (recommended) - Compatible with Olarm validation system",
+            FORMATS[DEFAULT_FORMAT].description,
             size=12,
             color=ft.Colors.GREY,
             italic=True
@@ -299,8 +313,14 @@ class QRGeneratorApp:
             weight=ft.FontWeight.W_500
         )
         
-        # Initialize selected record
+        # Paging controls for the records table
+        self.newer_button = ft.TextButton("◀ Newer", on_click=self.show_newer_records, disabled=True)
+        self.older_button = ft.TextButton("Older ▶", on_click=self.show_older_records, disabled=True)
+        self.page_label = ft.Text("Page 1", size=12, color=ft.Colors.GREY_700)
+        
+        # Initialize selected record and the displayed rows by record ID
         self.selected_record_id = None
+        self.record_rows = {}
     
     def build(self):
         """Build the page layout with responsive design"""
@@ -332,6 +352,7 @@ class QRGeneratorApp:
                 content=ft.Column([
                     self.format_dropdown,
                     self.format_help,
+                    self.pipeline_switch,
                 ], spacing=10),
                 col={"sm": 12, "md": 6, "lg": 6},
                 padding=8,
@@ -450,7 +471,12 @@ class QRGeneratorApp:
                     border=ft.border.all(1, ft.Colors.GREY_300),
                     border_radius=5,
                     padding=5
-                )
+                ),
+                ft.Row([
+                    self.newer_button,
+                    self.page_label,
+                    self.older_button,
+                ], alignment=ft.MainAxisAlignment.CENTER)
             ], spacing=10),
             padding=15,
             border=ft.border.all(1, ft.Colors.GREY_300),
@@ -470,17 +496,9 @@ class QRGeneratorApp:
     
     def on_format_change(self, e):
         """Update help text when format selection changes"""
-        format_descriptions = {
-            'olarm': 'Olarm (recommended) - Compatible with Olarm validation system',
-            'json': 'JSON - Structured data format {"sn":"...","vc":"...","uid":"..."}',
-            'csv': 'CSV - Comma-separated values: serial,verification,devuid',
-            'pipe': 'Pipe - Pipe-separated values: serial|verification|devuid',
-            'compact': 'Compact - Colon-separated: serial:verification:devuid',
-            'labeled': 'Labeled - Human-readable with labels (old format)',
-            'url': 'URL - Generic validation URL format'
-        }
         selected_format = self.format_dropdown.value
-        self.format_help.value = format_descriptions.get(selected_format, '')
+        qr_format = FORMATS.get(selected_format)
+        self.format_help.value = qr_format.description if qr_format else ''
         self.page.update()
     
     def generate_qr_code(self, e):
@@ -497,63 +515,14 @@ class QRGeneratorApp:
             return
         
         try:
-            # Create QR code
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_M,
-                box_size=10,
-                border=4,
-            )
-            
-            # Prepare QR code data based on format type
-            if format_type == "json":
-                qr_data = json.dumps({
-                    "sn": serial_number,
-                    "vc": verification_code,
-                    "uid": dev_uid
-                }, separators=(',', ':'))
-            elif format_type == "csv":
-                qr_data = f"{serial_number},{verification_code},{dev_uid}"
-            elif format_type == "pipe":
-                qr_data = f"{serial_number}|{verification_code}|{dev_uid}"
-            elif format_type == "labeled":
-                qr_data = f"Serial Number: {serial_number}\nVerification Code: {verification_code}\nDevUID: {dev_uid}"
-            elif format_type == "compact":
-                qr_data = f"{serial_number}:{verification_code}:{dev_uid}"
-            elif format_type == "url":
-                qr_data = f"https://validate.example.com?sn={serial_number}&vc={verification_code}&uid={dev_uid}"
-            elif format_type == "olarm":
-                qr_data = f"https://olarm.com/o/flxr?a={serial_number},{dev_uid},{verification_code}"
-            else:
-                qr_data = f"https://olarm.com/o/flxr?a={serial_number},{dev_uid},{verification_code}"
-            
-            qr.add_data(qr_data)
-            qr.make(fit=True)
-            
-            # Create QR code image
-            qr_image = qr.make_image(fill_color="black", back_color="white")
-            
-            # Generate filename with timestamp (SAST)
-            timestamp = datetime.now(self.sast_tz).strftime("%Y%m%d_%H%M%S")
-            filename = f"qr_code_{serial_number}_{timestamp}_SAST.png"
-            
-            # Save QR code image
-            qr_image.save(filename)
+            record_id, filename, png = self.create_record(
+                serial_number, verification_code, dev_uid, device_name, format_type)
             
             # Display QR code in preview
-            self.display_qr_preview(qr_image)
-            
-            # Save to database
-            self.save_to_database(serial_number, verification_code, dev_uid, device_name, filename)
+            self.display_qr_preview(png)
             
-            # Auto-export to Excel after each new record
-            try:
-                self.export_to_excel_silent()
-            except:
-                pass
-            
-            # Refresh records table
-            self.load_records()
+            # Refresh records table, showing the newest page with the new record
+            self.refresh_records(newest=True)
             
             # Show success message
             self.show_success(f"QR code generated successfully! File: {filename}")
@@ -561,68 +530,80 @@ class QRGeneratorApp:
         except Exception as e:
             self.show_error(f"Failed to generate QR code: {str(e)}")
     
-    def display_qr_preview(self, qr_image):
-        """Display QR code in the preview area"""
+    def create_record(self, serial_number, verification_code, dev_uid, device_name="", format_type=DEFAULT_FORMAT):
+        """Render, save and record one QR code, returns (record ID, filename, PNG bytes)"""
+        # Prepare QR code data based on format type
+        qr_data = format_qr_data(format_type, serial_number, verification_code, dev_uid)
+        
+        # Encode the PNG once, unless the store already has it; file,
+        # preview and Excel share the buffer
+        image = self.image_store.get_or_render(qr_data, format_type)
+        filename, png = image.filename, image.png
+        self.export_worker.share_png(filename, png)
+        if image.rendered:
+            self.thumbnail_cache.put(filename, png)
+        
+        # Save to database
+        record_id = self.save_to_database(serial_number, verification_code, dev_uid, device_name, filename)
+        
+        # Queue an Excel update; bursts of records are merged into one export
+        self.export_worker.request()
+        return record_id, filename, png
+    
+    def display_qr_preview(self, png):
+        """Display QR code PNG bytes in the preview area"""
         try:
-            # Convert PIL image to base64 for Flet
-            img_buffer = io.BytesIO()
-            qr_image.save(img_buffer, format='PNG')
-            img_buffer.seek(0)
-            
-            # Convert to base64
-            img_base64 = base64.b64encode(img_buffer.read()).decode()
+            # Convert to base64 for Flet
+            img_base64 = base64.b64encode(png).decode()
             
             # Update image
             self.qr_image.src_base64 = img_base64
-            self.page.update()
+            self.page.update(self.qr_image)
         except Exception as e:
             print(f"Error displaying QR preview: {e}")
     
     def save_to_database(self, serial_number, verification_code, dev_uid, device_name, filename):
-        """Save record to database"""
-        try:
+        """Save record to database, returns its ID"""
+        sast_timestamp = datetime.now(self.sast_tz).isoformat()
+        
+        def insert():
+            # The image may have been cleaned up since it was found in the store
+            if not self.image_store.claim(filename):
+                raise FileNotFoundError(f"QR image {filename} was removed before the record was saved")
+            
             # Find the next available ID
-            self.cursor.execute('SELECT MAX(id) FROM qr_records')
-            max_id = self.cursor.fetchone()[0]
+            max_id = self.conn.execute('SELECT MAX(id) FROM qr_records').fetchone()[0]
             next_id = (max_id + 1) if max_id else 1
             
             # Insert with specific ID and SAST timestamp
-            sast_timestamp = datetime.now(self.sast_tz).isoformat()
-            self.cursor.execute('''
+            self.conn.execute('''
                 INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, device_name, qr_filename, created_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
             ''', (next_id, serial_number, verification_code, dev_uid, device_name, filename, sast_timestamp))
-            self.conn.commit()
-            
-            sast_time = datetime.now(self.sast_tz).strftime("%Y-%m-%d %H:%M:%S SAST")
-            print(f"Record saved with ID: {next_id} at {sast_time}" + (f" (Device: {device_name})" if device_name else ""))
-            
+            return next_id
+        
+        try:
+            next_id = write_transaction(self.conn, insert)
         except Exception as e:
-            self.show_error(f"Failed to save to database: {str(e)}")
+            raise RuntimeError(f"Failed to save to database: {str(e)}") from e
+        
+        sast_time = datetime.now(self.sast_tz).strftime("%Y-%m-%d %H:%M:%S SAST")
+        print(f"Record saved with ID: {next_id} at {sast_time}" + (f" (Device: {device_name})" if device_name else ""))
+        return next_id
     
     def create_qr_thumbnail(self, qr_filename):
         """Create a small QR code thumbnail for table display"""
         try:
-            if qr_filename and os.path.exists(qr_filename):
-                # Load and resize the QR code image
-                with Image.open(qr_filename) as img:
-                    # Resize to medium thumbnail (doubled size)
-                    img_resized = img.resize((80, 80), Image.Resampling.LANCZOS)
-                    
-                    # Convert to base64
-                    img_buffer = io.BytesIO()
-                    img_resized.save(img_buffer, format='PNG')
-                    img_buffer.seek(0)
-                    img_base64 = base64.b64encode(img_buffer.read()).decode()
-                    
-                    # Return medium image
-                    return ft.Image(
-                        src_base64=img_base64,
-                        width=80,
-                        height=80,
-                        fit=ft.ImageFit.CONTAIN,
-                        tooltip="Click to view full size"
-                    )
+            img_base64 = self.thumbnail_cache.get(qr_filename) if qr_filename else None
+            if img_base64:
+                # Return medium image (80x80 thumbnail)
+                return ft.Image(
+                    src_base64=img_base64,
+                    width=80,
+                    height=80,
+                    fit=ft.ImageFit.CONTAIN,
+                    tooltip="Click to view full size"
+                )
             else:
                 # Return placeholder text
                 return ft.Text(
@@ -641,18 +622,17 @@ class QRGeneratorApp:
             )
     
     def load_records(self):
-        """Load records from database into table"""
+        """Load the current page of records into the table"""
         try:
-            self.cursor.execute('''
-                SELECT id, serial_number, verification_code, dev_uid, created_at, qr_filename, device_name
-                FROM qr_records
-                ORDER BY created_at DESC
-                LIMIT 20
-            ''')
-            records = self.cursor.fetchall()
+            records, self.next_page_key = self.record_pager.fetch(self.page_starts[-1])
+            if not records and len(self.page_starts) > 1:
+                # The page emptied out (e.g. its last record was removed)
+                self.page_starts.pop()
+                records, self.next_page_key = self.record_pager.fetch(self.page_starts[-1])
             
             # Clear existing rows
             self.records_table.rows.clear()
+            self.record_rows = {}
             
             # Add records to table
             for record in records:
@@ -675,11 +655,8 @@ class QRGeneratorApp:
                 is_selected = record_id == self.selected_record_id
                 
                 select_btn = ft.ElevatedButton(
-                    "✓" if is_selected else "○",
                     height=28,
                     width=35,
-                    bgcolor=ft.Colors.GREEN if is_selected else ft.Colors.GREY_200,
-                    color=ft.Colors.WHITE if is_selected else ft.Colors.BLACK,
                     on_click=lambda e, rid=record_id: self.select_record(rid),
                     style=ft.ButtonStyle(
                         text_style=ft.TextStyle(
@@ -730,113 +707,190 @@ class QRGeneratorApp:
                             expand=True
                         )),
                     ],
-                    color=ft.Colors.BLUE_50 if is_selected else None
                 )
+                self.style_selection(row, select_btn, is_selected)
                 
                 # Store record ID as data for easy access
                 row.data = record_id
                 
                 self.records_table.rows.append(row)
+                self.record_rows[record_id] = (row, select_btn)
             
+            self.page_label.value = f"Page {len(self.page_starts)}"
+            self.newer_button.disabled = len(self.page_starts) == 1
+            self.older_button.disabled = self.next_page_key is None
             self.page.update()
             
+            # Have the next page ready before it is asked for
+            self.record_pager.prefetch(self.next_page_key)
+            
         except Exception as e:
             self.show_error(f"Failed to load records: {str(e)}")
     
+    def show_older_records(self, e):
+        """Move the records table one page back in time"""
+        if self.next_page_key is not None:
+            self.page_starts.append(self.next_page_key)
+            self.load_records()
+    
+    def show_newer_records(self, e):
+        """Move the records table one page forward in time"""
+        if len(self.page_starts) > 1:
+            self.page_starts.pop()
+            self.load_records()
+    
+    def refresh_records(self, newest=False):
+        """Reload the table after records were added or removed"""
+        self.record_pager.invalidate()
+        if newest:
+            self.page_starts = [None]
+        self.load_records()
+    
+    def style_selection(self, row, select_btn, is_selected):
+        """Apply the selected/unselected look to a table row and its button"""
+        select_btn.text = "✓" if is_selected else "○"
+        select_btn.bgcolor = ft.Colors.GREEN if is_selected else ft.Colors.GREY_200
+        select_btn.color = ft.Colors.WHITE if is_selected else ft.Colors.BLACK
+        row.color = ft.Colors.BLUE_50 if is_selected else None
+    
+    def update_selection(self, record_id, is_selected):
+        """Restyle one displayed record, returns the rows that changed"""
+        controls = self.record_rows.get(record_id)
+        if not controls:
+            return []
+        row, select_btn = controls
+        self.style_selection(row, select_btn, is_selected)
+        return [row]
+    
     def select_record(self, record_id):
         """Select or deselect a record using custom button"""
         try:
-            if self.selected_record_id == record_id:
+            previous_id = self.selected_record_id
+            if previous_id == record_id:
                 # Deselect if already selected
                 self.selected_record_id = None
                 print(f"❌ Deselected record ID: {record_id}")
-                self.show_success("No record selected")
+                message = "No record selected"
             else:
                 # Select the record
                 self.selected_record_id = record_id
                 print(f"✅ Selected record ID: {record_id}")
-                self.show_success(f"✅ Selected record ID: {record_id}. Click 'Remove Selected Record' to delete.")
+                message = f"✅ Selected record ID: {record_id}. Click 'Remove Selected Record' to delete."
             
-            # Refresh the table to update button states
-            self.load_records()
+            # Only restyle the rows whose selection changed, not the whole table
+            changed = []
+            if previous_id:
+                changed += self.update_selection(previous_id, False)
+            if self.selected_record_id:
+                changed += self.update_selection(self.selected_record_id, True)
+            self.show_success(message, *changed)
             
         except Exception as ex:
             print(f"❌ Error in record selection: {ex}")
             self.show_error(f"Selection error: {ex}")
     
+    GET_DEVUID_LABEL = "🔌 Get DevUID"
+    CANCEL_DEVUID_LABEL = "✖ Cancel DevUID"
+
     def get_devuid_from_device(self, e):
-        """Extract DevUID from connected STM32 device using OpenOCD"""
+        """Extract DevUID from connected STM32 device using OpenOCD
+
+        The read runs on a worker thread so the other fields can be filled
+        in meanwhile; clicking again while it runs cancels it.
+        """
+        if self.devuid_thread is not None and self.devuid_thread.is_alive():
+            self.show_progress("⏹️ Cancelling DevUID read...")
+            self.devuid_reader.cancel()
+            return
+
+        self.get_devuid_btn.text = self.CANCEL_DEVUID_LABEL
+        self.show_progress("🔌 Connecting to STM32 device...", self.get_devuid_btn)
+        self.devuid_thread = threading.Thread(target=self.read_devuid, name="devuid-read", daemon=True)
+        self.devuid_thread.start()
+
+    def read_devuid(self):
+        """Worker thread body of get_devuid_from_device"""
         try:
-            self.show_success("🔌 Connecting to STM32 device...")
-            
-            # OpenOCD command configuration
-            WL_DEVUI_ADDRESS = "0x1FFF7580"
-            openocd_cmd = [
-                './openocd/bin/openocd',
-                '-f', 'interface/stlink.cfg',
-                '-f', 'target/stm32wlx.cfg',
-                '-c', 'init',
-                '-c', 'reset halt',
-                '-c', f'mdw {WL_DEVUI_ADDRESS} 3',
-                '-c', 'exit'
-            ]
-            
-            # Run OpenOCD command with timeout
-            result = subprocess.run(
-                openocd_cmd,
-                capture_output=True,
-                text=True,
-                timeout=15,  # 15 second timeout
-                cwd=os.getcwd()  # Run in current directory
-            )
-            
-            if result.returncode != 0:
-                self.show_error(f"❌ OpenOCD failed: {result.stderr.strip()}")
-                return
-            
-            # Parse the output to extract DevUID
-            output_lines = result.stdout.split('\n')
-            
-            for line in output_lines:
-                if WL_DEVUI_ADDRESS.lower() in line.lower():
-                    # Split the line and extract the hex values
-                    parts = line.split()
-                    if len(parts) >= 4:  # Should have address and 3 hex values
-                        try:
-                            # Extract the hex values (skip the address)
-                            hex_values = parts[1:4]
-                            
-                            # Combine and format the DevUID
-                            # Reverse byte order for proper UID format
-                            devui = hex_values[1] + hex_values[0]  # Combine first two hex values
-                            
-                            # Format as uppercase hex string without spaces
-                            formatted_uid = devui.upper().replace('0X', '')
-                            
-                            # Remove any extra characters and ensure it's clean hex
-                            clean_uid = ''.join(c for c in formatted_uid if c in '0123456789ABCDEF')
-                            
-                            if len(clean_uid) >= 16:  # Valid DevUID should be at least 16 hex chars
-                                self.devuid_field.value = clean_uid
-                                self.show_success(f"✅ DevUID extracted: {clean_uid}")
-                                self.page.update()
-                                return
-                            else:
-                                self.show_error(f"❌ Invalid DevUID format: {clean_uid}")
-                                return
-                                
-                        except (IndexError, ValueError) as e:
-                            self.show_error(f"❌ Error parsing DevUID: {str(e)}")
-                            return
-            
-            self.show_error("❌ DevUID not found in OpenOCD output")
-            
-        except subprocess.TimeoutExpired:
-            self.show_error("❌ Timeout: Device connection failed. Check ST-Link connection.")
+            # The OpenOCD server stays up between boards, only the first read starts it
+            clean_uid = self.devuid_reader.read_devuid(on_status=self.on_devuid_status)
+            self.devuid_field.value = clean_uid
+            self.show_success(f"✅ DevUID extracted: {clean_uid}", self.devuid_field)
+        except DevUIDCancelled:
+            self.show_error("❌ DevUID read cancelled")
         except FileNotFoundError:
             self.show_error("❌ OpenOCD not found. Please ensure OpenOCD is installed and available.")
+        except DevUIDError as e:
+            self.show_error(f"❌ Device connection failed: {str(e)}. Check ST-Link connection.")
         except Exception as e:
             self.show_error(f"❌ Error extracting DevUID: {str(e)}")
+        finally:
+            self.get_devuid_btn.text = self.GET_DEVUID_LABEL
+            self.page.update(self.get_devuid_btn)
+
+    def on_devuid_status(self, stage, detail=None):
+        """Show the progress of a DevUID read, called from the reader's threads"""
+        if stage == 'connecting':
+            message = f"🔌 Connecting: {detail}" if detail else "🔌 Connecting to STM32 device..."
+        elif stage == 'halted':
+            message = "⏸️ Target halted, reading DevUID..."
+        else:
+            message = f"📖 DevUID read: {detail}"
+        self.show_progress(message)
+    
+    def toggle_pipeline(self, e):
+        """Switch between the manual form and single-scan pipeline mode"""
+        if self.pipeline_switch.value:
+            self.show_progress("📥 Pipeline mode: scan a serial number to provision the board in the fixture")
+        else:
+            self.show_success("Pipeline mode off")
+    
+    def on_serial_submit(self, e):
+        """Queue the scanned serial in pipeline mode
+
+        Scanners end a scan with Enter. A scan holds the serial number and
+        optionally the verification code ("SERIAL,VCODE"); without one the
+        Verification Code field is used.
+        """
+        if not self.pipeline_switch.value:
+            return
+        parts = (self.serial_field.value or "").replace(',', ' ').split()
+        if not parts:
+            return
+        serial_number = parts[0]
+        verification_code = parts[1] if len(parts) > 1 else (self.vcode_field.value or "").strip()
+        if not verification_code:
+            self.show_error("❌ No verification code: scan 'SERIAL,VCODE' or fill in the Verification Code field")
+            return
+        
+        self.scan_pipeline.submit(
+            serial_number,
+            verification_code,
+            device_name=(self.device_name_field.value or "").strip(),
+            format_type=self.format_dropdown.value
+        )
+        # Ready for the next scan straight away
+        self.serial_field.value = ""
+        self.show_progress(f"📥 {serial_number} queued ({self.scan_pipeline.pending} in pipeline)", self.serial_field)
+    
+    def read_pipeline_devuid(self):
+        """DevUID of the board in the fixture, read on the pipeline's read thread"""
+        return self.devuid_reader.read_devuid(on_status=self.on_devuid_status)
+    
+    def on_pipeline_unit(self, unit):
+        """Show a board the pipeline has finished"""
+        record_id, filename, png = unit.result
+        self.devuid_field.value = unit.dev_uid
+        self.display_qr_preview(png)
+        self.refresh_records(newest=True)
+        self.show_success(
+            f"✅ {unit.serial_number} → {unit.dev_uid} (ID {record_id}) | cycle {unit.cycle_time:.2f}s, "
+            f"avg {self.scan_pipeline.mean_cycle_time():.2f}s | {self.scan_pipeline.pending} queued",
+            self.devuid_field
+        )
+    
+    def on_pipeline_error(self, serial_number, error):
+        """Report a board the pipeline could not provision"""
+        self.show_error(f"❌ {serial_number} not provisioned: {str(error)}")
     
     def clear_fields(self, e):
         """Clear all input fields"""
@@ -865,7 +919,7 @@ class QRGeneratorApp:
         self.devuid_field.value = test_devuid
         
         # Set format to Olarm (default)
-        self.format_dropdown.value = "olarm"
+        self.format_dropdown.value = DEFAULT_FORMAT
         self.on_format_change(None)
         
         self.status_text.value = "Test data filled"
@@ -877,7 +931,7 @@ class QRGeneratorApp:
         print(f"   Serial: {test_serial}")
         print(f"   V-Code: {test_vcode}")
         print(f"   DevUID: {test_devuid}")
-        print(f"   Format: olarm")
+        print(f"   Format: {DEFAULT_FORMAT}")
     
     def remove_record(self, e):
         """Remove a selected record from the database"""
@@ -889,32 +943,29 @@ class QRGeneratorApp:
         
         try:
             # Get QR filename from database
-            self.cursor.execute('SELECT qr_filename, serial_number FROM qr_records WHERE id = ?', (record_id,))
-            result = self.cursor.fetchone()
+            result = self.conn.execute(
+                'SELECT qr_filename, serial_number FROM qr_records WHERE id = ?', (record_id,)).fetchone()
             
             if result:
                 qr_filename, serial_number = result
                 
-                # Delete the QR code file if it exists
-                if os.path.exists(qr_filename):
-                    os.remove(qr_filename)
-                    print(f"Deleted QR code file: {qr_filename}")
-                
                 # Delete from database
-                self.cursor.execute('DELETE FROM qr_records WHERE id = ?', (record_id,))
-                self.conn.commit()
+                write_transaction(
+                    self.conn, lambda: self.conn.execute('DELETE FROM qr_records WHERE id = ?', (record_id,)))
+                
+                # Delete the QR code file unless another record shares it
+                if self.image_store.release(self.conn, qr_filename):
+                    print(f"Deleted QR code file: {qr_filename}")
+                    self.thumbnail_cache.discard(qr_filename)
                 
                 # Clear selection
                 self.selected_record_id = None
                 
-                # Auto-update Excel file
-                try:
-                    self.export_to_excel_silent()
-                except:
-                    pass
+                # Queue an Excel update
+                self.export_worker.request()
                 
                 # Refresh records table
-                self.load_records()
+                self.refresh_records()
                 
                 # Clear QR preview
                 self.qr_image.src_base64 = None
@@ -929,76 +980,26 @@ class QRGeneratorApp:
     
 
     def export_to_excel(self, e):
-        """Export all records to Excel with QR code images"""
-        try:
-            self.export_to_excel_silent()
-            self.show_success("📊 Excel file updated: qr_records.xlsx")
-        except Exception as e:
-            self.show_error(f"Failed to export to Excel: {str(e)}")
+        """Rebuild the Excel file with all records in the background"""
+        self.export_worker.request(full=True, immediate=True)
+        self.show_success("📊 Exporting records to qr_records.xlsx...")
     
-    def export_to_excel_silent(self):
-        """Export all records to Excel silently"""
-        try:
-            # Fetch all records from database
-            self.cursor.execute('''
-                SELECT id, serial_number, verification_code, dev_uid, device_name, qr_filename, created_at
-                FROM qr_records
-                ORDER BY created_at ASC
-            ''')
-            records = self.cursor.fetchall()
-            
-            # Create workbook and worksheet
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "QR Records"
-            
-            # Headers
-            headers = ['ID', 'Serial Number', 'Verification Code', 'DevUID', 'Device Name', 'QR Code', 'Created At (SAST)']
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
-            # Data rows
-            for row, record in enumerate(records, 2):
-                ws.cell(row=row, column=1, value=record[0])  # ID
-                ws.cell(row=row, column=2, value=record[1])  # Serial Number
-                ws.cell(row=row, column=3, value=record[2])  # Verification Code
-                ws.cell(row=row, column=4, value=record[3])  # DevUID
-                ws.cell(row=row, column=5, value=record[4] if record[4] else "")  # Device Name
-                ws.cell(row=row, column=7, value=record[6])  # Created At
-                
-                # Add QR code image if file exists
-                qr_filename = record[5]
-                if os.path.exists(qr_filename):
-                    try:
-                        img = OpenpyxlImage(qr_filename)
-                        img.width = 100
-                        img.height = 100
-                        ws.add_image(img, f'F{row}')
-                        ws.row_dimensions[row].height = 75
-                    except:
-                        ws.cell(row=row, column=6, value="[QR file not found]")
-                else:
-                    ws.cell(row=row, column=6, value="[QR file not found]")
-            
-            # Adjust column widths
-            ws.column_dimensions['A'].width = 8
-            ws.column_dimensions['B'].width = 20
-            ws.column_dimensions['C'].width = 15
-            ws.column_dimensions['D'].width = 20
-            ws.column_dimensions['E'].width = 15
-            ws.column_dimensions['F'].width = 15
-            ws.column_dimensions['G'].width = 20
-            
-            # Save workbook
-            wb.save('qr_records.xlsx')
-            sast_time = datetime.now(self.sast_tz).strftime("%Y-%m-%d %H:%M:%S SAST")
-            print(f"📊 Excel file updated: qr_records.xlsx at {sast_time}")
-            
-        except Exception as e:
-            raise e
+    def on_export_status(self, message, error):
+        """Show background export progress and errors in the status text"""
+        if error:
+            self.show_error(message)
+        else:
+            self.show_success(message)
+    
+    def close(self):
+        """Stop background work when the window closes"""
+        # Drop queued scans, then abort the read in progress
+        self.scan_pipeline.close(cancel_pending=True, wait=False)
+        self.devuid_reader.cancel()
+        self.export_worker.stop()
+        self.record_pager.close()
+        self.devuid_reader.close()
+        self.conn.close()
     
     def show_error(self, message):
         """Show error message"""
@@ -1007,13 +1008,22 @@ class QRGeneratorApp:
         self.page.update()
         print(f"❌ Error: {message}")
     
-    def show_success(self, message):
-        """Show success message"""
+    def show_success(self, message, *controls):
+        """Show success message, updating only the given controls if any"""
         self.status_text.value = message
         self.status_text.color = ft.Colors.GREEN
-        self.page.update()
+        if controls:
+            self.page.update(self.status_text, *controls)
+        else:
+            self.page.update()
         print(f"✅ Success: {message}")
 
+    def show_progress(self, message, *controls):
+        """Show a progress message without redrawing the fields being edited"""
+        self.status_text.value = message
+        self.status_text.color = ft.Colors.BLUE
+        self.page.update(self.status_text, *controls)
+
 def main(page: ft.Page):
     """Main function to run the Flet app"""
     try:
@@ -0,0 +1,137 @@
+"""
+Fixed-version QR layouts
+qrcode.QRCode.make(fit=True) searches for the smallest version and scores
+all eight masks for every code. Device payloads have a near constant
+length, so a layout fixes the version and error correction per format and
+precomputes everything that does not depend on the data: the function
+patterns, the order of the data modules and the mask bits. Encoding a code
+is then just the data and ECC codewords plus one XOR per module.
+"""
+
+from functools import lru_cache
+
+from qrcode import base, constants, exceptions, util
+from qrcode.main import QRCode
+
+from qr_formats import get_formatter
+
+# Longest fields a layout is sized for; longer input falls back to fitting
+MAX_FIELD_LENGTHS = {'serial_number': 20, 'verification_code': 6, 'dev_uid': 24}
+
+# Same chunking as QRCode.add_data() so codes match the fitted encoder
+OPTIMIZE_MINIMUM = 20
+
+
+class QRLayout:
+    """Precomputed module layout for one QR version and error correction level
+
+    With mask_pattern=None the mask is chosen per code with the same
+    penalty rules as qrcode, so a code is module-for-module identical to
+    the fitted encoder whenever that picks the same version. A fixed
+    mask_pattern skips the penalty scoring altogether.
+    """
+
+    def __init__(self, version, error_correction=constants.ERROR_CORRECT_M, mask_pattern=None):
+        util.check_version(version)
+        self.version = version
+        self.error_correction = error_correction
+        self.mask_pattern = mask_pattern
+
+        qr = QRCode(version=version, error_correction=error_correction)
+        qr.modules_count = version * 4 + 17
+        qr.modules = [[None] * qr.modules_count for _ in range(qr.modules_count)]
+        qr.setup_position_probe_pattern(0, 0)
+        qr.setup_position_probe_pattern(qr.modules_count - 7, 0)
+        qr.setup_position_probe_pattern(0, qr.modules_count - 7)
+        qr.setup_position_adjust_pattern()
+        qr.setup_timing_pattern()
+        qr.setup_type_info(True, 0)
+        if version >= 7:
+            qr.setup_type_number(True)
+        self.modules_count = qr.modules_count
+        self.data_path = self._data_path(qr.modules)
+
+        # Blank format and version information, as qrcode scores the masks with it
+        self.test_template = qr.modules
+        self.templates = []
+        for mask_pattern in range(8):
+            qr.modules = [row[:] for row in self.test_template]
+            qr.setup_type_info(False, mask_pattern)
+            if version >= 7:
+                qr.setup_type_number(False)
+            self.templates.append(qr.modules)
+
+        # Mask bits along the data path, packed into an int like the data bits
+        self.masks = []
+        for mask_pattern in range(8):
+            mask_func = util.mask_func(mask_pattern)
+            bits = ''.join('1' if mask_func(row, col) else '0' for row, col in self.data_path)
+            self.masks.append(int(bits, 2))
+
+    @classmethod
+    def for_payload_length(cls, length, error_correction=constants.ERROR_CORRECT_M, mask_pattern=None):
+        """Smallest layout holding a byte-mode payload of this many bytes"""
+        for version in range(1, 41):
+            bits = 4 + util.length_in_bits(util.MODE_8BIT_BYTE, version) + length * 8
+            capacity = sum(block.data_count * 8 for block in base.rs_blocks(version, error_correction))
+            if bits <= capacity:
+                return cls(version, error_correction, mask_pattern)
+        raise exceptions.DataOverflowError(f"Payload of {length} bytes does not fit in a QR code")
+
+    def _data_path(self, modules):
+        """Data module coordinates in the order map_data() fills them"""
+        path = []
+        count = self.modules_count
+        row = count - 1
+        inc = -1
+        for col in range(count - 1, 0, -2):
+            if col <= 6:
+                col -= 1
+            while True:
+                for c in (col, col - 1):
+                    if modules[row][c] is None:
+                        path.append((row, c))
+                row += inc
+                if row < 0 or count <= row:
+                    row -= inc
+                    inc = -inc
+                    break
+        return path
+
+    def data_bits(self, qr_data):
+        """Data and ECC codewords as an int aligned with the data path
+
+        Raises qrcode.exceptions.DataOverflowError if the payload does not
+        fit this layout.
+        """
+        data_list = util.optimal_data_chunks(qr_data, minimum=OPTIMIZE_MINIMUM)
+        codewords = util.create_data(self.version, self.error_correction, data_list)
+        remainder = len(self.data_path) - len(codewords) * 8
+        return int.from_bytes(bytes(codewords), 'big') << remainder
+
+    def _place(self, template, bits):
+        modules = [row[:] for row in template]
+        path_bits = format(bits, f'0{len(self.data_path)}b')
+        for (row, col), bit in zip(self.data_path, path_bits):
+            modules[row][col] = bit == '1'
+        return modules
+
+    def matrix(self, qr_data):
+        """Return the module matrix (rows of booleans) for a payload"""
+        bits = self.data_bits(qr_data)
+        mask_pattern = self.mask_pattern
+        if mask_pattern is None:
+            mask_pattern = min(
+                range(8),
+                key=lambda i: util.lost_point(self._place(self.test_template, bits ^ self.masks[i])),
+            )
+        return self._place(self.templates[mask_pattern], bits ^ self.masks[mask_pattern])
+
+
+@lru_cache(maxsize=None)
+def layout_for_format(format_type, mask_pattern=None):
+    """Layout sized for the longest payload a format produces"""
+    formatter = get_formatter(format_type)
+    longest = formatter(*('X' * MAX_FIELD_LENGTHS[field]
+                          for field in ('serial_number', 'verification_code', 'dev_uid')))
+    return QRLayout.for_payload_length(len(longest.encode('utf-8')), mask_pattern=mask_pattern)
@@ -0,0 +1,152 @@
+"""
+Versioned schema migrations shared by the CLI and GUI
+The schema version lives in PRAGMA user_version. migrate() applies every
+migration above it in one transaction, so a current database costs a
+single PRAGMA read at startup and no DDL at all.
+"""
+
+from qr_database import ensure_indexes
+
+RECORDS_TABLE = '''
+    CREATE TABLE {name} (
+        id INTEGER PRIMARY KEY,
+        serial_number TEXT NOT NULL,
+        verification_code TEXT NOT NULL,
+        dev_uid TEXT NOT NULL,
+        device_name TEXT,
+        qr_filename TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+RECORD_COLUMNS = 'id, serial_number, verification_code, dev_uid, device_name, qr_filename, created_at'
+
+
+def _create_records(conn):
+    """Create qr_records, or bring a pre-versioning CLI/GUI table in line
+
+    Old CLI tables used AUTOINCREMENT and had no device_name; old GUI
+    tables defaulted created_at to SAST. Those are copied into the shared
+    schema with one INSERT ... SELECT. AUTOINCREMENT tables get sequential
+    IDs in creation order, as the old CLI migration gave them.
+    """
+    table = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='qr_records'").fetchone()
+    if table is None:
+        conn.execute(RECORDS_TABLE.format(name='qr_records'))
+        return
+
+    columns = {row[1]: row[4] for row in conn.execute("PRAGMA table_info(qr_records)")}
+    autoincrement = 'AUTOINCREMENT' in table[0].upper()
+    if not autoincrement and columns.get('created_at') == 'CURRENT_TIMESTAMP':
+        if 'device_name' not in columns:
+            conn.execute('ALTER TABLE qr_records ADD COLUMN device_name TEXT')
+        return
+
+    record_id = 'ROW_NUMBER() OVER (ORDER BY created_at, id)' if autoincrement else 'id'
+    device_name = 'device_name' if 'device_name' in columns else 'NULL'
+    conn.execute(RECORDS_TABLE.format(name='qr_records_new'))
+    conn.execute(f'''
+        INSERT INTO qr_records_new ({RECORD_COLUMNS})
+        SELECT {record_id}, serial_number, verification_code, dev_uid, {device_name}, qr_filename, created_at
+        FROM qr_records
+    ''')
+    conn.execute('DROP TABLE qr_records')
+    conn.execute('ALTER TABLE qr_records_new RENAME TO qr_records')
+
+
+def _create_indexes(conn):
+    ensure_indexes(conn, commit=False)
+
+
+def _create_thumbnails(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS qr_thumbnails (
+            qr_filename TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            thumbnail TEXT NOT NULL
+        )
+    ''')
+
+
+def _share_image_files(conn):
+    """qr_filename was unique while every record had its own image file"""
+    conn.execute('DROP INDEX IF EXISTS idx_qr_records_qr_filename')
+    ensure_indexes(conn, commit=False)
+
+
+def _add_sync_sequence(conn):
+    """Number records in the order they are added, for tabular export syncs
+
+    IDs are handed out again after a delete, and created_at has a
+    resolution of a second and two formats (UTC from the CLI, SAST with
+    an offset from the GUI), so neither tells a sync which records it has
+    not seen yet. sync_seq comes from a counter that only ever goes up.
+    Existing records are numbered in (created_at, id) order.
+    """
+    conn.execute('ALTER TABLE qr_records ADD COLUMN sync_seq INTEGER')
+    # Numbered in Python: UPDATE ... FROM needs SQLite 3.33
+    ids = conn.execute('SELECT id FROM qr_records ORDER BY created_at, id').fetchall()
+    conn.executemany('UPDATE qr_records SET sync_seq = ? WHERE id = ?',
+                     ((seq, record_id) for seq, (record_id,) in enumerate(ids, 1)))
+    conn.execute('CREATE UNIQUE INDEX idx_qr_records_sync_seq ON qr_records (sync_seq)')
+    conn.execute('''
+        CREATE TABLE qr_sync_counter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            seq INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('INSERT INTO qr_sync_counter (id, seq) SELECT 1, COALESCE(MAX(sync_seq), 0) FROM qr_records')
+    conn.execute('''
+        CREATE TRIGGER qr_sync_seq_on_insert AFTER INSERT ON qr_records
+        BEGIN
+            UPDATE qr_sync_counter SET seq = seq + 1 WHERE id = 1;
+            UPDATE qr_records SET sync_seq = (SELECT seq FROM qr_sync_counter WHERE id = 1) WHERE id = NEW.id;
+        END
+    ''')
+
+
+# Migration N upgrades a database from user_version N-1 to N; append only
+MIGRATIONS = [
+    _create_records,
+    _create_indexes,
+    _create_thumbnails,
+    _share_image_files,
+    _add_sync_sequence,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Bring the database up to SCHEMA_VERSION, returns the version it had"""
+    version = schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        return version
+
+    if conn.in_transaction:
+        conn.commit()
+    upgrading = version > 0 or conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='qr_records'").fetchone()
+    if upgrading:
+        print(f"🔄 Migrating database from schema version {version} to {SCHEMA_VERSION}...")
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Another station may have migrated while this one waited for the lock
+        version = schema_version(conn)
+        for migration in MIGRATIONS[version:]:
+            migration(conn)
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    if upgrading:
+        print("✅ Database migration completed")
+    return version
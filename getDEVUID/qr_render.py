@@ -0,0 +1,167 @@
+"""
+QR code rendering shared by the CLI and GUI
+Turns a payload string into PNG bytes, either in-process or on a pool of
+worker processes for bulk jobs
+"""
+
+import os
+import struct
+import zlib
+from collections import deque, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import qrcode
+
+from qr_layout import layout_for_format
+
+# A payload to render; with a filename the worker writes the PNG itself.
+# With a format_type the code uses that format's fixed-version layout, and
+# a mask_pattern (0-7) skips choosing the best mask for each code.
+RenderJob = namedtuple('RenderJob', ['qr_data', 'filename', 'format_type', 'mask_pattern'],
+                       defaults=(None, None))
+
+# filename is set when the PNG was written to disk, png otherwise
+RenderResult = namedtuple('RenderResult', ['filename', 'png', 'error'])
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Module rows repeat box_size times, which deflate finds on its own; level 6
+# with Z_FILTERED is as small as level 9 at a quarter of the cost
+PNG_COMPRESS_LEVEL = 6
+PNG_COMPRESS_STRATEGY = zlib.Z_FILTERED
+
+
+def qr_matrix(qr_data, format_type=None, mask_pattern=None):
+    """Return the module matrix for a payload
+
+    A format_type uses that format's precomputed fixed-version layout;
+    payloads that do not fit it, or no format_type, fall back to fitting
+    the smallest version.
+    """
+    if format_type is not None:
+        try:
+            return layout_for_format(format_type, mask_pattern).matrix(qr_data)
+        except qrcode.exceptions.DataOverflowError:
+            pass
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        mask_pattern=mask_pattern,
+    )
+    qr.add_data(qr_data)
+    qr.make(fit=True)
+    return qr.modules
+
+
+def _png_chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+def matrix_png(modules, box_size=10, border=4):
+    """Write a module matrix as a black on white 1-bit grayscale PNG
+
+    Scanlines are packed straight from the module rows, so no image object
+    is built. Each distinct scanline is packed once and repeated box_size
+    times.
+    """
+    size = (len(modules) + border * 2) * box_size
+    row_bytes = (size + 7) // 8
+    margin = '1' * (border * box_size)
+    padding = '1' * (row_bytes * 8 - size)
+    dark, light = '0' * box_size, '1' * box_size
+
+    quiet_zone = (b'\x00' + b'\xff' * row_bytes) * (border * box_size)
+    scanlines = [quiet_zone]
+    for row in modules:
+        bits = margin + ''.join(dark if module else light for module in row) + margin + padding
+        scanlines.append((b'\x00' + int(bits, 2).to_bytes(row_bytes, 'big')) * box_size)
+    scanlines.append(quiet_zone)
+
+    compressor = zlib.compressobj(PNG_COMPRESS_LEVEL, zlib.DEFLATED, 15, 9, PNG_COMPRESS_STRATEGY)
+    idat = compressor.compress(b''.join(scanlines)) + compressor.flush()
+    return (PNG_SIGNATURE
+            + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 1, 0, 0, 0, 0))
+            + _png_chunk(b'IDAT', idat)
+            + _png_chunk(b'IEND', b''))
+
+
+def render_qr_png(qr_data, box_size=10, border=4, format_type=None, mask_pattern=None):
+    """Encode a payload as a QR code and return the PNG bytes"""
+    return matrix_png(qr_matrix(qr_data, format_type, mask_pattern), box_size, border)
+
+
+def save_png(filename, png):
+    """Write PNG bytes to filename, creating its directory
+
+    The bytes go to a temporary file that is renamed into place, so
+    another process never sees a half-written image.
+    """
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    partial = f"{filename}.{os.getpid()}.partial"
+    with open(partial, 'wb') as f:
+        f.write(png)
+    os.replace(partial, filename)
+
+
+def render_job(job):
+    """Render one job; runs inside pool workers so it never raises"""
+    try:
+        png = render_qr_png(job.qr_data, format_type=job.format_type, mask_pattern=job.mask_pattern)
+        if job.filename:
+            save_png(job.filename, png)
+            return RenderResult(job.filename, None, None)
+        return RenderResult(None, png, None)
+    except Exception as e:
+        return RenderResult(job.filename, None, str(e))
+
+
+class RenderPool:
+    """Renders QR codes on worker processes and hands results back in order
+
+    imap() keeps a bounded number of jobs in flight, so arbitrarily long
+    inputs are streamed. Results come back in submission order, which lets
+    a single caller commit database rows in the same order as the input.
+    With one worker everything runs in the calling process.
+    """
+
+    def __init__(self, workers=None, max_in_flight=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or self.workers * 8
+        self.executor = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+
+    def imap(self, tagged_jobs):
+        """Yield (tag, RenderResult) for each (tag, RenderJob) in input order
+
+        A job of None is passed through as a result of None, so callers can
+        keep rows that failed validation in sequence. A RenderResult given
+        in place of a job (an image already on disk) is passed through too.
+        """
+        if self.executor is None:
+            for tag, job in tagged_jobs:
+                yield tag, render_job(job) if isinstance(job, RenderJob) else job
+            return
+
+        window = deque()
+        for tag, job in tagged_jobs:
+            future = self.executor.submit(render_job, job) if isinstance(job, RenderJob) else job
+            window.append((tag, future))
+            if len(window) >= self.max_in_flight:
+                tag, future = window.popleft()
+                yield tag, future.result() if isinstance(future, Future) else future
+        while window:
+            tag, future = window.popleft()
+            yield tag, future.result() if isinstance(future, Future) else future
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
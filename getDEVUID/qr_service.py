@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Local HTTP service for QR generation
+Keeps one process running with the database connection, the QR layouts,
+the render pool and the Excel export worker warm, so callers such as the
+MES get a code in milliseconds instead of paying interpreter and import
+startup for every call.
+
+Endpoints (JSON in, JSON out):
+    POST   /generate       {"serial_number", "verification_code", "dev_uid", "format"?, "device_name"?}
+    POST   /batch          {"rows": [{...}, ...], "format"?}
+    GET    /records/<id>
+    GET    /records?serial_number=...  (or dev_uid=..., qr_filename=...; limit=N)
+    DELETE /records/<id>
+    POST   /export         {"full"?: true}
+    GET    /health
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from excel_export import ExportWorker, CLI_LAYOUT, EXCEL_FILENAME, SHARD_MODES
+from qr_database import DB_PATH, IdAllocator, connect, write_transaction
+from qr_formats import FORMATS, DEFAULT_FORMAT, format_qr_data
+from qr_generator_cli import normalize_batch_row
+from qr_layout import layout_for_format
+from qr_migrations import migrate
+from qr_render import RenderPool
+from qr_store import QRImageStore
+
+RECORD_COLUMNS = ('id', 'serial_number', 'verification_code', 'dev_uid', 'device_name', 'qr_filename', 'created_at')
+REQUIRED_FIELDS = ('serial_number', 'verification_code', 'dev_uid')
+
+# Columns records can be looked up by, each backed by an index
+LOOKUP_FIELDS = ('serial_number', 'dev_uid', 'qr_filename')
+DEFAULT_LOOKUP_LIMIT = 100
+
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+HTTP_REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class ServiceError(Exception):
+    """A request the service refuses, with the HTTP status to answer with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class QRService:
+    """QR generation over one warm database connection
+
+    Every method that touches the database runs on the single thread of
+    self.executor, which serialises the writes of this process. Other
+    stations writing to the same file are handled by write_transaction().
+    """
+
+    def __init__(self, db_path=DB_PATH, workers=1, export_quiet_period=2.0, excel_filename=EXCEL_FILENAME,
+                 export_shard_by=None):
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="qr-service")
+        # Only ever used from the executor thread, but opened on this one
+        self.conn = connect(db_path, check_same_thread=False)
+        migrate(self.conn)
+        self.id_allocator = IdAllocator(self.conn)
+        self.render_pool = RenderPool(workers)
+        self.image_store = QRImageStore()
+        self.export_worker = ExportWorker(db_path, CLI_LAYOUT, excel_filename, export_quiet_period,
+                                          shard_by=export_shard_by)
+
+        # Build the fixed layouts now rather than on the first request
+        for format_type in FORMATS:
+            layout_for_format(format_type)
+
+    def close(self):
+        self.executor.shutdown()
+        self.render_pool.close()
+        self.export_worker.stop()
+        self.conn.close()
+
+    @staticmethod
+    def _validate(row, default_format=DEFAULT_FORMAT):
+        """Return (fields, format) for one record, raising ServiceError if it is invalid"""
+        if not isinstance(row, dict):
+            raise ServiceError(400, "Expected a JSON object")
+        missing = [field for field in REQUIRED_FIELDS if not str(row.get(field) or '').strip()]
+        if missing:
+            raise ServiceError(400, f"Missing {', '.join(missing)}")
+        format_type = row.get('format') or default_format
+        if format_type not in FORMATS:
+            raise ServiceError(400, f"Unknown format: {format_type}")
+        return [str(row[field]).strip() for field in REQUIRED_FIELDS], format_type
+
+    def _insert(self, serial_number, verification_code, dev_uid, filename, device_name=None):
+        # The image may have been cleaned up since it was found in the store
+        if not self.image_store.claim(filename):
+            raise ServiceError(409, f"QR image {filename} was removed before the record was saved")
+        record_id = self.id_allocator.next_id()
+        self.conn.execute('''
+            INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, device_name, qr_filename)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (record_id, serial_number, verification_code, dev_uid, device_name, filename))
+        return record_id
+
+    def generate(self, data):
+        """Render (unless already stored), save and record one QR code"""
+        (serial_number, verification_code, dev_uid), format_type = self._validate(data)
+        device_name = data.get('device_name')
+        qr_data = format_qr_data(format_type, serial_number, verification_code, dev_uid)
+
+        filename, png, _ = self.image_store.get_or_render(qr_data, format_type)
+        try:
+            record_id = write_transaction(self.conn, lambda: self._insert(
+                serial_number, verification_code, dev_uid, filename, device_name))
+        except Exception:
+            self.image_store.release(self.conn, filename)
+            raise
+
+        self.export_worker.share_png(filename, png)
+        self.export_worker.request()
+        return {'id': record_id, 'qr_filename': filename, 'qr_data': qr_data, 'format': format_type}
+
+    def batch(self, data):
+        """Generate many codes; rows are rendered first, then inserted in one transaction"""
+        rows = data.get('rows') if isinstance(data, dict) else None
+        if not isinstance(rows, list):
+            raise ServiceError(400, "Expected a JSON object with a 'rows' list")
+        default_format = data.get('format') or DEFAULT_FORMAT
+        if default_format not in FORMATS:
+            raise ServiceError(400, f"Unknown format: {default_format}")
+
+        def jobs():
+            for index, row in enumerate(rows):
+                try:
+                    fields, format_type = self._validate(
+                        normalize_batch_row(row) if isinstance(row, dict) else row, default_format)
+                except ServiceError as e:
+                    yield (index, None, e.message), None
+                    continue
+                qr_data = format_qr_data(format_type, *fields)
+                yield (index, fields, None), self.image_store.job(qr_data, format_type)
+
+        results = [None] * len(rows)
+        rendered = []
+        for (index, fields, error), result in self.render_pool.imap(jobs()):
+            if error is None and result.error:
+                error = f"Rendering failed: {result.error}"
+            if error:
+                results[index] = {'row': index, 'status': 'error', 'error': error}
+            else:
+                rendered.append((index, fields, result.filename))
+
+        def insert_all():
+            inserted = []
+            for index, fields, filename in rendered:
+                try:
+                    inserted.append((index, self._insert(*fields, filename), filename))
+                except ServiceError as e:
+                    inserted.append((index, None, e.message))
+            return inserted
+
+        succeeded = 0
+        for index, record_id, detail in write_transaction(self.conn, insert_all):
+            if record_id is None:
+                results[index] = {'row': index, 'status': 'error', 'error': detail}
+            else:
+                results[index] = {'row': index, 'status': 'ok', 'id': record_id, 'qr_filename': detail}
+                succeeded += 1
+        if succeeded:
+            self.export_worker.request()
+
+        return {'succeeded': succeeded, 'failed': len(rows) - succeeded, 'results': results}
+
+    def get_record(self, record_id):
+        row = self.conn.execute(f'''
+            SELECT {', '.join(RECORD_COLUMNS)} FROM qr_records WHERE id = ?
+        ''', (record_id,)).fetchone()
+        if row is None:
+            raise ServiceError(404, f"Record with ID {record_id} not found")
+        return dict(zip(RECORD_COLUMNS, row))
+
+    def lookup(self, query):
+        """Records matching one indexed field, newest first"""
+        fields = [field for field in LOOKUP_FIELDS if field in query]
+        if len(fields) != 1:
+            raise ServiceError(400, f"Look up by exactly one of {', '.join(LOOKUP_FIELDS)}")
+        try:
+            limit = int(query.get('limit', DEFAULT_LOOKUP_LIMIT))
+        except ValueError:
+            raise ServiceError(400, "limit must be a number")
+        rows = self.conn.execute(f'''
+            SELECT {', '.join(RECORD_COLUMNS)} FROM qr_records
+            WHERE {fields[0]} = ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ''', (query[fields[0]], limit)).fetchall()
+        return {'records': [dict(zip(RECORD_COLUMNS, row)) for row in rows]}
+
+    def delete(self, record_id):
+        """Delete a record, and its QR image unless another record shares it"""
+        qr_filename = self.get_record(record_id)['qr_filename']
+        write_transaction(self.conn, lambda: self.conn.execute('DELETE FROM qr_records WHERE id = ?', (record_id,)))
+        self.image_store.release(self.conn, qr_filename)
+        self.export_worker.request()
+        return {'id': record_id, 'deleted': True}
+
+    def export(self, full=False):
+        """Bring the Excel file up to date now and wait for it"""
+        self.export_worker.request(full=full, immediate=True)
+        return {'filename': self.export_worker.filename, 'completed': self.export_worker.flush()}
+
+
+class QRHttpServer:
+    """Minimal HTTP/1.1 front end for QRService on asyncio streams
+
+    Connections are kept alive between requests, so a client pays the TCP
+    handshake once rather than per code.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        # (method, path pattern, handler(match, query, data), status, runs on the service thread)
+        self.routes = [
+            ('GET', re.compile(r'/health'), self._health, 200, False),
+            ('POST', re.compile(r'/generate'), lambda m, q, d: service.generate(d), 201, True),
+            ('POST', re.compile(r'/batch'), lambda m, q, d: service.batch(d), 200, True),
+            ('GET', re.compile(r'/records'), lambda m, q, d: service.lookup(q), 200, True),
+            ('GET', re.compile(r'/records/(\d+)'), lambda m, q, d: service.get_record(int(m[1])), 200, True),
+            ('DELETE', re.compile(r'/records/(\d+)'), lambda m, q, d: service.delete(int(m[1])), 200, True),
+            ('POST', re.compile(r'/export'), lambda m, q, d: service.export(bool(d.get('full'))), 200, False),
+        ]
+
+    @staticmethod
+    def _health(match, query, data):
+        return {'status': 'ok', 'formats': list(FORMATS)}
+
+    async def dispatch(self, method, target, body):
+        """Route one request, returns (status, JSON-serialisable payload)"""
+        parts = urlsplit(target)
+        path = parts.path.rstrip('/') or '/'
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+
+        path_matched = False
+        for route_method, pattern, handler, status, serial in self.routes:
+            match = pattern.fullmatch(path)
+            if not match:
+                continue
+            if route_method != method:
+                path_matched = True
+                continue
+            try:
+                data = json.loads(body) if body else {}
+                if not isinstance(data, dict):
+                    raise ServiceError(400, "Expected a JSON object")
+                executor = self.service.executor if serial else None
+                result = await asyncio.get_running_loop().run_in_executor(
+                    executor, handler, match, query, data)
+                return status, result
+            except ServiceError as e:
+                return e.status, {'error': e.message}
+            except ValueError as e:
+                return 400, {'error': f"Invalid request: {e}"}
+            except Exception as e:
+                return 500, {'error': str(e)}
+        if path_matched:
+            return 405, {'error': f"{method} not allowed on {path}"}
+        return 404, {'error': f"No endpoint {path}"}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    self._write_response(writer, 400, {'error': "Malformed request line"}, False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    self._write_response(writer, 400, {'error': "Invalid Content-Length"}, False)
+                    break
+                if length > MAX_BODY_SIZE:
+                    self._write_response(writer, 413, {'error': "Request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                status, payload = await self.dispatch(method, target, body)
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _write_response(writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        writer.write((
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        ).encode('latin-1') + body)
+
+    async def start(self, host='127.0.0.1', port=8765):
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+class BackgroundServer:
+    """Runs a QRHttpServer on its own event loop thread, for tests and load tests"""
+
+    def __init__(self, service, host='127.0.0.1', port=0):
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(QRHttpServer(service).start(host, port))
+        self.host, self.port = self.server.sockets[0].getsockname()[:2]
+        self.thread = threading.Thread(target=self.loop.run_forever, name="qr-http", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        async def shutdown():
+            self.server.close()
+            await self.server.wait_closed()
+            # Drop keep-alive connections that are still waiting for a request
+            connections = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in connections:
+                task.cancel()
+            await asyncio.gather(*connections, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+async def serve(service, host, port):
+    server = await QRHttpServer(service).start(host, port)
+    print(f"🚀 QR service listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local HTTP service for QR code generation')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+    parser.add_argument('--workers', type=int, default=1, help='Render processes for /batch (default: 1)')
+    parser.add_argument('--export-delay', type=float, default=2.0,
+                        help='Seconds of quiet before the Excel file is updated (default: 2)')
+    parser.add_argument('--export-shard', choices=SHARD_MODES,
+                        help='Write one Excel file per production day (SAST) or per block of IDs')
+    args = parser.parse_args()
+
+    service = QRService(workers=args.workers, export_quiet_period=args.export_delay,
+                        export_shard_by=args.export_shard)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n👋 Shutting down QR service")
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Content-addressed QR image store
+Images live under qr_images/ab/cd/<key>.png, where the key is a SHA-256
+of the payload and the settings it is rendered with. Generating a code
+that already exists finds its image on disk and skips rendering, records
+with the same code share one file, and no directory grows past a few
+hundred entries however many codes there are. Images are only removed
+once no record refers to them and nothing has used them for GC_MIN_AGE:
+every cache hit marks the image as used, and writers claim() it just
+before committing the record that refers to it. Use is recorded in the
+file's access time, so the modification time the GUI thumbnail cache is
+keyed by only changes when an image is written.
+"""
+
+import hashlib
+import os
+import time
+from collections import namedtuple
+
+from qr_render import RenderJob, RenderResult, render_qr_png, save_png
+
+STORE_DIR = "qr_images"
+
+# Part of every key; bump it when the rendered PNG for a payload changes
+RENDER_VERSION = 1
+
+# gc() and release() leave images used this recently alone: another station
+# may have written or found one for a record it has not committed yet
+GC_MIN_AGE = 3600.0
+
+StoredImage = namedtuple('StoredImage', ['filename', 'png', 'rendered'])
+
+GcResult = namedtuple('GcResult', ['checked', 'removed', 'freed'])
+
+
+class QRImageStore:
+    """QR images on disk, keyed by payload and render settings
+
+    Filenames are relative to the working directory, as qr_filename has
+    always been, so they can be stored in qr_records as they are.
+    """
+
+    def __init__(self, root=STORE_DIR, box_size=10, border=4):
+        self.root = root
+        self.box_size = box_size
+        self.border = border
+        self.hits = self.misses = 0
+
+    def key(self, qr_data, format_type=None, mask_pattern=None):
+        """Hex key of the image for a payload"""
+        settings = f"v{RENDER_VERSION}|{format_type}|{mask_pattern}|{self.box_size}|{self.border}|"
+        return hashlib.sha256((settings + qr_data).encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        """Filename of a key: two levels of 256 directories"""
+        return os.path.join(self.root, key[:2], key[2:4], f"{key}.png")
+
+    def lookup(self, qr_data, format_type=None, mask_pattern=None):
+        """Filename of the image for a payload, None if it has not been rendered"""
+        filename = self.path(self.key(qr_data, format_type, mask_pattern))
+        return filename if os.path.exists(filename) else None
+
+    def get_or_render(self, qr_data, format_type=None, mask_pattern=None):
+        """Return a StoredImage for a payload, rendering and saving it on a miss"""
+        filename = self.path(self.key(qr_data, format_type, mask_pattern))
+        try:
+            with open(filename, 'rb') as f:
+                png = f.read()
+            self.touch(filename)
+            self.hits += 1
+            return StoredImage(filename, png, False)
+        except FileNotFoundError:
+            pass
+        png = render_qr_png(qr_data, self.box_size, self.border, format_type, mask_pattern)
+        save_png(filename, png)
+        self.misses += 1
+        return StoredImage(filename, png, True)
+
+    def job(self, qr_data, format_type=None, mask_pattern=None):
+        """RenderJob for RenderPool.imap(), or the RenderResult of an image already stored"""
+        filename = self.path(self.key(qr_data, format_type, mask_pattern))
+        if self.claim(filename):
+            self.hits += 1
+            return RenderResult(filename, None, None)
+        self.misses += 1
+        return RenderJob(qr_data, filename, format_type, mask_pattern)
+
+    @staticmethod
+    def touch(filename):
+        """Record that an image was just used by setting its access time"""
+        os.utime(filename, ns=(time.time_ns(), os.stat(filename).st_mtime_ns))
+
+    @staticmethod
+    def last_used(stat):
+        """When an image was last written or used, from its os.stat() result"""
+        return max(stat.st_atime, stat.st_mtime)
+
+    @classmethod
+    def claim(cls, filename):
+        """Mark an image as in use, returns False if it has gone
+
+        Writers call it in the write transaction that inserts a record,
+        just before committing, and must not commit a record whose image
+        has gone. Marking the image as used keeps gc() and release() away
+        from it until the record is visible to them.
+        """
+        try:
+            cls.touch(filename)
+        except FileNotFoundError:
+            return False
+        return True
+
+    @staticmethod
+    def referenced(conn, filename):
+        """Whether any record uses an image file"""
+        row = conn.execute('SELECT 1 FROM qr_records WHERE qr_filename = ? LIMIT 1', (filename,)).fetchone()
+        return row is not None
+
+    def release(self, conn, filename, min_age=GC_MIN_AGE):
+        """Delete an image no record refers to, returns True if it was deleted
+
+        Call after the record has been deleted. An image used in the last
+        min_age seconds is left for gc(), since another station may be
+        about to commit a record for it. Images outside the store
+        (timestamped files from older versions) are handled the same way.
+        """
+        if not filename or self.referenced(conn, filename):
+            return False
+        try:
+            if self.last_used(os.stat(filename)) > time.time() - min_age:
+                return False
+            os.remove(filename)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def gc(self, conn, min_age=GC_MIN_AGE, dry_run=False):
+        """Remove stored images that no record refers to, returns a GcResult
+
+        The shard directories are left in place for the next images.
+        """
+        checked = removed = freed = 0
+        cutoff = time.time() - min_age
+        for first in self._subdirs(self.root):
+            for second in self._subdirs(first.path):
+                with os.scandir(second.path) as entries:
+                    images = [entry for entry in entries if entry.is_file() and entry.name.endswith('.png')]
+                for entry in images:
+                    checked += 1
+                    filename = os.path.join(self.root, first.name, second.name, entry.name)
+                    stat = entry.stat()
+                    if self.last_used(stat) > cutoff or self.referenced(conn, filename):
+                        continue
+                    if not dry_run:
+                        os.remove(entry.path)
+                    removed += 1
+                    freed += stat.st_size
+        return GcResult(checked, removed, freed)
+
+    @staticmethod
+    def _subdirs(path):
+        try:
+            with os.scandir(path) as entries:
+                return [entry for entry in entries if entry.is_dir()]
+        except FileNotFoundError:
+            return []
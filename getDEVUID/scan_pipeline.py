@@ -0,0 +1,113 @@
+"""
+Single-scan provisioning pipeline
+A scanned serial number is all the operator enters: the DevUID of the board
+in the fixture is read automatically, then the QR code is generated, the
+record committed and an Excel export queued. Reading and generating run on
+separate threads, so the next board's DevUID is read while the previous
+label is still being generated.
+"""
+
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+# One provisioned board; times are in seconds
+PipelineUnit = namedtuple('PipelineUnit', [
+    'serial_number', 'verification_code', 'dev_uid', 'result',
+    'read_time', 'generate_time', 'latency', 'cycle_time',
+])
+
+
+class ScanPipeline:
+    """Two-stage pipeline: DevUID read, then generate and commit
+
+    read_devuid() returns the DevUID of the board currently in the fixture.
+    generate(serial_number, verification_code, dev_uid, **fields) creates
+    the code and record and returns whatever should be reported for it.
+    Units complete in scan order; on_unit(unit) or on_error(serial_number, error)
+    is called for each from the generate thread.
+
+    A unit's cycle time is the time since the previous unit completed, or
+    since its own scan if the pipeline was idle; with scans queued it
+    settles at the slower of the two stages rather than their sum.
+    """
+
+    def __init__(self, read_devuid, generate, on_unit=None, on_error=None, history=100):
+        self.read_devuid = read_devuid
+        self.generate = generate
+        self.on_unit = on_unit
+        self.on_error = on_error
+        self.read_executor = ThreadPoolExecutor(1, thread_name_prefix="pipeline-read")
+        self.generate_executor = ThreadPoolExecutor(1, thread_name_prefix="pipeline-generate")
+        self.units = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._last_done = None
+        self._last_dev_uid = None
+
+    def submit(self, serial_number, verification_code, **fields):
+        """Queue a scanned board, returns a Future for its PipelineUnit"""
+        scanned_at = time.perf_counter()
+        with self._lock:
+            self._pending += 1
+        read = self.read_executor.submit(self._timed_read)
+        return self.generate_executor.submit(
+            self._finish, scanned_at, read, serial_number, verification_code, fields)
+
+    @property
+    def pending(self):
+        """Scans that have not completed yet"""
+        with self._lock:
+            return self._pending
+
+    def _timed_read(self):
+        start_time = time.perf_counter()
+        dev_uid = self.read_devuid()
+        return dev_uid, time.perf_counter() - start_time
+
+    def _finish(self, scanned_at, read, serial_number, verification_code, fields):
+        try:
+            dev_uid, read_time = read.result()
+            # A board that was not swapped reads the same DevUID again
+            if dev_uid == self._last_dev_uid:
+                raise ValueError(f"DevUID {dev_uid} was already used for the previous board")
+
+            start_time = time.perf_counter()
+            result = self.generate(serial_number, verification_code, dev_uid, **fields)
+            done = time.perf_counter()
+            self._last_dev_uid = dev_uid
+
+            cycle_start = scanned_at if self._last_done is None else max(scanned_at, self._last_done)
+            unit = PipelineUnit(serial_number, verification_code, dev_uid, result,
+                                read_time, done - start_time, done - scanned_at, done - cycle_start)
+            self._last_done = done
+            self.units.append(unit)
+        except (Exception, CancelledError) as e:
+            self._done()
+            if self.on_error:
+                self.on_error(serial_number, e)
+            raise
+        self._done()
+        if self.on_unit:
+            self.on_unit(unit)
+        return unit
+
+    def _done(self):
+        with self._lock:
+            self._pending -= 1
+
+    def mean_cycle_time(self):
+        """Average cycle time over the recent units, None before the first"""
+        units = list(self.units)
+        if not units:
+            return None
+        return sum(unit.cycle_time for unit in units) / len(units)
+
+    def close(self, cancel_pending=False, wait=True):
+        """Stop the threads, after finishing the queued scans unless cancel_pending"""
+        self.read_executor.shutdown(wait=False, cancel_futures=cancel_pending)
+        self.generate_executor.shutdown(wait=False, cancel_futures=cancel_pending)
+        if wait:
+            self.read_executor.shutdown()
+            self.generate_executor.shutdown()
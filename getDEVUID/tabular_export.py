@@ -0,0 +1,154 @@
+"""
+Tabular export of qr_records
+Streams the fields the ERP and label printers need, without images, to CSV
+or, when pyarrow is installed, to Parquet or an Arrow IPC file, one chunk
+of rows at a time. since_seq limits the export to records added after a
+previous sync, read straight off the sync_seq index (see qr_migrations),
+so a sync costs milliseconds and never touches openpyxl.
+"""
+
+import csv
+import os
+from collections import namedtuple
+
+TABULAR_COLUMNS = ('id', 'serial_number', 'verification_code', 'dev_uid', 'device_name', 'qr_filename', 'created_at')
+TABULAR_FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+CHUNK_SIZE = 5000
+
+TabularExportResult = namedtuple('TabularExportResult', ['rows', 'last_seq'])
+
+
+def format_for_path(path):
+    """Export format implied by a file extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in TABULAR_FORMATS:
+        raise ValueError(f"Unsupported export file type {extension or '(none)'}, "
+                         f"use one of {', '.join(TABULAR_FORMATS)}")
+    return TABULAR_FORMATS[extension]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet and Arrow exports need pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+
+def last_seq(conn):
+    """sync_seq of the newest record, 0 without records"""
+    return conn.execute('SELECT COALESCE(MAX(sync_seq), 0) FROM qr_records').fetchone()[0]
+
+
+def record_chunks(conn, since_seq=0, until_seq=None, chunk_size=CHUNK_SIZE):
+    """Yield lists of TABULAR_COLUMNS rows added after since_seq, up to and including until_seq
+
+    Rows come in the order they were added.
+    """
+    if until_seq is None:
+        until_seq = last_seq(conn)
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {", ".join(TABULAR_COLUMNS)} FROM qr_records
+        WHERE sync_seq > ? AND sync_seq <= ?
+        ORDER BY sync_seq
+    ''', (since_seq or 0, until_seq))
+    while rows := cursor.fetchmany(chunk_size):
+        yield rows
+
+
+class _Progress:
+    """Counts exported rows"""
+
+    def __init__(self):
+        self.rows = 0
+
+    def track(self, chunks):
+        for rows in chunks:
+            self.rows += len(rows)
+            yield rows
+
+
+def _write_csv(f, chunks, header=True):
+    writer = csv.writer(f)
+    if header:
+        writer.writerow(TABULAR_COLUMNS)
+    for rows in chunks:
+        writer.writerows(rows)
+
+
+def _arrow_schema(pa):
+    return pa.schema([(name, pa.int64() if name == 'id' else pa.string()) for name in TABULAR_COLUMNS])
+
+
+def _arrow_batch(pa, schema, rows):
+    columns = list(zip(*rows))
+    arrays = [pa.array(column if field.name == 'id' else [None if v is None else str(v) for v in column],
+                       type=field.type)
+              for field, column in zip(schema, columns)]
+    return pa.record_batch(arrays, schema=schema)
+
+
+def _write_parquet(path, chunks):
+    pa = _pyarrow()
+    schema = _arrow_schema(pa)
+    with pa.parquet.ParquetWriter(path, schema) as writer:
+        # One row group per chunk
+        for rows in chunks:
+            writer.write_table(pa.Table.from_batches([_arrow_batch(pa, schema, rows)]))
+
+
+def _write_arrow(path, chunks):
+    pa = _pyarrow()
+    schema = _arrow_schema(pa)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+        for rows in chunks:
+            writer.write_batch(_arrow_batch(pa, schema, rows))
+
+
+def export_records(conn, path, export_format=None, since_seq=None, append=False, chunk_size=CHUNK_SIZE):
+    """Write qr_records to a CSV, Parquet or Arrow file, returns a TabularExportResult
+
+    since_seq exports only the records added after a previous sync (pass
+    the last_seq it returned). append adds the rows to an existing CSV
+    instead of replacing it; other files are written to a temporary name
+    and only replace path once complete.
+    """
+    export_format = export_format or format_for_path(path)
+    if export_format not in TABULAR_FORMATS.values():
+        raise ValueError(f"Unknown export format: {export_format}")
+    if append and export_format != 'csv':
+        raise ValueError("Only CSV exports can be appended to")
+    if export_format != 'csv':
+        # Fail before reading any rows when pyarrow is missing
+        _pyarrow()
+
+    # Records added while the export runs are left for the next sync
+    since_seq = since_seq or 0
+    until_seq = max(since_seq, last_seq(conn))
+    progress = _Progress()
+    chunks = progress.track(record_chunks(conn, since_seq, until_seq, chunk_size))
+
+    if append:
+        header = not os.path.exists(path) or os.path.getsize(path) == 0
+        with open(path, 'a', newline='', encoding='utf-8') as f:
+            _write_csv(f, chunks, header)
+        return TabularExportResult(progress.rows, until_seq)
+
+    partial = f"{path}.partial"
+    try:
+        if export_format == 'csv':
+            with open(partial, 'w', newline='', encoding='utf-8') as f:
+                _write_csv(f, chunks)
+        elif export_format == 'parquet':
+            _write_parquet(partial, chunks)
+        else:
+            _write_arrow(partial, chunks)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    os.replace(partial, path)
+    return TabularExportResult(progress.rows, until_seq)
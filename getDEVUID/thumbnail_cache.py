@@ -0,0 +1,108 @@
+"""
+Thumbnail cache for the GUI records table
+Thumbnails are base64 PNG strings keyed by QR filename and the file's
+modification time and size, so a rewritten image is picked up while an
+unchanged one is never decoded or resized again.
+"""
+
+import base64
+import io
+import os
+from collections import OrderedDict
+
+from PIL import Image
+
+from qr_database import write_transaction
+
+THUMBNAIL_SIZE = (80, 80)
+
+
+class ThumbnailCache:
+    """LRU cache of table thumbnails, optionally persisted in SQLite
+
+    With a connection the thumbnails are also kept in the qr_thumbnails
+    table (created by qr_migrations), so a restarted GUI does not rebuild
+    them either.
+    """
+
+    def __init__(self, conn=None, max_entries=256, size=THUMBNAIL_SIZE):
+        self.conn = conn
+        self.max_entries = max_entries
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def _stamp(qr_filename):
+        stat = os.stat(qr_filename)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self, qr_filename):
+        """Return the base64 thumbnail for an image file, None if it is missing"""
+        try:
+            stamp = self._stamp(qr_filename)
+        except OSError:
+            self.discard(qr_filename)
+            return None
+
+        entry = self.entries.get(qr_filename)
+        if entry is not None and entry[0] == stamp:
+            self.entries.move_to_end(qr_filename)
+            self.hits += 1
+            return entry[1]
+
+        thumbnail = self._load_persisted(qr_filename, stamp)
+        if thumbnail is None:
+            self.misses += 1
+            with open(qr_filename, 'rb') as f:
+                thumbnail = self.make_thumbnail(f.read())
+            self._persist(qr_filename, stamp, thumbnail)
+        else:
+            self.hits += 1
+        self._remember(qr_filename, stamp, thumbnail)
+        return thumbnail
+
+    def put(self, qr_filename, png):
+        """Add the thumbnail of a PNG that was just written to qr_filename"""
+        stamp = self._stamp(qr_filename)
+        thumbnail = self.make_thumbnail(png)
+        self._persist(qr_filename, stamp, thumbnail)
+        self._remember(qr_filename, stamp, thumbnail)
+        return thumbnail
+
+    def discard(self, qr_filename):
+        """Forget the thumbnail of a removed image"""
+        self.entries.pop(qr_filename, None)
+        if self.conn is not None:
+            write_transaction(self.conn, lambda: self.conn.execute(
+                'DELETE FROM qr_thumbnails WHERE qr_filename = ?', (qr_filename,)))
+
+    def make_thumbnail(self, png):
+        """Resize PNG bytes to a thumbnail and return it base64 encoded"""
+        with Image.open(io.BytesIO(png)) as img:
+            img_resized = img.resize(self.size, Image.Resampling.LANCZOS)
+            img_buffer = io.BytesIO()
+            img_resized.save(img_buffer, format='PNG')
+        return base64.b64encode(img_buffer.getvalue()).decode()
+
+    def _remember(self, qr_filename, stamp, thumbnail):
+        self.entries[qr_filename] = (stamp, thumbnail)
+        self.entries.move_to_end(qr_filename)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _load_persisted(self, qr_filename, stamp):
+        if self.conn is None:
+            return None
+        row = self.conn.execute('''
+            SELECT thumbnail FROM qr_thumbnails WHERE qr_filename = ? AND mtime_ns = ? AND size = ?
+        ''', (qr_filename, *stamp)).fetchone()
+        return row[0] if row else None
+
+    def _persist(self, qr_filename, stamp, thumbnail):
+        if self.conn is None:
+            return
+        write_transaction(self.conn, lambda: self.conn.execute('''
+            INSERT OR REPLACE INTO qr_thumbnails (qr_filename, mtime_ns, size, thumbnail)
+            VALUES (?, ?, ?, ?)
+        ''', (qr_filename, *stamp, thumbnail)))
@@ -0,0 +1,365 @@
+"""
+Streaming XLSX writer
+Writes a one-sheet workbook with an image per row straight into the .xlsx
+zip. Rows and drawing anchors are spooled to temporary files and every PNG
+goes into the archive as soon as its row is written. Even the zip's central
+directory is kept on disk, so memory does not grow with the number of
+records the way an openpyxl Workbook (or zipfile.ZipFile) does.
+"""
+
+import hashlib
+import os
+import struct
+import tempfile
+import time
+import zlib
+from xml.sax.saxutils import escape, quoteattr
+
+from openpyxl.utils import get_column_letter
+
+# EMUs per pixel at 96 dpi
+EMU_PER_PIXEL = 9525
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+NS_DRAWING = "http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing"
+NS_A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+CONTENT_TYPES = XML_DECLARATION + (
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Default Extension="png" ContentType="image/png"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{drawing}'
+    '</Types>'
+)
+DRAWING_CONTENT_TYPE = ('<Override PartName="/xl/drawings/drawing1.xml" '
+                        'ContentType="application/vnd.openxmlformats-officedocument.drawing+xml"/>')
+
+ROOT_RELS = XML_DECLARATION + (
+    f'<Relationships xmlns="{NS_PKG_REL}">'
+    f'<Relationship Id="rId1" Type="{REL_TYPE}officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+WORKBOOK = XML_DECLARATION + (
+    f'<workbook xmlns="{NS_MAIN}" xmlns:r="{NS_REL}">'
+    '<sheets><sheet name={title} sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+WORKBOOK_RELS = XML_DECLARATION + (
+    f'<Relationships xmlns="{NS_PKG_REL}">'
+    f'<Relationship Id="rId1" Type="{REL_TYPE}worksheet" Target="worksheets/sheet1.xml"/>'
+    f'<Relationship Id="rId2" Type="{REL_TYPE}styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+SHEET_RELS = XML_DECLARATION + (
+    f'<Relationships xmlns="{NS_PKG_REL}">'
+    f'<Relationship Id="rId1" Type="{REL_TYPE}drawing" Target="../drawings/drawing1.xml"/>'
+    '</Relationships>'
+)
+
+
+class ZipWriter:
+    """Minimal ZIP writer whose central directory is spooled to disk
+
+    zipfile.ZipFile keeps a ZipInfo per entry until it is closed, which
+    adds up with one image per record. Here each entry's directory record
+    is written to a temporary file as soon as the entry is complete.
+    ZIP64 records are added when the archive needs them.
+    """
+
+    STORED, DEFLATED = 0, 8
+    UTF8_FLAG = 0x800
+    ZIP64_LIMIT = 0xFFFFFFFF
+    ENTRY_LIMIT = 0xFFFF
+
+    def __init__(self, path):
+        self._file = open(path, 'wb')
+        self._central = tempfile.TemporaryFile()
+        self._central_size = 0
+        self.entries = 0
+        t = time.localtime()
+        self._dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+        self._dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+    def _local_header(self, name, method, crc, compressed, size):
+        return struct.pack('<IHHHHHIIIHH', 0x04034b50, 20, self.UTF8_FLAG, method, self._dos_time,
+                           self._dos_date, crc, compressed, size, len(name), 0) + name
+
+    def _add_central(self, name, method, crc, compressed, size, offset):
+        extra = b''
+        if offset > self.ZIP64_LIMIT:
+            extra = struct.pack('<HHQ', 0x0001, 8, offset)
+            offset = self.ZIP64_LIMIT
+        version = 45 if extra else 20
+        record = struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, version, version, self.UTF8_FLAG, method,
+                             self._dos_time, self._dos_date, crc, compressed, size, len(name), len(extra),
+                             0, 0, 0, 0o644 << 16, offset) + name + extra
+        self._central.write(record)
+        self._central_size += len(record)
+        self.entries += 1
+
+    def write(self, name, data, compress=True):
+        """Add an entry from bytes or text"""
+        name = name.encode('utf-8')
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        crc = zlib.crc32(data)
+        if compress:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            payload = compressor.compress(data) + compressor.flush()
+        else:
+            payload = data
+        if len(data) > self.ZIP64_LIMIT or len(payload) > self.ZIP64_LIMIT:
+            raise ValueError(f"Entry {name.decode()} is too large")
+        method = self.DEFLATED if compress else self.STORED
+        offset = self._file.tell()
+        self._file.write(self._local_header(name, method, crc, len(payload), len(data)))
+        self._file.write(payload)
+        self._add_central(name, method, crc, len(payload), len(data), offset)
+
+    def write_chunks(self, name, chunks):
+        """Add a deflated entry from an iterable of bytes, patching its header afterwards"""
+        name = name.encode('utf-8')
+        offset = self._file.tell()
+        self._file.write(self._local_header(name, self.DEFLATED, 0, 0, 0))
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        crc = size = compressed = 0
+        for chunk in chunks:
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            data = compressor.compress(chunk)
+            compressed += len(data)
+            self._file.write(data)
+        data = compressor.flush()
+        compressed += len(data)
+        self._file.write(data)
+        if size > self.ZIP64_LIMIT or compressed > self.ZIP64_LIMIT:
+            raise ValueError(f"Entry {name.decode()} is too large")
+        end = self._file.tell()
+        self._file.seek(offset + 14)
+        self._file.write(struct.pack('<III', crc, compressed, size))
+        self._file.seek(end)
+        self._add_central(name, self.DEFLATED, crc, compressed, size, offset)
+
+    def close(self):
+        """Append the central directory and the end records"""
+        start = self._file.tell()
+        self._central.seek(0)
+        while chunk := self._central.read(1 << 20):
+            self._file.write(chunk)
+        self._central.close()
+        size = self._central_size
+        if self.entries > self.ENTRY_LIMIT or start > self.ZIP64_LIMIT or size > self.ZIP64_LIMIT:
+            zip64_end = self._file.tell()
+            self._file.write(struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0,
+                                         self.entries, self.entries, size, start))
+            self._file.write(struct.pack('<IIQI', 0x07064b50, 0, zip64_end, 1))
+        self._file.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, min(self.entries, self.ENTRY_LIMIT),
+                                     min(self.entries, self.ENTRY_LIMIT), min(size, self.ZIP64_LIMIT),
+                                     min(start, self.ZIP64_LIMIT), 0))
+        self._file.close()
+
+    def abort(self):
+        self._central.close()
+        self._file.close()
+
+
+def _color_rgb(color):
+    rgb = getattr(color, 'rgb', None)
+    return rgb if isinstance(rgb, str) else None
+
+
+def styles_xml(font, fill, alignment):
+    """styles.xml with the default cell style and the header style (index 1)"""
+    header_font = ''
+    if font is not None:
+        header_font += '<b/>' if font.b else ''
+        header_font += '<i/>' if font.i else ''
+        if _color_rgb(font.color):
+            header_font += f'<color rgb="{_color_rgb(font.color)}"/>'
+    fill_rgb = _color_rgb(fill.start_color) if fill is not None and fill.fill_type == 'solid' else None
+    header_fill = (f'<patternFill patternType="solid"><fgColor rgb="{fill_rgb}"/><bgColor rgb="{fill_rgb}"/>'
+                   '</patternFill>' if fill_rgb else '<patternFill patternType="none"/>')
+    align = ''
+    if alignment is not None:
+        align = ''.join(f' {name}="{getattr(alignment, name)}"' for name in ('horizontal', 'vertical')
+                        if getattr(alignment, name))
+    return XML_DECLARATION + (
+        f'<styleSheet xmlns="{NS_MAIN}">'
+        '<fonts count="2">'
+        '<font><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+        f'<font>{header_font}<sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+        '</fonts>'
+        '<fills count="3">'
+        '<fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill>'
+        f'<fill>{header_fill}</fill>'
+        '</fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2">'
+        '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="0" fontId="1" fillId="2" borderId="0" xfId="0" applyFont="1" applyFill="1" '
+        f'applyAlignment="1"><alignment{align}/></xf>'
+        '</cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    )
+
+
+def _cell(ref, value, style=0):
+    style_attr = f' s="{style}"' if style else ''
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"{style_attr}><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"{style_attr}><v>{value}</v></c>'
+    return f'<c r="{ref}" t="inlineStr"{style_attr}><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+
+class StreamingXlsxWriter:
+    """Writes one worksheet, row by row, for an ExcelLayout
+
+    Use as a context manager; the file only replaces filename once the
+    archive is complete. Identical PNGs are stored as one media part that
+    every anchor showing them refers to; only a digest per distinct image
+    is kept in memory.
+    """
+
+    def __init__(self, filename, layout):
+        self.filename = filename
+        self.layout = layout
+        self.rows = 0
+        self.images = 0
+        self.media = 0
+        self._media_ids = {}
+        self.columns = [get_column_letter(col) for col in range(1, len(layout.headers) + 1)]
+        self._image_extent = tuple(size * EMU_PER_PIXEL for size in layout.image_size)
+
+        self._partial = f"{filename}.partial"
+        self._zip = ZipWriter(self._partial)
+        self._sheet = tempfile.TemporaryFile('w+', encoding='utf-8')
+        self._drawing = tempfile.TemporaryFile('w+', encoding='utf-8')
+        self._drawing_rels = tempfile.TemporaryFile('w+', encoding='utf-8')
+        self._write_header()
+
+    def _write_header(self):
+        layout = self.layout
+        cols = ''.join(f'<col min="{col}" max="{col}" width="{width}" customWidth="1"/>'
+                       for col, width in enumerate(layout.column_widths, 1))
+        self._sheet.write(
+            f'<worksheet xmlns="{NS_MAIN}" xmlns:r="{NS_REL}">'
+            f'<sheetFormatPr defaultRowHeight="15"/><cols>{cols}</cols><sheetData>'
+            '<row r="1">'
+            + ''.join(_cell(f'{letter}1', header, 1) for letter, header in zip(self.columns, layout.headers))
+            + '</row>'
+        )
+
+    def append(self, values, png=None, text=None):
+        """Add a row: values maps column numbers to values, png goes in the image column
+
+        text is shown in the image column instead when there is no image.
+        """
+        self.rows += 1
+        row_idx = self.rows + 1
+        if text is not None:
+            values = {**values, self.layout.image_column: text}
+        height = f' ht="{self.layout.row_height}" customHeight="1"' if png is not None else ''
+        cells = ''.join(_cell(f'{self.columns[col - 1]}{row_idx}', value)
+                        for col, value in sorted(values.items()) if value is not None and value != '')
+        self._sheet.write(f'<row r="{row_idx}"{height}>{cells}</row>')
+        if png is not None:
+            self._add_image(png, row_idx)
+
+    def _add_image(self, png, row_idx):
+        self.images += 1
+        number = self.images
+        digest = hashlib.sha1(png).digest()
+        media_id = self._media_ids.get(digest)
+        if media_id is None:
+            self.media += 1
+            media_id = self._media_ids[digest] = self.media
+            # PNGs are already compressed
+            self._zip.write(f'xl/media/image{media_id}.png', png, compress=False)
+        cx, cy = self._image_extent
+        self._drawing.write(
+            '<xdr:oneCellAnchor>'
+            f'<xdr:from><xdr:col>{self.layout.image_column - 1}</xdr:col><xdr:colOff>0</xdr:colOff>'
+            f'<xdr:row>{row_idx - 1}</xdr:row><xdr:rowOff>0</xdr:rowOff></xdr:from>'
+            f'<xdr:ext cx="{cx}" cy="{cy}"/>'
+            f'<xdr:pic><xdr:nvPicPr><xdr:cNvPr id="{number + 1}" name="Image {number}"/>'
+            '<xdr:cNvPicPr><a:picLocks noChangeAspect="1"/></xdr:cNvPicPr></xdr:nvPicPr>'
+            f'<xdr:blipFill><a:blip r:embed="rId{number}"/><a:stretch><a:fillRect/></a:stretch></xdr:blipFill>'
+            f'<xdr:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+            '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></xdr:spPr></xdr:pic>'
+            '<xdr:clientData/></xdr:oneCellAnchor>'
+        )
+        self._drawing_rels.write(
+            f'<Relationship Id="rId{number}" Type="{REL_TYPE}image" Target="../media/image{media_id}.png"/>')
+
+    def _copy_part(self, name, head, spool, tail):
+        def chunks():
+            yield head.encode('utf-8')
+            spool.seek(0)
+            while chunk := spool.read(1 << 16):
+                yield chunk.encode('utf-8')
+            yield tail.encode('utf-8')
+
+        self._zip.write_chunks(name, chunks())
+
+    def close(self):
+        """Finish the archive and move it into place"""
+        layout = self.layout
+        drawing = self.images > 0
+        self._copy_part('xl/worksheets/sheet1.xml', XML_DECLARATION, self._sheet,
+                        '</sheetData>' + ('<drawing r:id="rId1"/>' if drawing else '') + '</worksheet>')
+        if drawing:
+            self._copy_part('xl/drawings/drawing1.xml',
+                            XML_DECLARATION + f'<xdr:wsDr xmlns:xdr="{NS_DRAWING}" xmlns:a="{NS_A}" '
+                                              f'xmlns:r="{NS_REL}">',
+                            self._drawing, '</xdr:wsDr>')
+            self._copy_part('xl/drawings/_rels/drawing1.xml.rels',
+                            XML_DECLARATION + f'<Relationships xmlns="{NS_PKG_REL}">',
+                            self._drawing_rels, '</Relationships>')
+            self._zip.write('xl/worksheets/_rels/sheet1.xml.rels', SHEET_RELS)
+        self._zip.write('[Content_Types].xml', CONTENT_TYPES.format(drawing=DRAWING_CONTENT_TYPE if drawing else ''))
+        self._zip.write('_rels/.rels', ROOT_RELS)
+        self._zip.write('xl/workbook.xml', WORKBOOK.format(title=quoteattr(layout.title)))
+        self._zip.write('xl/_rels/workbook.xml.rels', WORKBOOK_RELS)
+        self._zip.write('xl/styles.xml', styles_xml(layout.header_font, layout.header_fill,
+                                                       layout.header_alignment))
+        self._zip.close()
+        self._close_spools()
+        os.replace(self._partial, self.filename)
+
+    def abort(self):
+        """Drop the partial archive, leaving any existing file untouched"""
+        self._zip.abort()
+        self._close_spools()
+        if os.path.exists(self._partial):
+            os.remove(self._partial)
+
+    def _close_spools(self):
+        for spool in (self._sheet, self._drawing, self._drawing_rels):
+            spool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
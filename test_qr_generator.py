@@ -10,7 +10,14 @@ import os
 import tempfile
 import shutil
 import sys
+import subprocess
 import json
+import base64
+import threading
+import http.client
+import socket
+import csv
+import time
 from datetime import datetime
 from unittest.mock import patch, MagicMock
 import qrcode
@@ -28,6 +35,31 @@ except ImportError:
     FLET_AVAILABLE = False
     print("⚠️  Warning: Flet not available. Testing core functionality only.")
 
+try:
+    import pyarrow
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+from excel_export import IncrementalExcelExporter, ExportWorker, ShardedExcelExporter, CLI_LAYOUT, GUI_LAYOUT, PNG_CACHE_SIZE
+from qr_database import IdAllocator, RecordPager
+import qr_database
+import qr_migrations
+from qr_generator_cli import QRGeneratorCLI, format_menu, iter_batch_rows
+from qr_render import RenderJob, RenderPool, RenderResult, matrix_png, render_qr_png, qr_matrix
+import qr_formats
+from qr_layout import QRLayout, layout_for_format
+from thumbnail_cache import ThumbnailCache
+from xlsx_stream import ZipWriter
+from openpyxl.utils import get_column_letter
+from qr_service import QRService, BackgroundServer
+from qr_store import QRImageStore
+from devuid_reader import (DEVUID_ADDRESS, DevUIDCancelled, DevUIDError, MultiProbeReader, OpenOcdSession, Probe,
+                           list_probes, parse_devuid, read_devuid_once, select_probe_command)
+from scan_pipeline import ScanPipeline
+from tabular_export import TABULAR_COLUMNS, export_records, record_chunks
+import mock_openocd
+
 class TestQRGeneratorCore(unittest.TestCase):
     """Test core QR generator functionality without GUI"""
     
@@ -493,6 +525,2528 @@ class TestQRGeneratorIntegration(unittest.TestCase):
         conn.close()
 
 
+class ExcelExportTestCase(unittest.TestCase):
+    """Shared fixture for Excel export tests"""
+    
+    def setUp(self):
+        """Set up a database with a few records and QR images"""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        
+        self.conn = sqlite3.connect('qr_codes.db')
+        self.conn.execute('''
+            CREATE TABLE qr_records (
+                id INTEGER PRIMARY KEY,
+                serial_number TEXT NOT NULL,
+                verification_code TEXT NOT NULL,
+                dev_uid TEXT NOT NULL,
+                device_name TEXT,
+                qr_filename TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        for i in range(1, 4):
+            self.add_record(i)
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        os.chdir(self.original_cwd)
+        self.conn.close()
+        shutil.rmtree(self.test_dir)
+    
+    def add_record(self, record_id, created_at=None):
+        """Insert a record and write its QR image"""
+        filename = f"qr_{record_id}.png"
+        qrcode.make(f"SERIAL{record_id}").save(filename)
+        self.conn.execute('''
+            INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, device_name, qr_filename, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (record_id, f"SERIAL{record_id}", "123456", "E5DDA7D74D91EC53", None, filename,
+              created_at or f"2025-01-01 10:00:{record_id:02d}"))
+        self.conn.commit()
+    
+    def read_ids(self, column=1, filename='qr_records.xlsx'):
+        """Read the ID column and image rows back from the saved workbook"""
+        from openpyxl import load_workbook
+        ws = load_workbook(filename).active
+        ids = [row[column - 1] for row in ws.iter_rows(min_row=2, values_only=True)]
+        image_rows = sorted(img.anchor._from.row + 1 for img in ws._images)
+        return ids, image_rows
+
+
+class TestIncrementalExcelExport(ExcelExportTestCase):
+    """Test incremental Excel export"""
+    
+    def test_append_only_new_records(self):
+        """Test that new records are appended without a rebuild"""
+        exporter = IncrementalExcelExporter(self.conn, GUI_LAYOUT)
+        result = exporter.export()
+        self.assertTrue(result.rebuilt)
+        self.assertEqual(result.total, 3)
+        
+        self.add_record(4)
+        result = exporter.export()
+        self.assertFalse(result.rebuilt)
+        self.assertEqual((result.added, result.removed), (1, 0))
+        
+        ids, image_rows = self.read_ids()
+        self.assertEqual(ids, [1, 2, 3, 4])
+        self.assertEqual(image_rows, [2, 3, 4, 5])
+    
+    def test_remove_deleted_records(self):
+        """Test that deleted records are dropped and images shift up"""
+        exporter = IncrementalExcelExporter(self.conn, CLI_LAYOUT)
+        exporter.export()
+        
+        self.conn.execute('DELETE FROM qr_records WHERE id = 2')
+        self.conn.commit()
+        result = exporter.export()
+        self.assertEqual((result.added, result.removed), (0, 1))
+        
+        ids, image_rows = self.read_ids(column=2)
+        self.assertEqual(ids, [1, 3])
+        self.assertEqual(image_rows, [2, 3])
+        
+        # Sequence column is renumbered after removal
+        from openpyxl import load_workbook
+        ws = load_workbook('qr_records.xlsx').active
+        self.assertEqual([ws.cell(row=r, column=1).value for r in (2, 3)], [1, 2])
+    
+    def test_unchanged_workbook_not_rewritten(self):
+        """Test that an export with no changes leaves the file alone"""
+        exporter = IncrementalExcelExporter(self.conn, GUI_LAYOUT)
+        exporter.export()
+        mtime = os.stat('qr_records.xlsx').st_mtime_ns
+        
+        result = exporter.export()
+        self.assertEqual((result.added, result.removed), (0, 0))
+        self.assertEqual(os.stat('qr_records.xlsx').st_mtime_ns, mtime)
+    
+    def test_resume_from_existing_workbook(self):
+        """Test that a new exporter picks up a workbook written earlier"""
+        IncrementalExcelExporter(self.conn, GUI_LAYOUT).export()
+        
+        self.conn.execute('DELETE FROM qr_records WHERE id = 1')
+        self.conn.commit()
+        self.add_record(5)
+        
+        result = IncrementalExcelExporter(self.conn, GUI_LAYOUT).export()
+        self.assertFalse(result.rebuilt)
+        self.assertEqual((result.added, result.removed), (1, 1))
+        
+        ids, image_rows = self.read_ids()
+        self.assertEqual(ids, [2, 3, 5])
+        self.assertEqual(image_rows, [2, 3, 4])
+    
+    def test_shared_png_is_embedded_from_memory(self):
+        """Test that a PNG handed over with share_png is used instead of the file"""
+        exporter = IncrementalExcelExporter(self.conn, GUI_LAYOUT)
+        exporter.export()
+        
+        self.add_record(4)
+        png = render_qr_png("SERIAL4")
+        exporter.share_png("qr_4.png", png)
+        os.remove("qr_4.png")
+        exporter.export()
+        
+        self.assertEqual(exporter.images[5]._data(), png)
+        self.assertEqual(exporter.png_cache, {})
+        self.assertEqual(self.read_ids()[1], [2, 3, 4, 5])
+
+
+class TestStreamingExcelExport(ExcelExportTestCase):
+    """Test rebuilding the workbook with the streaming XLSX writer"""
+    
+    def export(self, layout, stream, filename='qr_records.xlsx'):
+        exporter = IncrementalExcelExporter(self.conn, layout, filename,
+                                            stream_threshold=0 if stream else float('inf'))
+        return exporter, exporter.export(full=True)
+    
+    @staticmethod
+    def contents(filename):
+        from openpyxl import load_workbook
+        ws = load_workbook(filename).active
+        images = sorted((img.anchor._from.row + 1, img.anchor._from.col + 1, img.width, img.height, img._data())
+                        for img in ws._images)
+        heights = {row: ws.row_dimensions[row].height for row in range(1, ws.max_row + 1)}
+        widths = [ws.column_dimensions[get_column_letter(col)].width for col in range(1, ws.max_column + 1)]
+        header = [(cell.font.b, cell.fill.start_color.rgb, cell.alignment.horizontal) for cell in ws[1]]
+        return ws.title, list(ws.iter_rows(values_only=True)), images, heights, widths, header
+    
+    def test_matches_in_memory_workbook(self):
+        """Test that both engines write the same sheet for either layout"""
+        os.remove("qr_2.png")
+        self.conn.execute("UPDATE qr_records SET serial_number = 'SN<&\"1\">' WHERE id = 1")
+        self.conn.commit()
+        for layout in (CLI_LAYOUT, GUI_LAYOUT):
+            with self.subTest(layout=layout.title):
+                _, expected = self.export(layout, False, 'memory.xlsx')
+                _, result = self.export(layout, True, 'streamed.xlsx')
+                self.assertEqual(result, expected)
+                self.assertEqual(self.contents('streamed.xlsx'), self.contents('memory.xlsx'))
+    
+    def test_exports_above_threshold_never_load_workbook(self):
+        """Test that automatic exports above the threshold stream instead of loading and saving"""
+        exporter, result = self.export(GUI_LAYOUT, True)
+        self.assertTrue(result.rebuilt)
+        self.assertIsNone(exporter.wb)
+        
+        self.conn.execute('DELETE FROM qr_records WHERE id = 2')
+        self.conn.commit()
+        self.add_record(4)
+        no_openpyxl = AssertionError("workbook loaded or saved with openpyxl")
+        with patch.object(IncrementalExcelExporter, '_load', side_effect=no_openpyxl), \
+                patch.object(IncrementalExcelExporter, '_save', side_effect=no_openpyxl):
+            result = exporter.export()
+            self.assertTrue(result.rebuilt)
+            self.assertEqual((result.added, result.removed, result.total), (1, 1, 3))
+            self.assertIsNone(exporter.wb)
+            
+            # An unchanged workbook is left alone
+            stamp = os.stat('qr_records.xlsx').st_mtime_ns
+            self.assertEqual(exporter.export(), (0, 0, 3, False))
+            self.assertEqual(os.stat('qr_records.xlsx').st_mtime_ns, stamp)
+            
+            # A new exporter streams the file it finds again
+            fresh = IncrementalExcelExporter(self.conn, GUI_LAYOUT, stream_threshold=0)
+            self.add_record(5)
+            self.assertEqual(fresh.export(), (4, 0, 4, True))
+            self.assertEqual(fresh.export(), (0, 0, 4, False))
+        self.assertEqual(self.read_ids(), ([1, 3, 4, 5], [2, 3, 4, 5]))
+    
+    def test_incremental_export_after_stream(self):
+        """Test that a streamed workbook is picked up by incremental exports below the threshold"""
+        exporter, _ = self.export(GUI_LAYOUT, True)
+        exporter.stream_threshold = float('inf')
+        
+        self.conn.execute('DELETE FROM qr_records WHERE id = 2')
+        self.conn.commit()
+        self.add_record(4)
+        result = exporter.export()
+        self.assertFalse(result.rebuilt)
+        self.assertEqual((result.added, result.removed), (1, 1))
+        self.assertEqual(self.read_ids(), ([1, 3, 4], [2, 3, 4]))
+    
+    def test_failed_stream_keeps_previous_file(self):
+        """Test that an export failing halfway leaves the last good workbook"""
+        self.export(CLI_LAYOUT, True)
+        before = self.contents('qr_records.xlsx')
+        self.add_record(4)
+        with patch('xlsx_stream.StreamingXlsxWriter.append', side_effect=[None, OSError("disk full")]):
+            with self.assertRaises(OSError):
+                self.export(CLI_LAYOUT, True)
+        self.assertEqual(self.contents('qr_records.xlsx'), before)
+        self.assertFalse(os.path.exists('qr_records.xlsx.partial'))
+    
+    def test_zip64_archive(self):
+        """Test that archives with more entries than plain ZIP allows read back"""
+        import zipfile
+        writer = ZipWriter('many.zip')
+        for i in range(70000):
+            writer.write(f'media/{i}.bin', i.to_bytes(4, 'little'), compress=False)
+        writer.write_chunks('sheet.xml', (f'<row r="{i}"/>'.encode() for i in range(1000)))
+        writer.close()
+        
+        with zipfile.ZipFile('many.zip') as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(len(archive.namelist()), 70001)
+            self.assertEqual(archive.read('media/69999.bin'), (69999).to_bytes(4, 'little'))
+            self.assertTrue(archive.read('sheet.xml').endswith(b'<row r="999"/>'))
+
+
+class TestSharedImageParts(ExcelExportTestCase):
+    """Test that identical images are stored once and optional thumbnails"""
+
+    @staticmethod
+    def media(filename):
+        import zipfile
+        with zipfile.ZipFile(filename) as archive:
+            return sorted(name for name in archive.namelist() if name.startswith('xl/media/'))
+
+    def test_identical_images_share_media(self):
+        """Test that regenerated serials reference one media part in either engine"""
+        for record_id in (4, 5):
+            self.add_record(record_id)
+            shutil.copy("qr_1.png", f"qr_{record_id}.png")
+        with open("qr_1.png", 'rb') as f:
+            png = f.read()
+
+        for stream in (False, True):
+            with self.subTest(stream=stream):
+                exporter = IncrementalExcelExporter(self.conn, GUI_LAYOUT,
+                                                    stream_threshold=0 if stream else float('inf'))
+                exporter.export(full=True)
+                self.assertEqual(len(self.media('qr_records.xlsx')), 3)
+                contents = TestStreamingExcelExport.contents('qr_records.xlsx')
+                self.assertEqual([image[0] for image in contents[2]], [2, 3, 4, 5, 6])
+                self.assertEqual([image[0] for image in contents[2] if image[4] == png], [2, 5, 6])
+
+                # Incremental saves keep sharing the part
+                self.conn.execute('DELETE FROM qr_records WHERE id = 2')
+                self.conn.commit()
+                exporter.export()
+                self.assertEqual(len(self.media('qr_records.xlsx')), 2)
+                self.assertEqual(self.read_ids(), ([1, 3, 4, 5], [2, 3, 4, 5]))
+                self.add_record(2)
+
+    def test_thumbnails(self):
+        """Test that thumbnails are embedded at the layout size only when smaller"""
+        with open("qr_2.png", 'rb') as f:
+            small_png = f.read()
+        Image.frombytes('RGB', (370, 370), os.urandom(370 * 370 * 3)).save("qr_1.png")
+
+        for stream in (False, True):
+            with self.subTest(stream=stream):
+                exporter = IncrementalExcelExporter(self.conn, CLI_LAYOUT, thumbnails=True,
+                                                    stream_threshold=0 if stream else float('inf'))
+                exporter.export(full=True)
+                images = TestStreamingExcelExport.contents('qr_records.xlsx')[2]
+                with Image.open(io.BytesIO(images[0][4])) as thumbnail:
+                    self.assertEqual(thumbnail.size, CLI_LAYOUT.image_size)
+                self.assertEqual(images[1][4], small_png)
+
+
+class TestShardedExcelExport(ExcelExportTestCase):
+    """Test exporting one workbook per production day or ID range"""
+    
+    DAY_ONE, DAY_TWO = 'qr_records_2025-01-01.xlsx', 'qr_records_2025-01-02.xlsx'
+    
+    def stamp(self, filename):
+        stat = os.stat(filename)
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def test_day_shards(self):
+        """Test that records split by SAST day and a closed day is frozen"""
+        # 22:30 UTC is already the next day in SAST; GUI rows carry their offset
+        self.add_record(4, "2025-01-01 22:30:00")
+        self.add_record(5, "2025-01-02T09:00:00.123456+02:00")
+        exporter = ShardedExcelExporter(self.conn, GUI_LAYOUT)
+        result = exporter.export()
+        self.assertEqual((result.added, result.total), (5, 5))
+        self.assertEqual(exporter.filename, self.DAY_TWO)
+        self.assertEqual(self.read_ids(filename=self.DAY_ONE), ([1, 2, 3], [2, 3, 4]))
+        self.assertEqual(self.read_ids(filename=self.DAY_TWO), ([4, 5], [2, 3]))
+        with open('qr_records_shards.json') as f:
+            manifest = json.load(f)
+        self.assertEqual(manifest['frozen'], [{'key': '2025-01-01', 'filename': self.DAY_ONE, 'records': 3}])
+        
+        # Only the current day is touched, even by a full export
+        frozen = self.stamp(self.DAY_ONE)
+        self.conn.execute('DELETE FROM qr_records WHERE id = 1')
+        self.conn.commit()
+        self.add_record(6, "2025-01-02 08:00:00")
+        result = exporter.export()
+        self.assertEqual((result.added, result.removed, result.rebuilt), (1, 0, False))
+        ShardedExcelExporter(self.conn, GUI_LAYOUT).export(full=True)
+        self.assertEqual(self.stamp(self.DAY_ONE), frozen)
+        self.assertEqual(self.read_ids(filename=self.DAY_TWO)[0], [4, 6, 5])
+    
+    def test_rollover_and_missing_shard(self):
+        """Test that a day gets its last records when it closes and a lost shard is rewritten"""
+        exporter = ShardedExcelExporter(self.conn, CLI_LAYOUT)
+        exporter.export()
+        self.assertEqual(exporter.filename, self.DAY_ONE)
+        self.assertFalse(os.path.exists('qr_records_shards.json'))
+        
+        self.add_record(4, "2025-01-01 20:00:00")
+        self.add_record(5, "2025-01-02 10:00:00")
+        result = exporter.export()
+        self.assertEqual((result.added, result.total), (2, 5))
+        self.assertEqual(self.read_ids(column=2, filename=self.DAY_ONE)[0], [1, 2, 3, 4])
+        
+        os.remove(self.DAY_ONE)
+        with patch('builtins.print'):
+            exporter.export()
+        self.assertEqual(self.read_ids(column=2, filename=self.DAY_ONE)[0], [1, 2, 3, 4])
+    
+    def test_range_shards(self):
+        """Test that records split into blocks of IDs"""
+        self.add_record(4)
+        self.add_record(5)
+        result = ShardedExcelExporter(self.conn, GUI_LAYOUT, 'range', shard_size=2).export()
+        self.assertEqual(result.total, 5)
+        shards = ['qr_records_000001-000002.xlsx', 'qr_records_000003-000004.xlsx', 'qr_records_000005-000006.xlsx']
+        self.assertEqual([self.read_ids(filename=shard)[0] for shard in shards], [[1, 2], [3, 4], [5]])
+        
+        # A manifest written for another shard size is not trusted
+        with patch('builtins.print'):
+            exporter = ShardedExcelExporter(self.conn, GUI_LAYOUT, 'range', shard_size=3)
+        self.assertEqual(exporter.frozen, {})
+    
+    def test_range_shard_id_reuse(self):
+        """Test that a frozen range shard is exported again when an ID in it is reused"""
+        from openpyxl import load_workbook
+        shard = 'qr_records_000001-000003.xlsx'
+        self.add_record(4)
+        exporter = ShardedExcelExporter(self.conn, GUI_LAYOUT, 'range', shard_size=3)
+        exporter.export()
+        frozen = self.stamp(shard)
+        self.assertEqual(exporter.export(), (0, 0, 4, False))
+        self.assertEqual(self.stamp(shard), frozen)
+        
+        # ID 2 is freed and handed to a new record
+        self.conn.execute('DELETE FROM qr_records WHERE id = 2')
+        self.conn.commit()
+        self.add_record(2, "2025-01-02 09:00:00")
+        result = ShardedExcelExporter(self.conn, GUI_LAYOUT, 'range', shard_size=3).export()
+        self.assertEqual((result.added, result.removed, result.total), (1, 1, 4))
+        ws = load_workbook(shard).active
+        self.assertEqual([(row[0], row[6]) for row in ws.iter_rows(min_row=2, values_only=True)],
+                         [(1, "2025-01-01 10:00:01"), (3, "2025-01-01 10:00:03"), (2, "2025-01-02 09:00:00")])
+        
+        # A deletion alone is picked up too
+        self.conn.execute('DELETE FROM qr_records WHERE id = 1')
+        self.conn.commit()
+        self.assertEqual(exporter.export(), (0, 1, 3, False))
+        self.assertEqual(self.read_ids(filename=shard)[0], [3, 2])
+
+
+class TestTabularExport(ExcelExportTestCase):
+    """Test the image-free CSV/Parquet/Arrow export"""
+    
+    @staticmethod
+    def read_csv(filename):
+        with open(filename, newline='') as f:
+            return list(csv.reader(f))
+    
+    def setUp(self):
+        """Bring the fixture table up to the current schema"""
+        super().setUp()
+        with patch('builtins.print'):
+            qr_migrations.migrate(self.conn)
+    
+    def test_csv_export_and_sync(self):
+        """Test a full CSV export followed by incremental syncs"""
+        result = export_records(self.conn, 'records.csv')
+        self.assertEqual(result, (3, 3))
+        rows = self.read_csv('records.csv')
+        self.assertEqual(rows[0], list(TABULAR_COLUMNS))
+        self.assertEqual(rows[1], ['1', 'SERIAL1', '123456', 'E5DDA7D74D91EC53', '', 'qr_1.png', '2025-01-01 10:00:01'])
+        
+        self.add_record(4)
+        self.add_record(5)
+        result = export_records(self.conn, 'delta.csv', since_seq=result.last_seq)
+        self.assertEqual(result, (2, 5))
+        self.assertEqual([row[0] for row in self.read_csv('delta.csv')[1:]], ['4', '5'])
+        
+        export_records(self.conn, 'records.csv', since_seq=3, append=True)
+        self.assertEqual([row[0] for row in self.read_csv('records.csv')], ['id', '1', '2', '3', '4', '5'])
+        
+        # Nothing new: an empty delta and the same sync position
+        result = export_records(self.conn, 'delta.csv', since_seq=5)
+        self.assertEqual(result, (0, 5))
+        self.assertEqual(self.read_csv('delta.csv'), [list(TABULAR_COLUMNS)])
+    
+    def test_sync_after_id_reuse(self):
+        """Test that a record reusing a deleted ID, even the newest, is picked up by the next sync"""
+        last_seq = export_records(self.conn, 'records.csv').last_seq
+        self.conn.execute('DELETE FROM qr_records WHERE id IN (2, 3)')
+        self.conn.commit()
+        self.add_record(2, "2025-01-01 10:00:05")
+        result = export_records(self.conn, 'delta.csv', since_seq=last_seq)
+        self.assertEqual(result, (1, 4))
+        self.assertEqual([row[0] for row in self.read_csv('delta.csv')[1:]], ['2'])
+        
+        # The newest record going away does not move the sync position back
+        self.conn.execute('DELETE FROM qr_records WHERE id = 2')
+        self.conn.commit()
+        self.add_record(3, "2025-01-01 10:00:06")
+        self.assertEqual(export_records(self.conn, 'delta.csv', since_seq=4), (1, 5))
+    
+    def test_rows_in_the_same_second_and_formats(self):
+        """Test syncs between records sharing a second, with a lower reused ID, in CLI and GUI formats"""
+        self.add_record(4, "2025-01-01 10:00:10")
+        last_seq = export_records(self.conn, 'records.csv').last_seq
+        self.conn.execute('DELETE FROM qr_records WHERE id = 1')
+        self.conn.commit()
+        # Same second as the last record synced, with a lower ID
+        self.add_record(1, "2025-01-01 10:00:10")
+        # Written by the GUI in SAST: earlier as text, later as a time
+        self.add_record(5, "2025-01-01T12:00:11+02:00")
+        result = export_records(self.conn, 'delta.csv', since_seq=last_seq)
+        self.assertEqual(result, (2, 6))
+        self.assertEqual([row[0] for row in self.read_csv('delta.csv')[1:]], ['1', '5'])
+    
+    def test_chunks(self):
+        """Test reading in chunks"""
+        self.assertEqual([len(rows) for rows in record_chunks(self.conn, chunk_size=2)], [2, 1])
+        self.assertEqual([[row[0] for row in rows] for rows in record_chunks(self.conn, 1, 2)], [[2]])
+    
+    def test_invalid_requests(self):
+        """Test unknown file types and appending to a non-CSV file"""
+        with self.assertRaises(ValueError):
+            export_records(self.conn, 'records.txt')
+        with self.assertRaises(ValueError):
+            export_records(self.conn, 'records.parquet', append=True)
+        with patch('builtins.print'):
+            cli = QRGeneratorCLI()
+            self.assertFalse(cli.export_table('records.xlsx'))
+            self.assertTrue(cli.export_table('records.csv'))
+            cli.conn.close()
+    
+    @unittest.skipUnless(PYARROW_AVAILABLE, "pyarrow not available")
+    def test_parquet_and_arrow(self):
+        """Test that Parquet and Arrow files hold the same rows as the CSV"""
+        import pyarrow.ipc
+        import pyarrow.parquet
+        export_records(self.conn, 'records.parquet', chunk_size=2)
+        export_records(self.conn, 'records.arrow', since_seq=1)
+        table = pyarrow.parquet.read_table('records.parquet')
+        self.assertEqual(table.column_names, list(TABULAR_COLUMNS))
+        self.assertEqual(table.column('id').to_pylist(), [1, 2, 3])
+        with pyarrow.ipc.open_file('records.arrow') as reader:
+            self.assertEqual(reader.read_all().column('serial_number').to_pylist(), ['SERIAL2', 'SERIAL3'])
+    
+    @unittest.skipIf(PYARROW_AVAILABLE, "pyarrow is installed")
+    def test_parquet_without_pyarrow(self):
+        """Test that Parquet and Arrow exports explain the missing dependency"""
+        for filename in ('records.parquet', 'records.arrow'):
+            with self.assertRaisesRegex(RuntimeError, 'pyarrow'):
+                export_records(self.conn, filename)
+            self.assertFalse(os.path.exists(filename))
+
+
+class TestExportWorker(ExcelExportTestCase):
+    """Test the background, debounced Excel export worker"""
+    
+    def setUp(self):
+        """Set up a worker that records its status messages"""
+        super().setUp()
+        self.messages = []
+        self.worker = ExportWorker('qr_codes.db', GUI_LAYOUT, quiet_period=0.2,
+                                   on_status=lambda message, error: self.messages.append((message, error)))
+    
+    def tearDown(self):
+        """Stop the worker before removing its files"""
+        self.worker.stop(flush=False)
+        super().tearDown()
+    
+    def completed_exports(self):
+        return [m for m, error in self.messages if 'updated' in m and not error]
+    
+    def test_burst_merged_into_one_export(self):
+        """Test that a burst of requests produces a single export"""
+        for i in range(4, 9):
+            self.add_record(i)
+            self.worker.request()
+        
+        self.assertTrue(self.worker.flush(timeout=10))
+        self.assertEqual(len(self.completed_exports()), 1)
+        
+        ids, _ = self.read_ids()
+        self.assertEqual(ids, list(range(1, 9)))
+    
+    def test_unexported_pngs_bounded(self):
+        """Test that PNGs of records that never reach an export stop piling up"""
+        for i in range(PNG_CACHE_SIZE + 10):
+            self.worker.share_png(f"orphan_{i}.png", b'png')
+        self.assertEqual(len(self.worker._png_cache), PNG_CACHE_SIZE)
+        self.assertNotIn('orphan_0.png', self.worker._png_cache)
+        self.assertIn(f"orphan_{PNG_CACHE_SIZE + 9}.png", self.worker._png_cache)
+    
+    def test_request_does_not_block(self):
+        """Test that request() returns before the quiet period ends"""
+        import time
+        start_time = time.monotonic()
+        self.worker.request()
+        self.assertLess(time.monotonic() - start_time, 0.1)
+        self.assertFalse(os.path.exists('qr_records.xlsx'))
+        
+        self.assertTrue(self.worker.flush(timeout=10))
+        self.assertTrue(os.path.exists('qr_records.xlsx'))
+
+    def test_sharded_exports(self):
+        """Test that a sharding worker reports the shard it updated"""
+        self.worker.stop(flush=False)
+        self.worker = ExportWorker('qr_codes.db', GUI_LAYOUT, quiet_period=0, shard_by='range', shard_size=2,
+                                   on_status=lambda message, error: self.messages.append((message, error)))
+        self.worker.request()
+        self.assertTrue(self.worker.flush(timeout=10))
+        self.assertIn('qr_records_000003-000004.xlsx (3 records', self.completed_exports()[0])
+        self.assertFalse(os.path.exists('qr_records.xlsx'))
+
+    def test_errors_reported(self):
+        """Test that export failures are passed to the status callback"""
+        self.conn.execute('DROP TABLE qr_records')
+        self.conn.commit()
+        
+        self.worker.request(immediate=True)
+        self.assertTrue(self.worker.flush(timeout=10))
+        self.assertTrue(any(error for _, error in self.messages), self.messages)
+    
+    def test_connection_closed_when_exporter_fails(self):
+        """Test that a connection whose exporter could not be created is closed before the next try"""
+        opened = []
+        
+        def tracked_connect(db_path):
+            conn = MagicMock(wraps=qr_database.connect(db_path))
+            opened.append(conn)
+            return conn
+        
+        create = self.worker._create_exporter
+        
+        def fail_once(conn):
+            if len(opened) == 1:
+                raise RuntimeError("no exporter")
+            return create(conn)
+        
+        with patch('excel_export.connect', side_effect=tracked_connect), \
+                patch.object(self.worker, '_create_exporter', side_effect=fail_once):
+            self.worker.request(immediate=True)
+            self.assertTrue(self.worker.flush(timeout=10))
+            self.worker.request(immediate=True)
+            self.assertTrue(self.worker.flush(timeout=10))
+        
+        self.assertEqual(len(opened), 2)
+        opened[0].close.assert_called_once_with()
+        opened[1].close.assert_not_called()
+        self.assertEqual(len(self.completed_exports()), 1)
+        self.worker.stop()
+        opened[1].close.assert_called_once_with()
+    
+    def test_stop_flushes_pending_export(self):
+        """Test that stopping the worker runs the waiting export"""
+        self.worker.request()
+        self.worker.stop(flush=True, timeout=10)
+        self.assertTrue(os.path.exists('qr_records.xlsx'))
+
+
+class TestIdAllocator(unittest.TestCase):
+    """Test free-list ID allocation"""
+    
+    def setUp(self):
+        """Create an in-memory table"""
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute('''
+            CREATE TABLE qr_records (
+                id INTEGER PRIMARY KEY,
+                serial_number TEXT NOT NULL,
+                verification_code TEXT NOT NULL,
+                dev_uid TEXT NOT NULL,
+                qr_filename TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+    
+    def tearDown(self):
+        self.conn.close()
+    
+    def insert(self, record_id):
+        self.conn.execute('''
+            INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (record_id, f'SN{record_id}', '123456', 'E5DDA7D74D91EC53', 'qr.png'))
+        self.conn.commit()
+    
+    def legacy_next_id(self):
+        """The original gap walk from QRGeneratorCLI.save_to_database"""
+        existing_ids = [row[0] for row in self.conn.execute('SELECT id FROM qr_records ORDER BY id')]
+        next_id = 1
+        for existing_id in existing_ids:
+            if next_id == existing_id:
+                next_id += 1
+            else:
+                break
+        return next_id
+    
+    def test_matches_gap_walk(self):
+        """Test that random inserts and deletes give the same IDs as the gap walk"""
+        import random
+        rng = random.Random(1234)
+        allocator = IdAllocator(self.conn)
+        
+        for step in range(500):
+            if rng.random() < 0.35 and self.legacy_next_id() > 1:
+                ids = [row[0] for row in self.conn.execute('SELECT id FROM qr_records')]
+                self.conn.execute('DELETE FROM qr_records WHERE id = ?', (rng.choice(ids),))
+                self.conn.commit()
+            else:
+                expected = self.legacy_next_id()
+                self.assertEqual(allocator.next_id(), expected, f"step {step}")
+                self.insert(expected)
+    
+    def test_existing_table_with_gaps(self):
+        """Test that the free list is filled from an existing table"""
+        for record_id in (1, 2, 4, 7):
+            self.insert(record_id)
+        
+        allocator = IdAllocator(self.conn)
+        self.assertEqual(allocator.next_id(), 3)
+        self.insert(3)
+        self.assertEqual(allocator.next_id(), 5)
+    
+    def test_explicit_id_past_the_end(self):
+        """Test that inserting an ID past the end opens a gap"""
+        allocator = IdAllocator(self.conn)
+        self.insert(1)
+        self.insert(5)
+        self.assertEqual(allocator.next_id(), 2)
+    
+    def test_rebuilt_after_table_recreated(self):
+        """Test that the free list is rebuilt when the table is dropped and recreated"""
+        IdAllocator(self.conn)
+        self.conn.execute('CREATE TABLE backup AS SELECT * FROM qr_records')
+        self.conn.execute('DROP TABLE qr_records')
+        self.conn.execute('CREATE TABLE qr_records AS SELECT * FROM backup WHERE 0')
+        self.conn.execute("INSERT INTO qr_records (id) VALUES (2)")
+        self.conn.commit()
+        
+        self.assertEqual(IdAllocator(self.conn).next_id(), 1)
+
+
+class TestBatchGeneration(unittest.TestCase):
+    """Test CLI batch generation from CSV/JSONL files"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        self.generator = QRGeneratorCLI()
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        self.generator.conn.close()
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+    
+    def read_report(self, path):
+        import csv
+        with open(path, newline='') as f:
+            return list(csv.DictReader(f))
+    
+    def test_batch_csv_with_header(self):
+        """Test a CSV batch with a header, chunked commits and a single export"""
+        with open('lot.csv', 'w') as f:
+            f.write("serial_number,verification_code,dev_uid,format\n")
+            for i in range(5):
+                f.write(f"SN{i},12345{i},E5DDA7D74D91EC5{i},\n")
+            f.write("SN9,,E5DDA7D74D91EC59,\n")
+        
+        with patch.object(self.generator, 'export_to_excel') as export:
+            succeeded, failed = self.generator.run_batch('lot.csv', chunk_size=2)
+        export.assert_called_once_with(verbose=False)
+        self.assertEqual((succeeded, failed), (5, 1))
+        
+        conn = sqlite3.connect('qr_codes.db')
+        rows = conn.execute('SELECT id, serial_number FROM qr_records ORDER BY id').fetchall()
+        conn.close()
+        self.assertEqual(rows, [(i + 1, f"SN{i}") for i in range(5)])
+        
+        report = self.read_report('lot_report.csv')
+        self.assertEqual([r['status'] for r in report], ['ok'] * 5 + ['error'])
+        self.assertIn('verification_code', report[-1]['error'])
+        self.assertTrue(all(os.path.exists(r['qr_filename']) for r in report[:5]))
+    
+    def test_write_lock_not_held_while_rendering(self):
+        """Test that another station can insert while a batch renders its next chunk"""
+        with open('lot.csv', 'w') as f:
+            for i in range(6):
+                f.write(f"SN{i},{i:06d},E5DDA7D74D91EC{i:02d}\n")
+        
+        station = sqlite3.connect('qr_codes.db', timeout=0)
+        job = self.generator.image_store.job
+        
+        def render_while_other_station_writes(qr_data, *args):
+            self.assertFalse(self.generator.conn.in_transaction)
+            station.execute('''
+                INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename)
+                VALUES ((SELECT MAX(id) + 100 FROM qr_records), 'OTHER', '123456', 'E5DDA7D74D91EC53', 'other.png')
+            ''')
+            station.commit()
+            return job(qr_data, *args)
+        
+        try:
+            with patch.object(self.generator.image_store, 'job', side_effect=render_while_other_station_writes), \
+                    patch.object(self.generator, 'export_to_excel'):
+                succeeded, failed = self.generator.run_batch('lot.csv', chunk_size=2)
+            others = station.execute("SELECT COUNT(*) FROM qr_records WHERE serial_number = 'OTHER'").fetchone()[0]
+        finally:
+            station.close()
+        self.assertEqual((succeeded, failed, others), (6, 0, 6))
+        self.assertEqual([r['status'] for r in self.read_report('lot_report.csv')], ['ok'] * 6)
+    
+    def test_batch_jsonl(self):
+        """Test a JSONL batch with aliases, per-row formats and bad lines"""
+        with open('lot.jsonl', 'w') as f:
+            f.write(json.dumps({"sn": "J1", "vc": "111111", "uid": "E5DDA7D74D91EC53", "format": "csv"}) + "\n")
+            f.write("not json\n")
+            f.write(json.dumps({"serial": "J2", "vcode": "222222", "devuid": "E5DDA7D74D91EC54"}) + "\n")
+        
+        succeeded, failed = self.generator.run_batch('lot.jsonl', report_path='out.csv')
+        self.assertEqual((succeeded, failed), (2, 1))
+        self.assertEqual([r['status'] for r in self.read_report('out.csv')], ['ok', 'error', 'ok'])
+        self.assertTrue(os.path.exists('qr_records.xlsx'))
+    
+    def test_headerless_csv(self):
+        """Test that plain serial,vcode,devuid lines are accepted"""
+        with open('plain.csv', 'w') as f:
+            f.write("P1,111111,E5DDA7D74D91EC53\nP2,222222,E5DDA7D74D91EC54\n")
+        
+        rows = [row for _, row in iter_batch_rows('plain.csv')]
+        self.assertEqual(rows[0], {'serial_number': 'P1', 'verification_code': '111111', 'dev_uid': 'E5DDA7D74D91EC53'})
+        self.assertEqual(len(rows), 2)
+
+
+
+class TestRenderPool(unittest.TestCase):
+    """Test multi-process QR rendering"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+    
+    def test_png_matches_qrcode_image(self):
+        """Test that render_qr_png draws the same pixels as the qrcode library"""
+        qr_data = "https://olarm.com/o/flxr?a=TEST123456789012,E5DDA7D74D91EC53,123456"
+        qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=10, border=4)
+        qr.add_data(qr_data)
+        qr.make(fit=True)
+        expected = qr.make_image(fill_color="black", back_color="white").get_image()
+        
+        with Image.open(io.BytesIO(render_qr_png(qr_data))) as image:
+            self.assertEqual(image.size, expected.size)
+            self.assertEqual(image.convert('L').tobytes(), expected.convert('L').tobytes())
+    
+    def test_results_in_input_order(self):
+        """Test that pooled results come back in submission order"""
+        jobs = [(i, RenderJob(f"SERIAL{i}", f"qr_{i}.png") if i % 5 else None) for i in range(20)]
+        with RenderPool(workers=2, max_in_flight=4) as pool:
+            results = list(pool.imap(iter(jobs)))
+        
+        self.assertEqual([tag for tag, _ in results], list(range(20)))
+        for tag, result in results:
+            if tag % 5:
+                self.assertIsNone(result.error)
+                self.assertTrue(os.path.exists(result.filename))
+            else:
+                self.assertIsNone(result)
+    
+    def test_png_bytes_returned_without_filename(self):
+        """Test that jobs without a filename return PNG bytes"""
+        with RenderPool(workers=1) as pool:
+            [(_, result)] = list(pool.imap([('a', RenderJob("SERIAL", None))]))
+        self.assertTrue(result.png.startswith(b'\x89PNG'))
+    
+    def test_batch_with_workers(self):
+        """Test that a pooled batch commits rows in input order"""
+        with open('lot.csv', 'w') as f:
+            for i in range(12):
+                f.write(f"SN{i},{i:06d},E5DDA7D74D91EC{i:02d}\n")
+        
+        generator = QRGeneratorCLI()
+        try:
+            succeeded, failed = generator.run_batch('lot.csv', chunk_size=5, workers=2)
+            rows = generator.conn.execute('SELECT id, serial_number FROM qr_records ORDER BY id').fetchall()
+        finally:
+            generator.conn.close()
+        self.assertEqual((succeeded, failed), (12, 0))
+        self.assertEqual(rows, [(i + 1, f"SN{i}") for i in range(12)])
+
+
+class TestQRImageStore(unittest.TestCase):
+    """Test the content-addressed QR image store"""
+    
+    QR_DATA = "https://olarm.com/o/flxr?a=S1,E5DDA7D74D91EC53,123456"
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        self.conn = sqlite3.connect('qr_codes.db')
+        qr_migrations.migrate(self.conn)
+        self.store = QRImageStore()
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        self.conn.close()
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+    
+    def add_record(self, record_id, filename):
+        self.conn.execute('''
+            INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename)
+            VALUES (?, 'S1', '123456', 'E5DDA7D74D91EC53', ?)
+        ''', (record_id, filename))
+        self.conn.commit()
+    
+    def test_key_covers_render_settings(self):
+        """Test that the payload and every render setting change the key"""
+        keys = {
+            self.store.key(self.QR_DATA),
+            self.store.key(self.QR_DATA + "0"),
+            self.store.key(self.QR_DATA, 'olarm'),
+            self.store.key(self.QR_DATA, mask_pattern=3),
+            QRImageStore(box_size=5).key(self.QR_DATA),
+            QRImageStore(border=2).key(self.QR_DATA),
+        }
+        self.assertEqual(len(keys), 6)
+        key = self.store.key(self.QR_DATA)
+        self.assertEqual(self.store.path(key), os.path.join('qr_images', key[:2], key[2:4], f"{key}.png"))
+    
+    def test_hit_skips_rendering(self):
+        """Test that a stored image is read back instead of rendered again"""
+        self.assertIsNone(self.store.lookup(self.QR_DATA))
+        first = self.store.get_or_render(self.QR_DATA)
+        self.assertTrue(first.rendered)
+        self.assertEqual(self.store.lookup(self.QR_DATA), first.filename)
+        
+        with patch('qr_store.render_qr_png') as render:
+            second = self.store.get_or_render(self.QR_DATA)
+        render.assert_not_called()
+        self.assertEqual((second.filename, second.png, second.rendered), (first.filename, first.png, False))
+        self.assertEqual((self.store.hits, self.store.misses), (1, 1))
+        self.assertEqual(sorted(os.listdir('.')), ['qr_codes.db', 'qr_images'])
+    
+    def test_jobs_for_stored_images_pass_through_the_pool(self):
+        """Test that batch jobs for stored images are not rendered again"""
+        stored = self.store.get_or_render(self.QR_DATA).filename
+        jobs = [('stored', self.store.job(self.QR_DATA)), ('new', self.store.job(self.QR_DATA, 'olarm')),
+                ('invalid', None)]
+        self.assertEqual(jobs[0][1], RenderResult(stored, None, None))
+        self.assertIsInstance(jobs[1][1], RenderJob)
+        
+        with RenderPool(2) as pool:
+            results = dict(pool.imap(jobs))
+        self.assertEqual(results['stored'].filename, stored)
+        self.assertIsNone(results['new'].error)
+        self.assertTrue(os.path.exists(results['new'].filename))
+        self.assertIsNone(results['invalid'])
+    
+    def test_release_keeps_shared_images(self):
+        """Test that an image is only deleted with the last record using it"""
+        filename = self.store.get_or_render(self.QR_DATA).filename
+        self.add_record(1, filename)
+        self.add_record(2, filename)
+        
+        self.conn.execute('DELETE FROM qr_records WHERE id = 1')
+        self.assertFalse(self.store.release(self.conn, filename))
+        self.assertTrue(os.path.exists(filename))
+        
+        # An image used recently is left for gc()
+        self.conn.execute('DELETE FROM qr_records WHERE id = 2')
+        self.assertFalse(self.store.release(self.conn, filename))
+        self.assertTrue(os.path.exists(filename))
+        
+        self.assertTrue(self.store.release(self.conn, filename, min_age=0))
+        self.assertFalse(os.path.exists(filename))
+        self.assertFalse(self.store.release(self.conn, filename, min_age=0))
+    
+    def test_hits_mark_images_used(self):
+        """Test that reusing an image, or claiming it for a record, keeps it out of gc() and release()"""
+        filename = self.store.get_or_render(self.QR_DATA).filename
+        
+        def age():
+            os.utime(filename, (0, 0))
+            self.assertEqual(self.store.gc(self.conn, dry_run=True).removed, 1)
+        
+        for use in (lambda: self.store.get_or_render(self.QR_DATA), lambda: self.store.job(self.QR_DATA),
+                    lambda: self.store.claim(filename)):
+            age()
+            use()
+            self.assertEqual(self.store.gc(self.conn).removed, 0)
+            self.assertFalse(self.store.release(self.conn, filename))
+            self.assertTrue(os.path.exists(filename))
+        
+        age()
+        self.assertTrue(self.store.release(self.conn, filename))
+        self.assertFalse(self.store.claim(filename))
+    
+    def test_use_keeps_thumbnails_cached(self):
+        """Test that a hit and a claim leave the thumbnail cached for the image"""
+        cache = ThumbnailCache()
+        image = self.store.get_or_render(self.QR_DATA)
+        cache.put(image.filename, image.png)
+        mtime = os.stat(image.filename).st_mtime_ns
+        
+        self.store.get_or_render(self.QR_DATA)
+        self.assertTrue(self.store.claim(image.filename))
+        self.assertIsNotNone(cache.get(image.filename))
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+        self.assertEqual(os.stat(image.filename).st_mtime_ns, mtime)
+    
+    def test_record_not_saved_for_removed_image(self):
+        """Test that writers do not commit a record whose image was removed after the lookup"""
+        with patch('builtins.print'):
+            cli = QRGeneratorCLI()
+        try:
+            found = cli.image_store.get_or_render
+            
+            def cleaned_up_meanwhile(*args):
+                image = found(*args)
+                os.remove(image.filename)
+                return image
+            
+            with patch('builtins.print'), patch.object(cli.image_store, 'get_or_render', side_effect=cleaned_up_meanwhile):
+                self.assertIsNone(cli.generate_qr_code('S1', '123456', 'E5DDA7D74D91EC53'))
+            self.assertEqual(cli.conn.execute('SELECT COUNT(*) FROM qr_records').fetchone()[0], 0)
+        finally:
+            cli.conn.close()
+    
+    def test_gc_removes_unreferenced_images(self):
+        """Test that gc() removes orphaned images and keeps used and recent ones"""
+        kept = self.store.get_or_render(self.QR_DATA).filename
+        orphan = self.store.get_or_render(self.QR_DATA, 'olarm').filename
+        self.add_record(1, kept)
+        
+        self.assertEqual(self.store.gc(self.conn).removed, 0)
+        
+        dry_run = self.store.gc(self.conn, min_age=0, dry_run=True)
+        self.assertEqual((dry_run.checked, dry_run.removed), (2, 1))
+        self.assertEqual(dry_run.freed, os.path.getsize(orphan))
+        self.assertTrue(os.path.exists(orphan))
+        
+        result = self.store.gc(self.conn, min_age=0)
+        self.assertEqual(result, dry_run)
+        self.assertTrue(os.path.exists(kept))
+        self.assertFalse(os.path.exists(orphan))
+    
+    def test_cli_records_share_an_image(self):
+        """Test that CLI records with the same code share one image until both are gone"""
+        cli = QRGeneratorCLI()
+        try:
+            with patch('builtins.print'):
+                first = cli.generate_qr_code('S1', '123456', 'E5DDA7D74D91EC53')
+                second = cli.generate_qr_code('S1', '123456', 'E5DDA7D74D91EC53')
+                self.assertEqual(first, second)
+                self.assertEqual((cli.image_store.hits, cli.image_store.misses), (1, 1))
+                
+                for record_id in (1, 2):
+                    with patch('builtins.input', side_effect=[str(record_id), 'y']):
+                        cli.remove_record()
+                    self.assertTrue(os.path.exists(first))
+                
+                # Just used, so the last removal leaves it for gc()
+                self.assertEqual(cli.gc_images(min_age=0).removed, 1)
+                self.assertFalse(os.path.exists(first))
+        finally:
+            cli.conn.close()
+
+
+class TestFormatRegistry(unittest.TestCase):
+    """Test the shared QR payload format registry"""
+    
+    def setUp(self):
+        self.fields = ('TEST123456789012', '123456', 'E5DDA7D74D91EC53')
+    
+    def tearDown(self):
+        qr_formats.FORMATS.pop('olarm_custom', None)
+    
+    def test_formats_match_previous_payloads(self):
+        """Test that every built-in format produces the original payload"""
+        serial, vcode, devuid = self.fields
+        expected = {
+            'olarm': f"https://olarm.com/o/flxr?a={serial},{devuid},{vcode}",
+            'json': json.dumps({"sn": serial, "vc": vcode, "uid": devuid}, separators=(',', ':')),
+            'csv': f"{serial},{vcode},{devuid}",
+            'pipe': f"{serial}|{vcode}|{devuid}",
+            'compact': f"{serial}:{vcode}:{devuid}",
+            'labeled': f"Serial Number: {serial}\nVerification Code: {vcode}\nDevUID: {devuid}",
+            'url': f"https://validate.example.com?sn={serial}&vc={vcode}&uid={devuid}",
+        }
+        self.assertEqual(list(qr_formats.FORMATS), list(expected))
+        for name, payload in expected.items():
+            with self.subTest(format=name):
+                self.assertEqual(qr_formats.format_qr_data(name, *self.fields), payload)
+    
+    def test_unknown_format_falls_back_to_default(self):
+        """Test that both entry points share the Olarm fallback"""
+        self.assertEqual(qr_formats.format_qr_data('bogus', *self.fields),
+                         qr_formats.format_qr_data('olarm', *self.fields))
+    
+    def test_format_many(self):
+        """Test vectorized formatting of many rows"""
+        rows = [(f"SN{i}", f"{i:06d}", f"UID{i}") for i in range(3)]
+        self.assertEqual(qr_formats.format_many(rows, 'pipe'), [f"SN{i}|{i:06d}|UID{i}" for i in range(3)])
+    
+    def test_register_custom_format(self):
+        """Test adding a customer-specific template format"""
+        qr_formats.register_format('olarm_custom', template="https://olarm.com/o/{{x}}?a={serial_number};{dev_uid}")
+        self.assertEqual(qr_formats.format_qr_data('olarm_custom', *self.fields),
+                         "https://olarm.com/o/{x}?a=TEST123456789012;E5DDA7D74D91EC53")
+        with self.assertRaises(ValueError):
+            qr_formats.register_format('broken', template="{serial}")
+    
+    def test_interactive_menu_keeps_numbers(self):
+        """Test that the CLI menu keeps its original numbers and adds new formats after them"""
+        expected = {'1': 'json', '2': 'csv', '3': 'pipe', '4': 'compact', '5': 'labeled', '6': 'url', '7': 'olarm'}
+        self.assertEqual(format_menu(), expected)
+        qr_formats.register_format('olarm_custom', template="{serial_number}")
+        self.assertEqual(format_menu(), {**expected, '8': 'olarm_custom'})
+        
+        cli = MagicMock()
+        answers = ['1', 'S1', '123456', 'E5DDA7D74D91EC53', '', '5']
+        with patch('builtins.input', side_effect=answers), patch('builtins.print'):
+            QRGeneratorCLI.interactive_mode(cli)
+        cli.generate_qr_code.assert_called_once_with('S1', '123456', 'E5DDA7D74D91EC53', 'olarm')
+
+
+class TestPngWriter(unittest.TestCase):
+    """Test the direct 1-bit PNG writer"""
+    
+    def setUp(self):
+        self.modules = qr_matrix("https://olarm.com/o/flxr?a=TEST123456789012,E5DDA7D74D91EC53,123456")
+    
+    def test_one_bit_grayscale(self):
+        """Test that codes are written as 1-bit grayscale PNGs"""
+        png = matrix_png(self.modules)
+        self.assertTrue(png.startswith(b'\x89PNG\r\n\x1a\n'))
+        with Image.open(io.BytesIO(png)) as image:
+            self.assertEqual(image.mode, '1')
+            self.assertEqual(image.size, ((len(self.modules) + 8) * 10,) * 2)
+    
+    def test_box_size_and_border(self):
+        """Test module placement for sizes that do not fill whole bytes"""
+        for box_size, border in ((1, 0), (3, 1), (7, 2), (10, 4)):
+            with self.subTest(box_size=box_size, border=border):
+                with Image.open(io.BytesIO(matrix_png(self.modules, box_size, border))) as image:
+                    pixels = image.convert('L').load()
+                    for row in range(len(self.modules)):
+                        for col in range(len(self.modules)):
+                            x = (col + border) * box_size + box_size - 1
+                            y = (row + border) * box_size
+                            self.assertEqual(pixels[x, y] == 0, self.modules[row][col])
+    
+    def test_smaller_than_pil_png(self):
+        """Test that the tuned encoder beats PIL's default PNG size"""
+        qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_M)
+        qr.add_data("https://olarm.com/o/flxr?a=TEST123456789012,E5DDA7D74D91EC53,123456")
+        qr.make(fit=True)
+        buffer = io.BytesIO()
+        qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+        self.assertLess(len(matrix_png(self.modules)), len(buffer.getvalue()))
+
+
+class TestThumbnailCache(unittest.TestCase):
+    """Test the GUI thumbnail cache"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        for i in range(3):
+            self.write_png(f"qr_{i}.png", f"SERIAL{i}")
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+    
+    def write_png(self, filename, qr_data):
+        png = render_qr_png(qr_data)
+        with open(filename, 'wb') as f:
+            f.write(png)
+        return png
+    
+    def test_thumbnail_size(self):
+        """Test that thumbnails are 80x80 PNGs"""
+        thumbnail = ThumbnailCache().get("qr_0.png")
+        with Image.open(io.BytesIO(base64.b64decode(thumbnail))) as image:
+            self.assertEqual(image.size, (80, 80))
+    
+    def test_refresh_does_not_reopen_images(self):
+        """Test that repeated lookups are served from memory"""
+        cache = ThumbnailCache()
+        first = cache.get("qr_0.png")
+        with patch('builtins.open', side_effect=AssertionError("image file opened")):
+            self.assertEqual(cache.get("qr_0.png"), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+    
+    def test_rewritten_file_is_reloaded(self):
+        """Test that a changed modification time invalidates the thumbnail"""
+        cache = ThumbnailCache()
+        first = cache.get("qr_0.png")
+        self.write_png("qr_0.png", "A DIFFERENT, LONGER PAYLOAD FOR THE SAME FILE")
+        os.utime("qr_0.png", ns=(0, os.stat("qr_0.png").st_mtime_ns + 10**9))
+        self.assertNotEqual(cache.get("qr_0.png"), first)
+        self.assertEqual(cache.misses, 2)
+    
+    def test_lru_eviction(self):
+        """Test that the least recently used thumbnail is evicted"""
+        cache = ThumbnailCache(max_entries=2)
+        cache.get("qr_0.png")
+        cache.get("qr_1.png")
+        cache.get("qr_0.png")
+        cache.get("qr_2.png")
+        self.assertEqual(list(cache.entries), ["qr_0.png", "qr_2.png"])
+    
+    def test_missing_file(self):
+        """Test that a missing image gives no thumbnail"""
+        cache = ThumbnailCache()
+        cache.get("qr_0.png")
+        os.remove("qr_0.png")
+        self.assertIsNone(cache.get("qr_0.png"))
+        self.assertNotIn("qr_0.png", cache.entries)
+    
+    def test_put_uses_png_bytes(self):
+        """Test that a freshly written PNG is cached without reading the file"""
+        png = self.write_png("qr_new.png", "NEW")
+        cache = ThumbnailCache()
+        thumbnail = cache.put("qr_new.png", png)
+        with patch('builtins.open', side_effect=AssertionError("image file opened")):
+            self.assertEqual(cache.get("qr_new.png"), thumbnail)
+    
+    def test_persisted_in_sqlite(self):
+        """Test that thumbnails survive a restart when persisted"""
+        conn = sqlite3.connect('qr_codes.db')
+        try:
+            with patch('builtins.print'):
+                qr_migrations.migrate(conn)
+            thumbnail = ThumbnailCache(conn).get("qr_1.png")
+            cache = ThumbnailCache(conn)
+            with patch('builtins.open', side_effect=AssertionError("image file opened")):
+                self.assertEqual(cache.get("qr_1.png"), thumbnail)
+            
+            cache.discard("qr_1.png")
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM qr_thumbnails').fetchone()[0], 0)
+        finally:
+            conn.close()
+
+
+@unittest.skipUnless(FLET_AVAILABLE, "Flet not available")
+class TestRecordSelection(unittest.TestCase):
+    """Test selecting records in the GUI table without a reload"""
+    
+    def setUp(self):
+        """Set up a GUI app with a few records"""
+        import qr_generator_gui
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        
+        self.page = MagicMock()
+        with patch('builtins.print'):
+            self.app = qr_generator_gui.QRGeneratorApp(self.page, export_quiet_period=60)
+            for i in range(3):
+                self.app.serial_field.value = f"SERIAL{i}"
+                self.app.vcode_field.value = "123456"
+                self.app.devuid_field.value = "E5DDA7D74D91EC53"
+                self.app.generate_qr_code(None)
+        self.rows = list(self.app.records_table.rows)
+        self.page.update.reset_mock()
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        self.app.export_worker.stop(flush=False)
+        self.app.record_pager.close()
+        self.app.conn.close()
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+    
+    def selection(self):
+        return [(row.data, row.cells[0].content.content.text, row.color) for row in self.app.records_table.rows]
+    
+    def test_select_updates_only_changed_rows(self):
+        """Test that selecting restyles the affected rows in place"""
+        with patch.object(self.app, 'load_records', side_effect=AssertionError("table reloaded")), \
+                patch('builtins.print'):
+            self.app.select_record('2')
+            self.page.update.assert_called_once_with(self.app.status_text, self.app.record_rows['2'][0])
+            
+            self.page.update.reset_mock()
+            self.app.select_record('1')
+            self.page.update.assert_called_once_with(
+                self.app.status_text, self.app.record_rows['2'][0], self.app.record_rows['1'][0])
+        
+        self.assertEqual(self.selection(), [
+            ('3', '○', None),
+            ('2', '○', None),
+            ('1', '✓', ft.Colors.BLUE_50),
+        ])
+        self.assertTrue(all(a is b for a, b in zip(self.rows, self.app.records_table.rows)))
+    
+    def test_deselect(self):
+        """Test that clicking the selected record clears the selection"""
+        with patch('builtins.print'):
+            self.app.select_record('3')
+            self.app.select_record('3')
+        self.assertIsNone(self.app.selected_record_id)
+        self.assertEqual([text for _, text, _ in self.selection()], ['○', '○', '○'])
+    
+    def test_reload_keeps_selection(self):
+        """Test that a full reload restores the selected row style"""
+        with patch('builtins.print'):
+            self.app.select_record('2')
+            self.app.load_records()
+        self.assertEqual(self.selection()[1], ('2', '✓', ft.Colors.BLUE_50))
+
+
+@unittest.skipUnless(FLET_AVAILABLE, "Flet not available")
+class TestRecordsBrowser(unittest.TestCase):
+    """Test paging through records in the GUI table"""
+    
+    def setUp(self):
+        """Set up a GUI app with two records per page"""
+        import qr_generator_gui
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        
+        with patch.object(qr_generator_gui.QRGeneratorApp, 'RECORDS_PAGE_SIZE', 2), patch('builtins.print'):
+            self.app = qr_generator_gui.QRGeneratorApp(MagicMock(), export_quiet_period=60)
+            for i in range(5):
+                self.app.serial_field.value = f"SERIAL{i}"
+                self.app.vcode_field.value = "123456"
+                self.app.devuid_field.value = "E5DDA7D74D91EC53"
+                self.app.generate_qr_code(None)
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        self.app.close()
+        self.app.conn.close()
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+    
+    def shown_ids(self):
+        return [row.data for row in self.app.records_table.rows]
+    
+    def test_page_through_history(self):
+        """Test moving to older and newer pages"""
+        self.assertEqual(self.shown_ids(), ['5', '4'])
+        self.assertTrue(self.app.newer_button.disabled)
+        
+        self.app.show_older_records(None)
+        self.assertEqual(self.shown_ids(), ['3', '2'])
+        self.app.show_older_records(None)
+        self.assertEqual(self.shown_ids(), ['1'])
+        self.assertTrue(self.app.older_button.disabled)
+        self.assertEqual(self.app.page_label.value, "Page 3")
+        
+        self.app.show_newer_records(None)
+        self.assertEqual(self.shown_ids(), ['3', '2'])
+        self.assertEqual(len(self.app.thumbnail_cache.entries), 5)
+    
+    def test_remove_last_record_on_page(self):
+        """Test that emptying the last page moves back a page"""
+        self.app.show_older_records(None)
+        self.app.show_older_records(None)
+        with patch('builtins.print'):
+            self.app.select_record('1')
+            self.app.remove_record(None)
+        self.assertEqual(self.shown_ids(), ['3', '2'])
+        self.assertTrue(self.app.older_button.disabled)
+    
+    def test_generate_returns_to_newest_page(self):
+        """Test that a new record is shown on the first page"""
+        self.app.show_older_records(None)
+        with patch('builtins.print'):
+            self.app.serial_field.value = "SERIAL5"
+            self.app.generate_qr_code(None)
+        self.assertEqual(self.shown_ids(), ['6', '5'])
+
+
+class TestRecordPager(unittest.TestCase):
+    """Test keyset pagination of qr_records"""
+    
+    def setUp(self):
+        """Set up a database with records sharing timestamps"""
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, 'qr_codes.db')
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute('''
+            CREATE TABLE qr_records (
+                id INTEGER PRIMARY KEY,
+                serial_number TEXT NOT NULL,
+                verification_code TEXT NOT NULL,
+                dev_uid TEXT NOT NULL,
+                qr_filename TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self.conn.executemany('''
+            INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename, created_at)
+            VALUES (?, ?, '123456', 'E5DDA7D74D91EC53', ?, ?)
+        ''', [(i, f"SERIAL{i}", f"qr_{i}.png", f"2025-01-01 10:00:{i // 3:02d}") for i in range(1, 51)])
+        self.conn.commit()
+        self.pager = RecordPager(self.conn, ('id', 'serial_number', 'created_at'), page_size=7, db_path=self.db_path)
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        self.pager.close()
+        self.conn.close()
+        shutil.rmtree(self.test_dir)
+    
+    def test_pages_cover_all_records_in_order(self):
+        """Test that pages are newest first without gaps or repeats"""
+        pages, key = [], None
+        while True:
+            rows, key = self.pager.fetch(key)
+            pages.append([row[0] for row in rows])
+            if key is None:
+                break
+            self.pager.prefetch(key)
+        
+        self.assertEqual([len(page) for page in pages], [7] * 7 + [1])
+        expected = [row[0] for row in self.conn.execute('SELECT id FROM qr_records ORDER BY created_at DESC, id DESC')]
+        self.assertEqual(sum(pages, []), expected)
+    
+    def test_page_query_uses_index(self):
+        """Test that a deep page is an index range scan"""
+        plan = ' '.join(row[3] for row in self.conn.execute('''
+            EXPLAIN QUERY PLAN
+            SELECT id, serial_number, created_at FROM qr_records
+            WHERE (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT 8
+        ''', ("2025-01-01 10:00:05", 15)))
+        self.assertIn(RecordPager.INDEX, plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+    
+    def test_invalidate_drops_prefetched_page(self):
+        """Test that a prefetched page is not reused after a change"""
+        rows, key = self.pager.fetch()
+        self.pager.prefetch(key)
+        self.pager._prefetched[2].result()
+        
+        self.conn.execute('DELETE FROM qr_records WHERE id = 43')
+        self.conn.commit()
+        self.pager.invalidate()
+        rows, _ = self.pager.fetch(key)
+        self.assertNotIn(43, [row[0] for row in rows])
+
+
+class TestSchemaMigrations(unittest.TestCase):
+    """Test the versioned schema migrations shared by the CLI and GUI"""
+    
+    LEGACY_CLI_TABLE = '''
+        CREATE TABLE qr_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            serial_number TEXT NOT NULL,
+            verification_code TEXT NOT NULL,
+            dev_uid TEXT NOT NULL,
+            qr_filename TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    '''
+    
+    LEGACY_GUI_TABLE = '''
+        CREATE TABLE qr_records (
+            id INTEGER PRIMARY KEY,
+            serial_number TEXT NOT NULL,
+            verification_code TEXT NOT NULL,
+            dev_uid TEXT NOT NULL,
+            device_name TEXT,
+            qr_filename TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT (datetime('now', '+2 hours'))
+        )
+    '''
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.conn = sqlite3.connect(':memory:')
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        self.conn.close()
+    
+    def migrate(self):
+        with patch('builtins.print'):
+            return qr_migrations.migrate(self.conn)
+    
+    def columns(self):
+        return [row[1] for row in self.conn.execute('PRAGMA table_info(qr_records)')]
+    
+    def test_fresh_database(self):
+        """Test that a new database is created at the current version"""
+        self.assertEqual(self.migrate(), 0)
+        self.assertEqual(qr_migrations.schema_version(self.conn), qr_migrations.SCHEMA_VERSION)
+        self.assertEqual(self.columns(), ['id', 'serial_number', 'verification_code', 'dev_uid',
+                                          'device_name', 'qr_filename', 'created_at', 'sync_seq'])
+        names = {name for (name,) in self.conn.execute('SELECT name FROM sqlite_master')}
+        self.assertIn('qr_thumbnails', names)
+        self.assertTrue(set(qr_database.INDEXES) <= names)
+    
+    def test_legacy_cli_database(self):
+        """Test that an AUTOINCREMENT table keeps its data with sequential IDs"""
+        self.conn.execute(self.LEGACY_CLI_TABLE)
+        for record_id, created_at in [(5, '2024-01-02 10:00:00'), (9, '2024-01-01 10:00:00'),
+                                      (12, '2024-01-03 10:00:00')]:
+            self.conn.execute('''
+                INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename, created_at)
+                VALUES (?, ?, '123456', 'E5DDA7D74D91EC53', ?, ?)
+            ''', (record_id, f"S{record_id}", f"qr_{record_id}.png", created_at))
+        self.conn.commit()
+        
+        self.migrate()
+        
+        self.assertIn('device_name', self.columns())
+        sql = self.conn.execute("SELECT sql FROM sqlite_master WHERE name='qr_records'").fetchone()[0]
+        self.assertNotIn('AUTOINCREMENT', sql)
+        rows = self.conn.execute('SELECT id, serial_number, device_name FROM qr_records ORDER BY id').fetchall()
+        self.assertEqual(rows, [(1, 'S9', None), (2, 'S5', None), (3, 'S12', None)])
+    
+    def test_legacy_gui_database(self):
+        """Test that a GUI table keeps its IDs and device names"""
+        self.conn.execute(self.LEGACY_GUI_TABLE)
+        self.conn.execute('''
+            INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, device_name, qr_filename, created_at)
+            VALUES (7, 'S7', '123456', 'E5DDA7D74D91EC53', 'Olarm', 'qr_7.png', '2024-01-01T10:00:00+02:00')
+        ''')
+        self.conn.execute('''
+            INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, device_name, qr_filename, created_at)
+            VALUES (3, 'S3', '123456', 'E5DDA7D74D91EC53', 'Olarm', 'qr_3.png', '2024-01-02T10:00:00+02:00')
+        ''')
+        self.conn.commit()
+        
+        self.migrate()
+        
+        self.assertEqual(self.conn.execute('SELECT id, device_name, created_at FROM qr_records ORDER BY id').fetchall(),
+                         [(3, 'Olarm', '2024-01-02T10:00:00+02:00'), (7, 'Olarm', '2024-01-01T10:00:00+02:00')])
+        self.conn.execute('''
+            INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename)
+            VALUES (8, 'S8', '123456', 'E5DDA7D74D91EC53', 'qr_8.png')
+        ''')
+        self.assertEqual(self.conn.execute('SELECT id, sync_seq FROM qr_records ORDER BY sync_seq').fetchall(),
+                         [(7, 1), (3, 2), (8, 3)])
+    
+    def test_current_database_runs_no_ddl(self):
+        """Test that startup on a current database only reads the version"""
+        self.migrate()
+        statements = []
+        self.conn.set_trace_callback(statements.append)
+        self.assertEqual(self.migrate(), qr_migrations.SCHEMA_VERSION)
+        self.assertEqual(statements, ['PRAGMA user_version'])
+    
+    def test_failed_migration_rolls_back(self):
+        """Test that a failing migration leaves the old schema and version"""
+        self.conn.execute(self.LEGACY_CLI_TABLE)
+        self.conn.commit()
+        
+        def broken(conn):
+            raise sqlite3.OperationalError("broken migration")
+        
+        with patch.object(qr_migrations, 'MIGRATIONS', qr_migrations.MIGRATIONS[:1] + [broken]), \
+                patch.object(qr_migrations, 'SCHEMA_VERSION', 2):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.migrate()
+        
+        self.assertEqual(qr_migrations.schema_version(self.conn), 0)
+        sql = self.conn.execute("SELECT sql FROM sqlite_master WHERE name='qr_records'").fetchone()[0]
+        self.assertIn('AUTOINCREMENT', sql)
+        self.assertNotIn('device_name', self.columns())
+
+
+class TestConcurrentWriters(unittest.TestCase):
+    """Stress test several stations writing to one database file at once"""
+    
+    WRITERS = 8
+    RECORDS_PER_WRITER = 40
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, 'qr_codes.db')
+        conn = qr_database.connect(self.db_path)
+        with patch('builtins.print'):
+            qr_migrations.migrate(conn)
+        IdAllocator(conn)
+        conn.close()
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        shutil.rmtree(self.test_dir)
+    
+    def test_connection_uses_wal(self):
+        """Test that connections enable WAL with a busy timeout"""
+        conn = qr_database.connect(self.db_path)
+        try:
+            self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            self.assertEqual(conn.execute('PRAGMA synchronous').fetchone()[0], 1)
+            self.assertEqual(conn.execute('PRAGMA busy_timeout').fetchone()[0], qr_database.BUSY_TIMEOUT * 1000)
+        finally:
+            conn.close()
+    
+    def test_concurrent_writers_and_reader(self):
+        """Test that N writers get distinct IDs while a reader keeps paging"""
+        errors = []
+        done = threading.Event()
+        pages_read = []
+        
+        def writer(station):
+            conn = qr_database.connect(self.db_path)
+            allocator = IdAllocator(conn)
+            try:
+                for i in range(self.RECORDS_PER_WRITER):
+                    def insert():
+                        record_id = allocator.next_id()
+                        conn.execute('''
+                            INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename)
+                            VALUES (?, ?, '123456', 'E5DDA7D74D91EC53', ?)
+                        ''', (record_id, f"S{station}-{i}", f"qr_{station}_{i}.png"))
+                    qr_database.write_transaction(conn, insert)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                conn.close()
+        
+        def reader():
+            conn = qr_database.connect(self.db_path)
+            pager = RecordPager(conn, ['id', 'created_at'], page_size=20)
+            try:
+                while not done.is_set():
+                    pages_read.append(pager.fetch()[0])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                conn.close()
+        
+        reader_thread = threading.Thread(target=reader)
+        reader_thread.start()
+        writers = [threading.Thread(target=writer, args=(station,)) for station in range(self.WRITERS)]
+        for thread in writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        done.set()
+        reader_thread.join()
+        
+        self.assertEqual(errors, [])
+        self.assertTrue(pages_read)
+        conn = qr_database.connect(self.db_path)
+        try:
+            ids = [row[0] for row in conn.execute('SELECT id FROM qr_records ORDER BY id')]
+        finally:
+            conn.close()
+        self.assertEqual(ids, list(range(1, self.WRITERS * self.RECORDS_PER_WRITER + 1)))
+    
+    def test_write_retried_while_locked(self):
+        """Test that a write waits out a lock held past the busy timeout"""
+        holder = qr_database.connect(self.db_path, check_same_thread=False)
+        holder.execute('BEGIN IMMEDIATE')
+        conn = sqlite3.connect(self.db_path, timeout=0)
+        release = threading.Timer(0.2, holder.rollback)
+        try:
+            release.start()
+            qr_database.write_transaction(conn, lambda: conn.execute('''
+                INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename)
+                VALUES (1, 'S1', '123456', 'E5DDA7D74D91EC53', 'qr_1.png')
+            '''))
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM qr_records').fetchone()[0], 1)
+        finally:
+            release.join()
+            conn.close()
+            holder.close()
+    
+    def test_thumbnail_writes_retried_while_locked(self):
+        """Test that persisting and discarding thumbnails wait out another station's lock"""
+        filename = os.path.join(self.test_dir, 'qr_1.png')
+        with open(filename, 'wb') as f:
+            f.write(render_qr_png("S1"))
+        conn = sqlite3.connect(self.db_path, timeout=0)
+        cache = ThumbnailCache(conn)
+        try:
+            for write in (lambda: cache.put(filename, render_qr_png("S1")), lambda: cache.discard(filename)):
+                holder = qr_database.connect(self.db_path, check_same_thread=False)
+                holder.execute('BEGIN IMMEDIATE')
+                release = threading.Timer(0.2, holder.rollback)
+                try:
+                    release.start()
+                    write()
+                finally:
+                    release.join()
+                    holder.close()
+                self.assertFalse(conn.in_transaction)
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM qr_thumbnails').fetchone()[0], 0)
+        finally:
+            conn.close()
+    
+    def test_thread_connections(self):
+        """Test that each thread gets its own connection"""
+        connections = qr_database.ThreadConnections(self.db_path)
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(connections.conn))
+        thread.start()
+        thread.join()
+        
+        self.assertIs(connections.conn, connections.conn)
+        self.assertIsNot(seen[0], connections.conn)
+        self.assertEqual(connections.execute('SELECT COUNT(*) FROM qr_records').fetchone()[0], 0)
+        connections.close()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            seen[0].execute('SELECT 1')
+
+
+class TestQRService(unittest.TestCase):
+    """Test the local HTTP generation service"""
+    
+    DEVICE = {'serial_number': 'S1', 'verification_code': '123456', 'dev_uid': 'E5DDA7D74D91EC53'}
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        with patch('builtins.print'):
+            self.service = QRService(export_quiet_period=0)
+        self.server = BackgroundServer(self.service)
+        self.client = http.client.HTTPConnection(self.server.host, self.server.port, timeout=10)
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        self.client.close()
+        self.server.stop()
+        with patch('builtins.print'):
+            self.service.close()
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+    
+    def request(self, method, path, payload=None, raw=None):
+        body = raw if raw is not None else (json.dumps(payload) if payload is not None else None)
+        self.client.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+        response = self.client.getresponse()
+        return response.status, json.loads(response.read())
+    
+    def test_generate_and_lookup(self):
+        """Test that a generated code is saved, recorded and found again"""
+        status, created = self.request('POST', '/generate', dict(self.DEVICE, format='pipe'))
+        self.assertEqual(status, 201)
+        self.assertEqual(created['qr_data'], qr_formats.format_qr_data('pipe', 'S1', '123456', 'E5DDA7D74D91EC53'))
+        self.assertTrue(os.path.exists(created['qr_filename']))
+        
+        status, record = self.request('GET', f"/records/{created['id']}")
+        self.assertEqual(status, 200)
+        self.assertEqual(record['qr_filename'], created['qr_filename'])
+        
+        status, found = self.request('GET', '/records?dev_uid=E5DDA7D74D91EC53')
+        self.assertEqual(status, 200)
+        self.assertEqual([r['id'] for r in found['records']], [created['id']])
+    
+    def test_batch_reports_each_row(self):
+        """Test that batch rows succeed or fail individually"""
+        status, result = self.request('POST', '/batch', {'rows': [
+            {'sn': 'B1', 'vc': '111111', 'uid': 'AAAA'},
+            {'serial': 'B2'},
+            {'serial_number': 'B3', 'verification_code': '333333', 'dev_uid': 'CCCC', 'format': 'nope'},
+            {'serial_number': 'B4', 'verification_code': '444444', 'dev_uid': 'DDDD'},
+        ]})
+        self.assertEqual(status, 200)
+        self.assertEqual((result['succeeded'], result['failed']), (2, 2))
+        self.assertEqual([r['status'] for r in result['results']], ['ok', 'error', 'error', 'ok'])
+        self.assertEqual([r['id'] for r in result['results'] if r['status'] == 'ok'], [1, 2])
+    
+    def test_delete(self):
+        """Test that deleting removes the record and its image once the image is no longer fresh"""
+        _, created = self.request('POST', '/generate', self.DEVICE)
+        os.utime(created['qr_filename'], (0, 0))
+        status, _ = self.request('DELETE', f"/records/{created['id']}")
+        self.assertEqual(status, 200)
+        self.assertFalse(os.path.exists(created['qr_filename']))
+        self.assertEqual(self.request('GET', f"/records/{created['id']}")[0], 404)
+        self.assertEqual(self.request('DELETE', f"/records/{created['id']}")[0], 404)
+    
+    def test_removed_image_conflict(self):
+        """Test that a record whose image disappears before it is saved is answered with 409 Conflict"""
+        with patch.object(self.service.image_store, 'claim', return_value=False):
+            self.client.request('POST', '/generate', body=json.dumps(self.DEVICE))
+            response = self.client.getresponse()
+            self.assertEqual((response.status, response.reason), (409, 'Conflict'))
+            self.assertIn('removed', json.loads(response.read())['error'])
+    
+    def test_export(self):
+        """Test that an export request writes the Excel file before answering"""
+        self.request('POST', '/generate', self.DEVICE)
+        with patch('builtins.print'):
+            status, result = self.request('POST', '/export', {'full': True})
+        self.assertEqual(status, 200)
+        self.assertTrue(result['completed'])
+        self.assertTrue(os.path.exists(result['filename']))
+    
+    def test_bad_requests(self):
+        """Test the answers to invalid requests"""
+        self.assertEqual(self.request('POST', '/generate', {'serial_number': 'S1'})[0], 400)
+        self.assertEqual(self.request('POST', '/generate', raw='{not json')[0], 400)
+        self.assertEqual(self.request('POST', '/export', raw='[1, 2]'), (400, {'error': "Expected a JSON object"}))
+        self.assertEqual(self.request('POST', '/batch', raw='"rows"')[0], 400)
+        self.assertEqual(self.request('GET', '/records?limit=5')[0], 400)
+        self.assertEqual(self.request('GET', '/generate')[0], 405)
+        self.assertEqual(self.request('GET', '/nowhere')[0], 404)
+        # The connection survives every error
+        self.assertEqual(self.request('GET', '/health')[0], 200)
+    
+    def test_invalid_content_length(self):
+        """Test that a Content-Length that is not a byte count is answered with 400"""
+        for length in ('abc', '-5'):
+            with self.subTest(length=length), \
+                    socket.create_connection((self.server.host, self.server.port), timeout=10) as sock:
+                sock.sendall(f"POST /generate HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode('latin-1'))
+                response = http.client.HTTPResponse(sock)
+                response.begin()
+                self.assertEqual(response.status, 400)
+                self.assertEqual(json.loads(response.read()), {'error': "Invalid Content-Length"})
+
+
+class TestDevUIDReader(unittest.TestCase):
+    """Test DevUID parsing and the persistent OpenOCD session"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.test_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        shutil.rmtree(self.test_dir)
+    
+    def fake_openocd(self):
+        """Install the OpenOCD stand-in in the test directory"""
+        return mock_openocd.install(self.test_dir)
+    
+    @staticmethod
+    def free_port():
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+    
+    def test_parse_devuid(self):
+        """Test that the DevUID is the second mdw word followed by the first"""
+        output = "target halted due to debug-request\n0x1fff7580: 0080e115 0577b5a7 ffffffff \n"
+        self.assertEqual(parse_devuid(output), '0577B5A70080E115')
+        self.assertEqual(parse_devuid("0x1FFF7580: 0080E115 0577B5A7 FFFFFFFF"), '0577B5A70080E115')
+        self.assertIsNone(parse_devuid("Error: Target not examined yet"))
+        self.assertIsNone(parse_devuid("0x1fff7580: zzzz 0577b5a7 ffffffff"))
+        self.assertIsNone(parse_devuid("0x20000000: 0080e115 0577b5a7 ffffffff"))
+    
+    def test_parse_mock_output(self):
+        """Test that the parser and the mock agree on the mdw format for any DevUID"""
+        for devuid in ('0577B5A70080E115', '0000000000000000', 'FFFFFFFFFFFFFFFF', 'DEADBEEF01234567'):
+            self.assertEqual(parse_devuid(mock_openocd.mdw_output(DEVUID_ADDRESS, devuid)), devuid)
+        self.assertEqual(parse_devuid(mock_openocd.mdw_output(0x20000000, '0577B5A70080E115'), 0x20000000),
+                         '0577B5A70080E115')
+    
+    def test_read_once(self):
+        """Test the one-shot read and its failure modes"""
+        path = self.fake_openocd()
+        self.assertEqual(read_devuid_once(path), '0577B5A70080E115')
+        with patch.dict(os.environ, mock_openocd.environment(devuid='1122334455667788')):
+            self.assertEqual(read_devuid_once(path), '1122334455667788')
+        for fail, message in (('no-probe', "open failed"), ('no-target', "unable to connect"),
+                              ('read-error', "Failed to read memory"), ('drop', "communication failure")):
+            with self.subTest(fail=fail), patch.dict(os.environ, mock_openocd.environment(fail=fail)):
+                with self.assertRaises(DevUIDError) as context:
+                    read_devuid_once(path)
+                self.assertIn(message, str(context.exception))
+        with patch.dict(os.environ, mock_openocd.environment(fail='hang')):
+            with self.assertRaises(DevUIDError) as context:
+                read_devuid_once(path, timeout=1)
+            self.assertIn("did not finish", str(context.exception))
+    
+    def test_session_failure_modes(self):
+        """Test that read failures restart OpenOCD once and then raise"""
+        for fail in ('read-error', 'drop'):
+            with self.subTest(fail=fail), patch.dict(os.environ, mock_openocd.environment(fail=fail)), \
+                    OpenOcdSession(self.fake_openocd(), port=self.free_port()) as session:
+                with self.assertRaises(DevUIDError):
+                    session.read_devuid()
+                self.assertEqual(session.starts, 2)
+    
+    def test_get_devuid_script(self):
+        """Test the standalone getDEVUID.py script against the stand-in"""
+        os.makedirs(os.path.join(self.test_dir, 'openocd', 'bin'))
+        mock_openocd.install(os.path.join(self.test_dir, 'openocd', 'bin'))
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'getDEVUID', 'getDEVUID.py')
+        result = subprocess.run([sys.executable, script], cwd=self.test_dir, capture_output=True, text=True,
+                                env={**os.environ, 'PYTHONPATH': os.path.dirname(script)})
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        self.assertEqual(result.stdout.splitlines(), [
+            "Device UID: 05 77 B5 A7 00 80 E1 15",
+            "Reversed UID (no spaces): 15E18000A7B57705",
+        ])
+    
+    def test_session_reused_between_reads(self):
+        """Test that consecutive reads share one OpenOCD process"""
+        with OpenOcdSession(self.fake_openocd(), port=self.free_port()) as session:
+            self.assertEqual(session.read_devuid(), '0577B5A70080E115')
+            self.assertEqual(session.read_devuid(), '0577B5A70080E115')
+            self.assertEqual(session.starts, 1)
+    
+    def test_session_restarts_after_failure(self):
+        """Test that a dead OpenOCD is restarted on the next read"""
+        with OpenOcdSession(self.fake_openocd(), port=self.free_port()) as session:
+            session.read_devuid()
+            session.process.kill()
+            session.process.wait()
+            self.assertEqual(session.read_devuid(), '0577B5A70080E115')
+            self.assertEqual(session.starts, 2)
+    
+    def test_probe_failure_reported(self):
+        """Test that OpenOCD exiting at startup raises DevUIDError with its output"""
+        with patch.dict(os.environ, mock_openocd.environment(fail='no-probe')), \
+                OpenOcdSession(self.fake_openocd(), port=self.free_port()) as session:
+            with self.assertRaises(DevUIDError) as context:
+                session.read_devuid()
+            self.assertIn("open failed", str(context.exception))
+            self.assertEqual(session.starts, 2)
+    
+    def test_missing_openocd(self):
+        """Test that a missing OpenOCD binary is not retried"""
+        with OpenOcdSession(os.path.join(self.test_dir, 'missing')) as session:
+            with self.assertRaises(FileNotFoundError):
+                session.read_devuid()
+    
+    def test_status_reported(self):
+        """Test that a read reports OpenOCD's output and each stage"""
+        stages = []
+        with OpenOcdSession(self.fake_openocd(), port=self.free_port()) as session:
+            devuid = session.read_devuid(on_status=lambda stage, detail: stages.append((stage, detail)))
+        self.assertIn(('connecting', None), stages)
+        self.assertTrue(any(stage == 'connecting' and detail and "Listening" in detail for stage, detail in stages))
+        self.assertEqual(stages[-2:], [('halted', None), ('read', devuid)])
+    
+    def test_cancel_read(self):
+        """Test that a read stuck on the target is cancelled promptly"""
+        with patch.dict(os.environ, mock_openocd.environment(fail='hang')), \
+                OpenOcdSession(self.fake_openocd(), port=self.free_port()) as session:
+            stages = []
+            errors = []
+            
+            def read():
+                try:
+                    session.read_devuid(on_status=lambda stage, detail: stages.append(stage))
+                except DevUIDError as e:
+                    errors.append(e)
+            
+            thread = threading.Thread(target=read)
+            thread.start()
+            deadline = time.monotonic() + 10
+            while 'halted' not in stages and time.monotonic() < deadline:
+                time.sleep(0.01)
+            start_time = time.perf_counter()
+            session.cancel()
+            thread.join(5)
+            
+            self.assertFalse(thread.is_alive())
+            self.assertLess(time.perf_counter() - start_time, 3)
+            self.assertIsInstance(errors[0], DevUIDCancelled)
+            self.assertIsNone(session.process)
+            self.assertEqual(session.starts, 1)
+    
+    def test_list_probes(self):
+        """Test that ST-Links are found by vendor and product ID in sysfs"""
+        sysfs = os.path.join(self.test_dir, 'usb')
+        for device, vendor, product, serial in [('1-2.1', '0483', '374b', 'STL1'), ('1-2.2', '0483', '3753', 'STL2'),
+                                                ('1-3', '046d', 'c52b', 'MOUSE'), ('usb1', '1d6b', '0002', None)]:
+            os.makedirs(os.path.join(sysfs, device))
+            for name, value in (('idVendor', vendor), ('idProduct', product), ('serial', serial)):
+                if value:
+                    with open(os.path.join(sysfs, device, name), 'w') as f:
+                        f.write(value + '\n')
+        
+        self.assertEqual(list_probes(sysfs), [Probe('STL1', '1-2.1'), Probe('STL2', '1-2.2')])
+        self.assertEqual(list_probes(os.path.join(self.test_dir, 'missing')), [])
+        with patch.object(sys, 'platform', 'win32'), self.assertRaisesRegex(DevUIDError, "only supported on Linux"):
+            list_probes()
+        self.assertEqual(select_probe_command(Probe('STL1', '1-2.1')), 'adapter serial STL1')
+        self.assertEqual(select_probe_command(Probe(None, '1-2.1')), 'adapter usb location 1-2.1')
+    
+    def test_probes_read_in_parallel(self):
+        """Test that a panel of probes takes about as long as one read"""
+        probes = ['STL1', 'STL2', 'STL3', 'STL4']
+        with patch.dict(os.environ, mock_openocd.environment(read_delay=0.5)), \
+                MultiProbeReader(probes, base_port=self.free_port(), openocd_path=self.fake_openocd()) as reader:
+            reader.read_all()
+            start_time = time.perf_counter()
+            devuids, errors = reader.read_all()
+            elapsed = time.perf_counter() - start_time
+        
+        self.assertEqual(errors, {})
+        self.assertEqual(devuids, {probe: mock_openocd.devuid_for_serial(probe) for probe in probes})
+        self.assertLess(elapsed, 1.5)
+    
+    def test_panel_generation(self):
+        """Test that a panel file is read through the probes and generated as a batch"""
+        original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        try:
+            with open('panel.csv', 'w') as f:
+                f.write("probe,serial,vcode\nSTL1,P1,111111\nBAD,P2,222222\nSTL3,P3,333333\n,P4,444444\n")
+            with patch('builtins.print'):
+                cli = QRGeneratorCLI()
+                # The BAD probe is not connected
+                reader = MultiProbeReader(['STL1', 'BAD', 'STL3'], base_port=self.free_port(),
+                                          openocd_path=self.fake_openocd())
+                try:
+                    with patch.dict(os.environ, mock_openocd.environment(probes=['STL1', 'STL3'])):
+                        succeeded, failed = cli.run_panel('panel.csv', reader=reader)
+                finally:
+                    reader.close()
+            
+            self.assertEqual((succeeded, failed), (2, 2))
+            records = cli.conn.execute('SELECT serial_number, dev_uid FROM qr_records ORDER BY id').fetchall()
+            self.assertEqual(records, [('P1', mock_openocd.devuid_for_serial('STL1')), ('P3', mock_openocd.devuid_for_serial('STL3'))])
+            with open('panel_report.csv') as f:
+                report = {row['serial_number']: row for row in csv.DictReader(f)}
+            self.assertIn("probe BAD", report['P2']['error'])
+            self.assertEqual(report['P4']['error'], "Missing probe")
+            cli.conn.close()
+        finally:
+            os.chdir(original_cwd)
+
+
+@unittest.skipUnless(FLET_AVAILABLE, "Flet not available")
+class TestDevUIDAcquisition(unittest.TestCase):
+    """Test that the GUI reads the DevUID without blocking the page"""
+    
+    def setUp(self):
+        """Set up a GUI app with a stand-in DevUID reader"""
+        import qr_generator_gui
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        
+        self.page = MagicMock()
+        with patch('builtins.print'):
+            self.app = qr_generator_gui.QRGeneratorApp(self.page, export_quiet_period=60)
+        self.release = threading.Event()
+        self.cancelled = threading.Event()
+        self.app.devuid_reader = MagicMock()
+        self.app.devuid_reader.read_devuid.side_effect = self.read_devuid
+        self.app.devuid_reader.cancel.side_effect = self.cancelled.set
+        self.page.update.reset_mock()
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        self.release.set()
+        self.app.export_worker.stop(flush=False)
+        self.app.record_pager.close()
+        self.app.conn.close()
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+    
+    def read_devuid(self, on_status=None):
+        on_status('connecting', "Info : clock speed 500 kHz")
+        on_status('halted', None)
+        while not self.release.wait(0.01):
+            if self.cancelled.is_set():
+                raise DevUIDCancelled("DevUID read cancelled")
+        on_status('read', '0577B5A70080E115')
+        return '0577B5A70080E115'
+    
+    def wait_for_status(self, text):
+        deadline = time.monotonic() + 5
+        while text not in str(self.app.status_text.value) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIn(text, self.app.status_text.value)
+    
+    def test_read_runs_in_background(self):
+        """Test that the click returns at once and the field is filled when the read ends"""
+        with patch('builtins.print'):
+            self.app.get_devuid_from_device(None)
+            self.assertEqual(self.app.get_devuid_btn.text, self.app.CANCEL_DEVUID_LABEL)
+            self.wait_for_status("halted")
+            self.assertFalse(self.app.devuid_field.value)
+            
+            # Fields stay editable while the read is running
+            self.app.serial_field.value = "SERIAL1"
+            self.release.set()
+            self.app.devuid_thread.join(5)
+        
+        self.assertEqual(self.app.devuid_field.value, '0577B5A70080E115')
+        self.assertEqual(self.app.serial_field.value, "SERIAL1")
+        self.assertIn("DevUID extracted", self.app.status_text.value)
+        self.assertEqual(self.app.get_devuid_btn.text, self.app.GET_DEVUID_LABEL)
+        # Progress never redraws the whole page
+        self.assertTrue(all(call.args for call in self.page.update.call_args_list))
+    
+    def test_second_click_cancels(self):
+        """Test that clicking while a read runs cancels it"""
+        with patch('builtins.print'):
+            self.app.get_devuid_from_device(None)
+            self.wait_for_status("halted")
+            self.app.get_devuid_from_device(None)
+            self.app.devuid_thread.join(5)
+        
+        self.assertFalse(self.app.devuid_thread.is_alive())
+        self.assertEqual(self.app.devuid_reader.read_devuid.call_count, 1)
+        self.assertIn("cancelled", self.app.status_text.value)
+        self.assertFalse(self.app.devuid_field.value)
+        self.assertEqual(self.app.get_devuid_btn.text, self.app.GET_DEVUID_LABEL)
+
+class TestScanPipeline(unittest.TestCase):
+    """Test the single-scan provisioning pipeline"""
+    
+    def make_pipeline(self, read_delay=0.0, generate_delay=0.0, dev_uids=None, **options):
+        dev_uids = iter(dev_uids or (f"{i:016X}" for i in range(1000)))
+        
+        def read_devuid():
+            time.sleep(read_delay)
+            return next(dev_uids)
+        
+        def generate(serial_number, verification_code, dev_uid, **fields):
+            time.sleep(generate_delay)
+            if serial_number == 'FAIL':
+                raise RuntimeError("render failed")
+            return (serial_number, dev_uid, fields)
+        
+        pipeline = ScanPipeline(read_devuid, generate, **options)
+        self.addCleanup(pipeline.close)
+        return pipeline
+    
+    def test_units_complete_in_scan_order(self):
+        """Test that every scan is paired with the next DevUID and its fields"""
+        pipeline = self.make_pipeline()
+        futures = [pipeline.submit(f"SN{i}", "123456", device_name=f"Board {i}") for i in range(5)]
+        units = [future.result(5) for future in futures]
+        
+        self.assertEqual([unit.serial_number for unit in units], [f"SN{i}" for i in range(5)])
+        self.assertEqual([unit.dev_uid for unit in units], [f"{i:016X}" for i in range(5)])
+        self.assertEqual(units[2].result, ("SN2", f"{2:016X}", {'device_name': "Board 2"}))
+        self.assertEqual(pipeline.pending, 0)
+        self.assertEqual(len(pipeline.units), 5)
+    
+    def test_stages_overlap(self):
+        """Test that queued scans cycle at the slower stage, not the sum of both"""
+        pipeline = self.make_pipeline(read_delay=0.2, generate_delay=0.2)
+        start_time = time.perf_counter()
+        futures = [pipeline.submit(f"SN{i}", "123456") for i in range(5)]
+        units = [future.result(10) for future in futures]
+        elapsed = time.perf_counter() - start_time
+        
+        # Sequential would take 5 x 0.4s
+        self.assertLess(elapsed, 1.6)
+        for unit in units[1:]:
+            self.assertLess(unit.cycle_time, 0.35)
+        self.assertAlmostEqual(pipeline.mean_cycle_time(), sum(u.cycle_time for u in units) / 5, places=6)
+    
+    def test_failures_reported_and_pipeline_continues(self):
+        """Test that failed boards are reported, including a board that was not swapped"""
+        errors = []
+        done = []
+        pipeline = self.make_pipeline(dev_uids=['A1', 'A2', 'A2', 'A2', 'A3'],
+                                      on_unit=done.append, on_error=lambda serial, e: errors.append((serial, str(e))))
+        futures = [pipeline.submit(serial, "123456") for serial in ('SN1', 'FAIL', 'SN3', 'SN4', 'SN5')]
+        for future in futures:
+            try:
+                future.result(5)
+            except Exception:
+                pass
+        
+        # The board of a failed unit can be provisioned with a new scan
+        self.assertEqual([(unit.serial_number, unit.dev_uid) for unit in done],
+                         [('SN1', 'A1'), ('SN3', 'A2'), ('SN5', 'A3')])
+        self.assertEqual(errors[0], ('FAIL', "render failed"))
+        self.assertEqual(errors[1][0], 'SN4')
+        self.assertIn("already used", errors[1][1])
+        self.assertEqual(pipeline.pending, 0)
+
+
+@unittest.skipUnless(FLET_AVAILABLE, "Flet not available")
+class TestPipelineMode(unittest.TestCase):
+    """Test generating from a scanned serial in the GUI"""
+    
+    def setUp(self):
+        """Set up a GUI app in pipeline mode with a stand-in DevUID reader"""
+        import qr_generator_gui
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        
+        self.page = MagicMock()
+        with patch('builtins.print'):
+            self.app = qr_generator_gui.QRGeneratorApp(self.page, export_quiet_period=60)
+        dev_uids = iter(['0577B5A70080E115', '0577B5A70080E116'])
+        self.app.devuid_reader = MagicMock()
+        self.app.devuid_reader.read_devuid.side_effect = lambda on_status=None: next(dev_uids)
+        self.app.pipeline_switch.value = True
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        self.app.scan_pipeline.close()
+        self.app.export_worker.stop(flush=False)
+        self.app.record_pager.close()
+        self.app.conn.close()
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+    
+    def scan(self, text):
+        self.app.serial_field.value = text
+        self.app.on_serial_submit(None)
+    
+    def test_scans_generate_records(self):
+        """Test that each scan is generated and committed with no further clicks"""
+        with patch('builtins.print'):
+            self.scan("SN1,111111")
+            self.assertEqual(self.app.serial_field.value, "")
+            self.app.vcode_field.value = "222222"
+            self.scan("SN2")
+            self.app.scan_pipeline.close()
+        
+        records = self.app.conn.execute(
+            'SELECT serial_number, verification_code, dev_uid FROM qr_records ORDER BY id').fetchall()
+        self.assertEqual(records, [('SN1', '111111', '0577B5A70080E115'), ('SN2', '222222', '0577B5A70080E116')])
+        self.assertEqual(self.app.devuid_field.value, '0577B5A70080E116')
+        self.assertIn("cycle", self.app.status_text.value)
+        self.assertTrue(self.app.export_worker._pending)
+    
+    def test_scan_needs_verification_code(self):
+        """Test that a serial without any verification code is not queued"""
+        with patch('builtins.print'):
+            self.scan("SN1")
+        self.assertEqual(self.app.scan_pipeline.pending, 0)
+        self.assertIn("verification code", self.app.status_text.value)
+        self.app.devuid_reader.read_devuid.assert_not_called()
+    
+    def test_manual_mode_ignores_enter(self):
+        """Test that Enter in the serial field does nothing with pipeline mode off"""
+        self.app.pipeline_switch.value = False
+        self.scan("SN1,111111")
+        self.assertEqual(self.app.serial_field.value, "SN1,111111")
+        self.assertEqual(self.app.scan_pipeline.pending, 0)
+
+class TestQueryPlans(unittest.TestCase):
+    """Audit the query plan of every statement the CLI and GUI issue"""
+    
+    APP_TABLES = ('qr_records', 'qr_free_ids', 'qr_thumbnails')
+    
+    # Lookups support staff run by hand
+    SUPPORT_QUERIES = [
+        "SELECT * FROM qr_records WHERE serial_number = 'S1'",
+        "SELECT * FROM qr_records WHERE dev_uid = 'E5DDA7D74D91EC53' ORDER BY created_at",
+        "SELECT * FROM qr_records WHERE qr_filename = 'qr_code_S1.png'",
+    ]
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+    
+    def run_app(self):
+        """Drive the CLI and GUI through their features, returning every SQL statement"""
+        statements = []
+        connect = sqlite3.connect
+        
+        def traced_connect(*args, **kwargs):
+            conn = connect(*args, **kwargs)
+            conn.set_trace_callback(statements.append)
+            return conn
+        
+        with patch('sqlite3.connect', traced_connect), patch('builtins.print'), \
+                patch('builtins.input', side_effect=['1', 'y']):
+            cli = QRGeneratorCLI()
+            for i in range(3):
+                cli.generate_qr_code(f"S{i}", "123456", "E5DDA7D74D91EC53")
+            cli.view_records()
+            cli.export_to_excel()
+            cli.remove_record()
+            with open('batch.csv', 'w') as f:
+                f.write("serial,vcode,devuid\nB1,123456,E5DDA7D74D91EC53\nB2,123456,E5DDA7D74D91EC53\n")
+            cli.run_batch('batch.csv')
+            cli.export_table('records.csv')
+            cli.export_table('records.csv', since_seq=1, append=True)
+            cli.conn.close()
+            
+            service = QRService(export_quiet_period=0)
+            record = service.generate({'serial_number': 'H1', 'verification_code': '123456',
+                                       'dev_uid': 'E5DDA7D74D91EC53'})
+            service.batch({'rows': [{'sn': 'H2', 'vc': '123456', 'uid': 'E5DDA7D74D91EC53'}]})
+            service.lookup({'serial_number': 'H1'})
+            service.lookup({'dev_uid': 'E5DDA7D74D91EC53'})
+            service.lookup({'qr_filename': record['qr_filename']})
+            service.get_record(record['id'])
+            service.delete(record['id'])
+            service.export()
+            service.close()
+            
+            if FLET_AVAILABLE:
+                import qr_generator_gui
+                app = qr_generator_gui.QRGeneratorApp(MagicMock(), export_quiet_period=0)
+                for i in range(3):
+                    app.serial_field.value = f"G{i}"
+                    app.vcode_field.value = "123456"
+                    app.devuid_field.value = "E5DDA7D74D91EC53"
+                    app.generate_qr_code(None)
+                app.show_older_records(None)
+                app.select_record('1')
+                app.remove_record(None)
+                app.close()
+                app.conn.close()
+        return statements
+    
+    def test_no_full_scans_or_temp_sorts(self):
+        """Test that no statement scans a table or sorts in a temporary B-tree"""
+        statements = self.run_app() + self.SUPPORT_QUERIES
+        conn = sqlite3.connect('qr_codes.db')
+        checked = set()
+        try:
+            for statement in statements:
+                statement = ' '.join(statement.split())
+                if statement in checked or statement.split()[0].upper() not in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'):
+                    continue
+                checked.add(statement)
+                plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + statement)]
+                with self.subTest(statement=statement):
+                    for detail in plan:
+                        self.assertNotIn('TEMP B-TREE', detail)
+                        self.assertNotIn(detail, [f"SCAN {table}" for table in self.APP_TABLES])
+        finally:
+            conn.close()
+        self.assertGreater(len(checked), 10)
+    
+    def test_indexes_created(self):
+        """Test that every qr_records index is created, none of them unique"""
+        conn = sqlite3.connect('qr_codes.db')
+        try:
+            with patch('builtins.print'):
+                QRGeneratorCLI().conn.close()
+            indexes = {row[1]: row[2] for row in conn.execute("PRAGMA index_list('qr_records')")}
+            for name in qr_database.INDEXES:
+                self.assertEqual(indexes.get(name), 0, name)
+        finally:
+            conn.close()
+    
+    def test_shared_filenames_indexed_without_warning(self):
+        """Test that records sharing an image file are indexed without a warning"""
+        conn = sqlite3.connect('qr_codes.db')
+        try:
+            conn.execute('''
+                CREATE TABLE qr_records (
+                    id INTEGER PRIMARY KEY,
+                    serial_number TEXT NOT NULL,
+                    verification_code TEXT NOT NULL,
+                    dev_uid TEXT NOT NULL,
+                    qr_filename TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.executemany('''
+                INSERT INTO qr_records (id, serial_number, verification_code, dev_uid, qr_filename)
+                VALUES (?, 'S', '123456', 'E5DDA7D74D91EC53', 'same.png')
+            ''', [(1,), (2,)])
+            conn.commit()
+            with patch('builtins.print') as mock_print:
+                qr_database.ensure_indexes(conn)
+            mock_print.assert_not_called()
+            indexes = {row[1]: row[2] for row in conn.execute("PRAGMA index_list('qr_records')")}
+            self.assertEqual(indexes['idx_qr_records_qr_filename'], 0)
+        finally:
+            conn.close()
+
+
+ALPHANUMERIC = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:"
+
+QR_MASKS = [
+    lambda i, j: (i + j) % 2 == 0,
+    lambda i, j: i % 2 == 0,
+    lambda i, j: j % 3 == 0,
+    lambda i, j: (i + j) % 3 == 0,
+    lambda i, j: (i // 2 + j // 3) % 2 == 0,
+    lambda i, j: (i * j) % 2 + (i * j) % 3 == 0,
+    lambda i, j: ((i * j) % 2 + (i * j) % 3) % 2 == 0,
+    lambda i, j: ((i * j) % 3 + (i + j) % 2) % 2 == 0,
+]
+
+
+def gf_tables():
+    """GF(256) exp/log tables for the QR Reed-Solomon code"""
+    exp, log = [0] * 512, [0] * 256
+    value = 1
+    for i in range(255):
+        exp[i] = value
+        log[value] = i
+        value <<= 1
+        if value & 0x100:
+            value ^= 0x11D
+    for i in range(255, 512):
+        exp[i] = exp[i - 255]
+    return exp, log
+
+
+def decode_qr_matrix(modules):
+    """Minimal QR reader used to check encoded codes
+
+    Reads the format information, unmasks and reads the codewords in
+    zigzag order, checks every Reed-Solomon block and decodes numeric,
+    alphanumeric and byte segments. Returns the payload and mask pattern.
+    Only the spec tables (block layout, alignment positions) come from
+    the qrcode library.
+    """
+    count = len(modules)
+    version = (count - 17) // 4
+    
+    format_bits = 0
+    for i in range(15):
+        row = i if i < 6 else i + 1 if i < 8 else count - 15 + i
+        format_bits |= modules[row][8] << i
+    format_bits ^= 0x5412
+    remainder = format_bits >> 10 << 10
+    for shift in range(4, -1, -1):
+        if remainder & (1 << (shift + 10)):
+            remainder ^= 0x537 << shift
+    if remainder != format_bits & 0x3FF:
+        raise ValueError("Bad format information")
+    error_correction, mask_pattern = format_bits >> 13, (format_bits >> 10) & 7
+    
+    reserved = [[False] * count for _ in range(count)]
+    def reserve(rows, cols):
+        for r in rows:
+            for c in cols:
+                reserved[r][c] = True
+    reserve(range(9), range(9))
+    reserve(range(9), range(count - 8, count))
+    reserve(range(count - 8, count), range(9))
+    reserve([6], range(count))
+    reserve(range(count), [6])
+    centers = qrcode.util.pattern_position(version)
+    for r in centers:
+        for c in centers:
+            # Skip the three centers that would overlap a finder pattern
+            if not (r < 9 and c < 9 or r < 9 and c >= count - 8 or r >= count - 8 and c < 9):
+                reserve(range(r - 2, r + 3), range(c - 2, c + 3))
+    if version >= 7:
+        reserve(range(6), range(count - 11, count - 8))
+        reserve(range(count - 11, count - 8), range(6))
+    
+    bits = []
+    upward = True
+    col = count - 1
+    while col > 0:
+        if col == 6:
+            col -= 1
+        rows = range(count - 1, -1, -1) if upward else range(count)
+        for r in rows:
+            for c in (col, col - 1):
+                if not reserved[r][c]:
+                    bits.append(modules[r][c] != QR_MASKS[mask_pattern](r, c))
+        upward = not upward
+        col -= 2
+    codewords = [int(''.join('1' if bit else '0' for bit in bits[i:i + 8]), 2)
+                 for i in range(0, len(bits) - 7, 8)]
+    
+    blocks = qrcode.base.rs_blocks(version, error_correction)
+    data_blocks = [[] for _ in blocks]
+    ecc_blocks = [[] for _ in blocks]
+    position = 0
+    for i in range(max(block.data_count for block in blocks)):
+        for b, block in enumerate(blocks):
+            if i < block.data_count:
+                data_blocks[b].append(codewords[position])
+                position += 1
+    for i in range(max(block.total_count - block.data_count for block in blocks)):
+        for b, block in enumerate(blocks):
+            if i < block.total_count - block.data_count:
+                ecc_blocks[b].append(codewords[position])
+                position += 1
+    
+    exp, log = gf_tables()
+    for data, ecc in zip(data_blocks, ecc_blocks):
+        for k in range(len(ecc)):
+            syndrome = 0
+            for codeword in data + ecc:
+                syndrome = (exp[log[syndrome] + k] if syndrome else 0) ^ codeword
+            if syndrome:
+                raise ValueError("Reed-Solomon check failed")
+    
+    stream = ''.join(format(codeword, '08b') for data in data_blocks for codeword in data)
+    position = 0
+    def take(length):
+        nonlocal position
+        position += length
+        return int(stream[position - length:position], 2)
+    count_bits = {1: (10, 12, 14), 2: (9, 11, 13), 4: (8, 16, 16)}
+    size_class = 0 if version < 10 else 1 if version < 27 else 2
+    payload = b''
+    while position + 4 <= len(stream):
+        mode = take(4)
+        if mode == 0:
+            break
+        length = take(count_bits[mode][size_class])
+        if mode == 1:
+            digits = ''
+            while len(digits) + 3 <= length:
+                digits += f"{take(10):03d}"
+            if length - len(digits) == 2:
+                digits += f"{take(7):02d}"
+            elif length - len(digits) == 1:
+                digits += str(take(4))
+            payload += digits.encode()
+        elif mode == 2:
+            for _ in range(length // 2):
+                pair = take(11)
+                payload += (ALPHANUMERIC[pair // 45] + ALPHANUMERIC[pair % 45]).encode()
+            if length % 2:
+                payload += ALPHANUMERIC[take(6)].encode()
+        else:
+            payload += bytes(take(8) for _ in range(length))
+    return payload.decode('utf-8'), mask_pattern
+
+
+class TestFixedLayout(unittest.TestCase):
+    """Test fixed-version QR layouts with a decoder round trip"""
+    
+    def setUp(self):
+        self.records = [
+            ('TEST123456789012', '123456', 'E5DDA7D74D91EC53'),
+            ('SN1', '000001', '0123456789ABCDEF'),
+            ('12345678901234567890', '999999', '0123456789ABCDEF01234567'),
+            ('olarm-unit 7', '654321', 'deadbeefcafef00d'),
+        ]
+    
+    def test_olarm_layout_is_fixed(self):
+        """Test that every Olarm payload within the field limits uses one version"""
+        layout = layout_for_format('olarm')
+        self.assertEqual(layout.version, 5)
+        for record in self.records:
+            matrix = qr_matrix(qr_formats.format_qr_data('olarm', *record), 'olarm')
+            self.assertEqual(len(matrix), layout.modules_count)
+    
+    def test_decoder_reads_fitted_codes(self):
+        """Test the decoder itself against codes from the qrcode library"""
+        for format_type in qr_formats.FORMATS:
+            qr_data = qr_formats.format_qr_data(format_type, *self.records[0])
+            self.assertEqual(decode_qr_matrix(qr_matrix(qr_data))[0], qr_data)
+    
+    def test_round_trip_all_formats(self):
+        """Test that fixed-layout codes decode to the original payload"""
+        for format_type in qr_formats.FORMATS:
+            for record in self.records:
+                qr_data = qr_formats.format_qr_data(format_type, *record)
+                with self.subTest(format=format_type, serial=record[0]):
+                    self.assertEqual(decode_qr_matrix(qr_matrix(qr_data, format_type))[0], qr_data)
+    
+    def test_round_trip_fixed_masks(self):
+        """Test every fixed mask pattern"""
+        qr_data = qr_formats.format_qr_data('olarm', *self.records[0])
+        for mask_pattern in range(8):
+            with self.subTest(mask=mask_pattern):
+                decoded, used_mask = decode_qr_matrix(qr_matrix(qr_data, 'olarm', mask_pattern))
+                self.assertEqual(decoded, qr_data)
+                self.assertEqual(used_mask, mask_pattern)
+    
+    def test_matches_qrcode_modules(self):
+        """Test module-for-module equality with qrcode at the same version"""
+        for version in (1, 5, 7, 10):
+            qr_data = "OLARM" + "1234567890" * version
+            qr = qrcode.QRCode(version=version, error_correction=qrcode.constants.ERROR_CORRECT_M)
+            qr.add_data(qr_data)
+            qr.make(fit=False)
+            self.assertEqual(QRLayout(version).matrix(qr_data), qr.modules)
+            self.assertEqual(decode_qr_matrix(qr.modules)[0], qr_data)
+    
+    def test_png_matches_fitted_png(self):
+        """Test that an Olarm code is byte-identical when the fitted version matches"""
+        qr_data = qr_formats.format_qr_data('olarm', *self.records[0])
+        self.assertEqual(render_qr_png(qr_data, format_type='olarm'), render_qr_png(qr_data))
+    
+    def test_oversized_payload_falls_back(self):
+        """Test that payloads longer than the layout allows are fitted instead"""
+        qr_data = qr_formats.format_qr_data('olarm', 'S' * 80, '123456', 'E5DDA7D74D91EC53')
+        matrix = qr_matrix(qr_data, 'olarm')
+        self.assertGreater(len(matrix), layout_for_format('olarm').modules_count)
+        self.assertEqual(decode_qr_matrix(matrix)[0], qr_data)
+
+
 def run_comprehensive_tests():
     """Run all tests and generate report"""
     print("🚀 Starting Comprehensive QR Generator Test Suite")
@@ -506,7 +3060,32 @@ def run_comprehensive_tests():
         TestQRGeneratorCore,
         TestQRGeneratorSecurity,
         TestQRGeneratorPerformance,
-        TestQRGeneratorIntegration
+        TestQRGeneratorIntegration,
+        TestIncrementalExcelExport,
+        TestStreamingExcelExport,
+        TestSharedImageParts,
+        TestShardedExcelExport,
+        TestTabularExport,
+        TestExportWorker,
+        TestIdAllocator,
+        TestBatchGeneration,
+        TestRenderPool,
+        TestQRImageStore,
+        TestFormatRegistry,
+        TestFixedLayout,
+        TestPngWriter,
+        TestThumbnailCache,
+        TestRecordSelection,
+        TestRecordsBrowser,
+        TestRecordPager,
+        TestSchemaMigrations,
+        TestConcurrentWriters,
+        TestQRService,
+        TestDevUIDReader,
+        TestDevUIDAcquisition,
+        TestScanPipeline,
+        TestPipelineMode,
+        TestQueryPlans
     ]
     
     for test_class in test_classes:
@@ -529,12 +3108,14 @@ def run_comprehensive_tests():
     if result.failures:
         print("\n❌ FAILURES:")
         for test, traceback in result.failures:
-            print(f"  - {test}: {traceback.split('AssertionError: ')[-1].split('\\n')[0]}")
+            message = traceback.split('AssertionError: ')[-1].split('\n')[0]
+            print(f"  - {test}: {message}")
     
     if result.errors:
         print("\n🔥 ERRORS:")
         for test, traceback in result.errors:
-            print(f"  - {test}: {traceback.split('\\n')[-2]}")
+            message = traceback.split('\n')[-2]
+            print(f"  - {test}: {message}")
     
     if result.wasSuccessful():
         print("\n✅ ALL TESTS PASSED!")